@@ -3,16 +3,237 @@
 
 import chess
 import numpy as np
+import time
 from node import Node
-import copy
 import heuristics
+import transposition_table
+from transposition_table import EXACT, TranspositionTable
+from move_ordering import MoveOrderer, mvv_lva
+from evaluation import IncrementalEval, TYPE_VALUES
+
+QS_MAX_NODES = 20000
+QS_DELTA_MARGIN = 3
+
+
+'''
+Raised inside the search once the deadline of an iterative deepening search has passed
+'''
+class SearchTimeout(Exception):
+    pass
+
+
+'''
+Classes:
+    SearchStats
+        Counters filled in by board_ab_search and make_unmake_ab_search
+
+        Properties:
+            - nodes: number of positions visited
+            - horizon_leaves: number of positions scored because the depth ran out (rather than the
+            game being over), if there are none a deeper search cannot change the result
+            - beta_cutoffs: number of positions whose search was cut off
+            - first_move_cutoffs: number of those cutoffs caused by the first move searched, a
+            measure of how good the move ordering is
+            - qnodes: number of positions expanded by quiescence_search
+'''
+class SearchStats:
+
+    def __init__(self):
+        self.nodes = 0
+        self.horizon_leaves = 0
+        self.beta_cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.qnodes = 0
+
+    '''
+    SearchStats.add:
+
+    Adds the counters of another SearchStats object to this one
+
+    Parameters:
+        other - SearchStats, the counters to add
+
+    Returns:
+        Void return, updates the counters
+    '''
+    def add(self, other):
+        self.nodes += other.nodes
+        self.horizon_leaves += other.horizon_leaves
+        self.beta_cutoffs += other.beta_cutoffs
+        self.first_move_cutoffs += other.first_move_cutoffs
+        self.qnodes += other.qnodes
+
+    '''
+    SearchStats.first_move_cutoff_rate:
+
+    Returns:
+        Float, the fraction of cutoffs that happened on the first move searched
+    '''
+    def first_move_cutoff_rate(self):
+        if self.beta_cutoffs == 0:
+            return 0.
+        return self.first_move_cutoffs / self.beta_cutoffs
+
+
+'''
+Classes:
+    Quiescence
+        Settings and node budget of the quiescence search that board_ab_search runs at its horizon
+        instead of scoring the position right away
+
+        Properties:
+            - max_nodes: the number of quiescence positions a search may visit, once they are used up
+            the remaining horizon positions are scored right away
+            - checks: whether to also search quiet moves giving check at the first quiescence ply, and
+            all evasions of a side in check (which may then not stand pat)
+            - delta_margin: captures that cannot bring the score within this margin of alpha (beta for
+            the minimizing side), even winning the captured piece for free, are not searched
+            - nodes: the number of quiescence positions visited since new_search
+'''
+class Quiescence:
+
+    def __init__(self, max_nodes=QS_MAX_NODES, checks=False, delta_margin=QS_DELTA_MARGIN):
+        self.max_nodes = max_nodes
+        self.checks = checks
+        self.delta_margin = delta_margin
+        self.nodes = 0
+
+    '''
+    Quiescence.new_search:
+
+    Returns:
+        Void return, gives the next search its full node budget
+    '''
+    def new_search(self):
+        self.nodes = 0
+
+
+'''
+leaf_value:
+
+The score of a position at the horizon of the search, from curr_player's point of view: material (from
+the evaluator if there is one, plus its piece-square score), minus the attacked pieces and plus 100 if the
+last move gave check
+
+Parameters:
+    - board - python-chess BoardState, the position to score
+    - curr_player - the player the search is done for, either B or W
+    - evaluator - IncrementalEval, optional evaluation state kept up to date with the search
+    - last_move_check - Boolean, whether the move that led to board gave check
+
+Returns:
+    the value of the position
+'''
+def leaf_value(board, curr_player, evaluator=None, last_move_check=False):
+    if evaluator is not None:
+        value = evaluator.material_value(curr_player) + evaluator.positional_value(curr_player)
+    else:
+        value = heuristics.get_material_value(board, curr_player)
+    value -= heuristics.count_attacks(board, curr_player)
+    if last_move_check:
+        value += 100
+    return value
+
+
+'''
+quiescence_search:
+
+Searches only captures and promotions (and, with quiescence.checks, checks at the first ply) below the
+horizon, so that a position is not scored in the middle of an exchange. The side to move may always
+"stand pat" on the static leaf_value instead of capturing, captures that cannot reach the window even
+winning the piece for free are skipped (delta pruning), and the search stops expanding once the node
+budget of quiescence is used up.
+
+Parameters:
+    - board - python-chess BoardState, the position at the horizon, left unchanged when the search returns
+    - alpha - float, the value of alpha
+    - beta - float, the value of beta
+    - maximizing_player - Boolean, whether or not the side to move is the maximizing player
+    - curr_player - the player the search is done for, either B or W
+    - quiescence - Quiescence, the settings and node budget
+    - evaluator - IncrementalEval, optional evaluation state kept up to date with the search
+    - last_move_check - Boolean, whether the move that led to board gave check
+    - stats - SearchStats, optional counters to fill in
+    - ply - Int, the number of quiescence moves made to reach board
+
+Returns:
+    the value of the position, a bound if it is outside (alpha, beta)
+'''
+def quiescence_search(board, alpha, beta, maximizing_player, curr_player, quiescence, evaluator=None, last_move_check=False,
+                      stats=None, ply=0):
+    stand_pat = leaf_value(board, curr_player, evaluator, last_move_check)
+    if board.is_game_over() or quiescence.nodes >= quiescence.max_nodes:
+        return stand_pat
+    quiescence.nodes += 1
+    if stats is not None:
+        stats.qnodes += 1
+    evading = quiescence.checks and board.is_check()
+    value = stand_pat
+    if not evading:
+        if maximizing_player:
+            if value >= beta:
+                return value
+            alpha = max(alpha, value)
+        else:
+            if value <= alpha:
+                return value
+            beta = min(beta, value)
+    else:
+        value = -np.infty if maximizing_player else np.infty
+
+    scored = []
+    for move in board.legal_moves:
+        capture = board.is_capture(move)
+        gives_check = board.gives_check(move)
+        if not (evading or capture or move.promotion is not None or (quiescence.checks and ply == 0 and gives_check)):
+            continue
+        gain = 0
+        if capture:
+            gain = TYPE_VALUES[chess.PAWN] if board.is_en_passant(move) else TYPE_VALUES[board.piece_type_at(move.to_square)]
+        if move.promotion is not None:
+            gain += TYPE_VALUES[move.promotion] - TYPE_VALUES[chess.PAWN]
+        if not evading and not gives_check:
+            if maximizing_player and stand_pat + gain + quiescence.delta_margin <= alpha:
+                continue
+            if not maximizing_player and stand_pat - gain - quiescence.delta_margin >= beta:
+                continue
+        scored.append((mvv_lva(board, move) if capture else 0, gain, move, gives_check))
+    scored.sort(key=lambda item: (item[0], item[1]), reverse=True)
+
+    for _, _, move, gives_check in scored:
+        if evaluator is not None:
+            evaluator.push(board, move)
+        board.push(move)
+        try:
+            new_value = quiescence_search(board, alpha, beta, not maximizing_player, curr_player, quiescence, evaluator,
+                                          gives_check, stats, ply + 1)
+        finally:
+            board.pop()
+            if evaluator is not None:
+                evaluator.pop()
+        if maximizing_player:
+            value = max(value, new_value)
+            alpha = max(alpha, value)
+            if value >= beta:
+                break
+        else:
+            value = min(value, new_value)
+            beta = min(beta, value)
+            if value <= alpha:
+                break
+    if value in (np.infty, -np.infty):
+        # in check with every evasion pruned or none left to search
+        return stand_pat
+    return value
 
 
 '''
 depth_limited_ab_search:
 
 Similar to the textbook version, but Depth Limited Alpha Beta Search. 
-Recursively called to go down the depth that set in the function call.
+Recursively called to go down the depth that set in the function call. The root searches its children in UCI
+order, so that the move returned on a tie does not depend on the order of the set, and gives them their
+search_value.
 
 Parameters:
     - node - Node object, the current node
@@ -21,68 +242,492 @@ Parameters:
     - beta - float, the value of beta, infinity
     - maximizing_player - Boolean, whether or not the current player is the maximizing player
     - curr_player - the current player, either B or W
+    - tt - TranspositionTable, optional table of already searched positions. Scores are stored from
+    curr_player's point of view, so a table must only be shared between searches for the same side
 
 Returns:
     returns the optimal move selected by the A/B search algorithm
 '''
 
-def depth_limited_ab_search(node, depth, alpha, beta, maximizing_player, curr_player):
+def depth_limited_ab_search(node, depth, alpha, beta, maximizing_player, curr_player, tt=None):
     """
     Just like version from textbook except made recursive to do depth limited ab search
     """
+    if tt is not None:
+        key = transposition_table.position_key(node.board_state)
+        alpha_orig, beta_orig = alpha, beta
+        # the root always searches so that it has children and a move to return
+        if node.move != "":
+            cutoff, score, move, alpha, beta = tt.lookup(key, depth, alpha, beta)
+            if cutoff:
+                return score, move
+
     if depth == 0 or node.board_state.is_game_over():
         node.get_heuristic(curr_player)
         if node.move != "":
+            if tt is not None:
+                tt.store(key, depth, EXACT, node.v, node.move)
             return node.v, node.move
     if node.children == set():
-        for next_move in list(node.board_state.legal_moves):
-            new_board_state = copy.deepcopy(node.board_state)
-            if node.kriegspiel:
-                new_gt_board_state = copy.deepcopy(node.gt_board_state)
-                if next_move not in new_gt_board_state.legal_moves:
-                    continue
-            else:
-                new_gt_board_state = None
-
-            next_move = next_move.uci()
-            new_board_state.push_san(next_move)
-            if node.kriegspiel:
-                new_gt_board_state.push_san(next_move)
-
-            child_node = Node(board_state=new_board_state, move=next_move, parent=node, kriegspiel=node.kriegspiel, gt_board_state=new_gt_board_state)
-            if node.kriegspiel:
-                child_node.update_opponent_pieces(curr_player, child_node.gt_board_state)
-            else:
-                child_node.v = heuristics.opponent_check(node.board_state, child_node.move, curr_player)
-            node.children.add(child_node)
-        if node.kriegspiel:
-            node.get_diag_pawn_moves(curr_player)
+        node.expand_children(curr_player)
+    # the children are a set, the root goes through them in UCI order so that ties always pick the same move
+    root = node.move == ""
+    children = sorted(node.children, key=lambda child: child.move) if root else node.children
 
     if maximizing_player:
         value = -np.infty
         move = -1
-        for child_node in node.children:
-            new_value, new_move = depth_limited_ab_search(child_node, depth-1, alpha, beta, False, curr_player)
+        for child_node in children:
+            new_value, new_move = depth_limited_ab_search(child_node, depth-1, alpha, beta, False, curr_player, tt)
+            if root:
+                child_node.search_value = new_value
             if new_value > value:
                 value = new_value
                 move = child_node.move
                 alpha = max(alpha, value)
             if value >= beta:
-                return value, move
-        if move == -1:
-            print("Move is -1", value)
-        return value, move
+                break
     else:
         value = np.infty
         move = -1
-        for child_node in node.children:
-            new_value, new_move = depth_limited_ab_search(child_node, depth-1, alpha, beta, True, curr_player)
+        for child_node in children:
+            new_value, new_move = depth_limited_ab_search(child_node, depth-1, alpha, beta, True, curr_player, tt)
+            if root:
+                child_node.search_value = new_value
             if new_value < value:
                 value = new_value
                 move = child_node.move
                 beta = min(beta, value)
             if value <= alpha:
-                return value, move
-        if move == -1:
-            print("move is -1", value)
+                break
+    if move == -1:
+        print("Move is -1", value)
+    if tt is not None:
+        tt.record(key, depth, value, move, alpha_orig, beta_orig)
+    return value, move
+
+
+'''
+board_ab_search:
+
+Make-unmake version of depth_limited_ab_search. Walks a single board with push/pop instead of
+creating a deep-copied Node per child, and scores positions exactly like the Node based search:
+the reward for a move that gives check plus the heuristic. Children are searched in move generation
+order, or in the order of the orderer.
+
+Parameters:
+    - board - python-chess BoardState, the board to search, left unchanged when the search returns
+    - depth - int, the depth of the tree that is to be explored
+    - alpha - float, the value of alpha
+    - beta - float, the value of beta
+    - maximizing_player - Boolean, whether or not the side to move is the maximizing player
+    - curr_player - the player the search is done for, either B or W
+    - tt - TranspositionTable, optional table of already searched positions
+    - last_move_check - Boolean, whether the move that led to board gave check (the reward that
+    the Node based search keeps in the child's v)
+    - deadline - Float, time.time() after which SearchTimeout is raised, None for no limit
+    - stats - SearchStats, optional counters to fill in
+    - orderer - MoveOrderer, optional move ordering (hash move, MVV-LVA, checks, killers, history). Without
+    it only the hash move is moved to the front
+    - evaluator - IncrementalEval, optional evaluation state set up for board, kept
+    up to date with every push and pop so that the material at the leaves is not recomputed. Its
+    piece-square score is added to the leaf value
+    - quiescence - Quiescence, optional, the horizon positions are scored by quiescence_search instead of leaf_value
+
+Returns:
+    (value, move), the value of the position and the best move in UCI format (the last move at a leaf)
+'''
+def board_ab_search(board, depth, alpha, beta, maximizing_player, curr_player, tt=None, last_move_check=False, deadline=None, stats=None, orderer=None, evaluator=None,
+                    quiescence=None):
+    if deadline is not None and time.time() >= deadline:
+        raise SearchTimeout()
+    if stats is not None:
+        stats.nodes += 1
+    hash_move = None
+    if tt is not None:
+        key = transposition_table.position_key(board)
+        alpha_orig, beta_orig = alpha, beta
+        cutoff, score, hash_move, alpha, beta = tt.lookup(key, depth, alpha, beta)
+        if cutoff:
+            return score, hash_move
+
+    if depth == 0 or board.is_game_over():
+        if stats is not None and depth == 0:
+            stats.horizon_leaves += 1
+        move = board.peek().uci()
+        if quiescence is not None and depth == 0:
+            value = quiescence_search(board, alpha, beta, maximizing_player, curr_player, quiescence, evaluator,
+                                      last_move_check, stats)
+            if tt is not None:
+                tt.record(key, depth, value, move, alpha_orig, beta_orig)
+            return value, move
+        value = leaf_value(board, curr_player, evaluator, last_move_check)
+        if tt is not None:
+            tt.store(key, depth, EXACT, value, move)
         return value, move
+
+    value = -np.infty if maximizing_player else np.infty
+    move = -1
+    if hash_move is not None and hash_move != -1:
+        hash_move = chess.Move.from_uci(hash_move)
+    else:
+        hash_move = None
+    moves = list(board.legal_moves)
+    if orderer is not None:
+        ordered_moves = orderer.order_moves(board, moves, hash_move)
+    else:
+        if hash_move in moves:
+            # the best move of an earlier (shallower) search of this position goes first
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+        ordered_moves = [(next_move, board.gives_check(next_move)) for next_move in moves]
+    cutoff_move = None
+    for i, (next_move, gives_check) in enumerate(ordered_moves):
+        if evaluator is not None:
+            evaluator.push(board, next_move)
+        board.push(next_move)
+        try:
+            new_value, new_move = board_ab_search(board, depth-1, alpha, beta, not maximizing_player, curr_player, tt, gives_check, deadline, stats, orderer, evaluator,
+                                                  quiescence)
+        finally:
+            board.pop()
+            if evaluator is not None:
+                evaluator.pop()
+        if maximizing_player:
+            if new_value > value:
+                value = new_value
+                move = next_move.uci()
+                alpha = max(alpha, value)
+            if value >= beta:
+                cutoff_move = next_move
+                break
+        else:
+            if new_value < value:
+                value = new_value
+                move = next_move.uci()
+                beta = min(beta, value)
+            if value <= alpha:
+                cutoff_move = next_move
+                break
+    if cutoff_move is not None:
+        if stats is not None:
+            stats.beta_cutoffs += 1
+            if i == 0:
+                stats.first_move_cutoffs += 1
+        if orderer is not None:
+            orderer.record_cutoff(board, cutoff_move, depth)
+    if tt is not None:
+        tt.record(key, depth, value, move, alpha_orig, beta_orig)
+    return value, move
+
+
+'''
+order_root_children:
+
+Parameters:
+    - node - Node object, the root node, its children already expanded
+    - board - python-chess BoardState, the root position
+    - pv_move - String, move in UCI format to search first, None if there is none
+    - orderer - MoveOrderer, optional move ordering, otherwise only the pv_move is moved to the front
+
+Returns:
+    list of (child node, gives_check) tuples in the order the root's children are searched, the same
+    order every time for the same position
+'''
+def order_root_children(node, board, pv_move=None, orderer=None):
+    # children is a set, sort it first so that ties are always searched in the same order
+    children = sorted(node.children, key=lambda child: child.move)
+    if orderer is not None:
+        by_move = {chess.Move.from_uci(child.move): child for child in children}
+        hash_move = chess.Move.from_uci(pv_move) if pv_move not in (None, -1) else None
+        ordered_moves = orderer.order_moves(board, list(by_move), hash_move)
+        return [(by_move[next_move], gives_check) for next_move, gives_check in ordered_moves]
+    return [(child, board.gives_check(chess.Move.from_uci(child.move)))
+            for child in sorted(children, key=lambda child: child.move != pv_move)]
+
+
+'''
+make_unmake_ab_search:
+
+Drop-in replacement for depth_limited_ab_search at the root. The root's children are still created
+as Node objects, which keep the value of the search in search_value, but everything below them is
+searched with board_ab_search on one copy of the board. A Kriegspiel player searches full boards
+sampled from its BeliefState (BeliefState.plan_moves), never its masked view.
+
+Parameters:
+    - node - Node object, the root node
+    - depth - int, the depth of the tree that is to be explored
+    - alpha - float, the value of alpha, -infinity
+    - beta - float, the value of beta, infinity
+    - maximizing_player - Boolean, whether or not the current player is the maximizing player
+    - curr_player - the current player, either B or W
+    - tt - TranspositionTable, optional table of already searched positions
+    - deadline - Float, time.time() after which SearchTimeout is raised, None for no limit
+    - pv_move - String, move in UCI format to search first, by default the best move stored for the root in tt
+    - stats - SearchStats, optional counters to fill in
+    - orderer - MoveOrderer, optional move ordering for the root and the positions below it
+    - evaluator - IncrementalEval, the evaluation state to use below the root, reset for the root's board. A
+    material only one is used if None
+    - quiescence - Quiescence, optional, run quiescence_search at the horizon. The children of a depth 1 root
+    then keep the quiescence value in v
+
+Returns:
+    returns the optimal move selected by the A/B search algorithm
+'''
+def make_unmake_ab_search(node, depth, alpha, beta, maximizing_player, curr_player, tt=None, deadline=None, pv_move=None, stats=None, orderer=None, evaluator=None,
+                          quiescence=None):
+    if depth == 0 or node.board_state.is_game_over():
+        return depth_limited_ab_search(node, depth, alpha, beta, maximizing_player, curr_player, tt)
+    if tt is not None:
+        key = transposition_table.position_key(node.board_state)
+        alpha_orig, beta_orig = alpha, beta
+        if pv_move is None:
+            entry = tt.probe(key)
+            if entry is not None:
+                pv_move = entry.move
+    if node.children == set():
+        node.expand_children(curr_player)
+    board = node.board_state.copy()
+    if evaluator is None:
+        evaluator = IncrementalEval()
+    evaluator.reset(board)
+    if quiescence is not None:
+        quiescence.new_search()
+
+    value = -np.infty if maximizing_player else np.infty
+    move = -1
+    children = order_root_children(node, board, pv_move, orderer)
+    cutoff_move = None
+    for i, (child_node, gives_check) in enumerate(children):
+        if deadline is not None and time.time() >= deadline:
+            raise SearchTimeout()
+        if depth == 1 and quiescence is None:
+            # leaves keep their heuristic in v, which get_nth_best_move sorts by
+            if stats is not None:
+                stats.nodes += 1
+                stats.horizon_leaves += 1
+            new_value, new_move = depth_limited_ab_search(child_node, 0, alpha, beta, not maximizing_player, curr_player, tt)
+        else:
+            next_move = chess.Move.from_uci(child_node.move)
+            evaluator.push(board, next_move)
+            board.push(next_move)
+            new_value, new_move = board_ab_search(board, depth-1, alpha, beta, not maximizing_player, curr_player, tt, gives_check, deadline, stats, orderer, evaluator,
+                                                  quiescence)
+            board.pop()
+            evaluator.pop()
+            if depth == 1:
+                child_node.v = new_value
+        child_node.search_value = new_value
+        if maximizing_player:
+            if new_value > value:
+                value = new_value
+                move = child_node.move
+                alpha = max(alpha, value)
+            if value >= beta:
+                cutoff_move = child_node.move
+                break
+        else:
+            if new_value < value:
+                value = new_value
+                move = child_node.move
+                beta = min(beta, value)
+            if value <= alpha:
+                cutoff_move = child_node.move
+                break
+    if cutoff_move is not None:
+        if stats is not None:
+            stats.beta_cutoffs += 1
+            if i == 0:
+                stats.first_move_cutoffs += 1
+        if orderer is not None:
+            orderer.record_cutoff(board, chess.Move.from_uci(cutoff_move), depth)
+    if tt is not None:
+        tt.record(key, depth, value, move, alpha_orig, beta_orig)
+    return value, move
+
+
+# the transposition table and move orderer of a root_split_worker process, with the settings they were filled under
+worker_state = {}
+
+'''
+root_split_worker:
+
+Searches one root move in a worker process for root_split_ab_search. Each worker process keeps its own
+transposition table and move orderer between tasks, so what it learns on one root move helps the next. They are
+only kept while the table size, the player, the piece-square tables and the quiescence settings stay the same:
+scores stored for another player or another evaluation would be wrong for this search.
+
+Parameters:
+    - args - tuple (board, move, depth, alpha, beta, curr_player, gives_check, deadline, tt_size_mb,
+    piece_square_tables, quiescence), the root position before the move, the move in UCI format, the remaining depth
+    below the move and the window to search it with
+
+Returns:
+    (value, stats), the value of the move (a bound if it is outside the window) and the SearchStats of the
+    search, None if the deadline passed
+'''
+def root_split_worker(args):
+    board, move, depth, alpha, beta, curr_player, gives_check, deadline, tt_size_mb, piece_square_tables, quiescence = args
+    settings = (tt_size_mb, curr_player,
+                None if piece_square_tables is None else tuple(sorted((piece_type, tuple(table)) for piece_type, table in piece_square_tables.items())),
+                None if quiescence is None else (quiescence.max_nodes, quiescence.checks, quiescence.delta_margin))
+    if worker_state.get("settings") != settings:
+        worker_state["settings"] = settings
+        worker_state["tt"] = TranspositionTable(tt_size_mb)
+        worker_state["orderer"] = MoveOrderer()
+    tt = worker_state["tt"]
+    tt.new_search()
+    stats = SearchStats()
+    evaluator = IncrementalEval(board, piece_square_tables)
+    next_move = chess.Move.from_uci(move)
+    evaluator.push(board, next_move)
+    board.push(next_move)
+    try:
+        value, _ = board_ab_search(board, depth, alpha, beta, False, curr_player, tt, gives_check, deadline, stats,
+                                   worker_state["orderer"], evaluator, quiescence)
+    except SearchTimeout:
+        return None
+    return value, stats
+
+
+'''
+root_split_ab_search:
+
+Parallel version of make_unmake_ab_search for the maximizing root, in the style of the Young Brothers
+Wait Concept. The first root move in the search order is searched serially to establish alpha, then the
+remaining moves are searched by the workers of a process pool with the window (alpha, beta). A move that
+beats the first one is searched with a window that contains its value, so its score is exact, and the
+best move is the first of those with the highest score in the search order: the same move as the serial
+search at the same depth.
+
+Parameters:
+    - node - Node object, the root node
+    - depth - int, the depth of the tree that is to be explored, at least 2
+    - curr_player - the current player, either B or W
+    - pool - multiprocessing Pool, the workers
+    - tt - TranspositionTable, optional table of already searched positions, used by the serial part
+    - deadline - Float, time.time() after which SearchTimeout is raised, None for no limit
+    - pv_move - String, move in UCI format to search first, by default the best move stored for the root in tt
+    - stats - SearchStats, optional counters to fill in, the workers' counters are added to them
+    - orderer - MoveOrderer, optional move ordering for the root and the serial part
+    - evaluator - IncrementalEval, the evaluation state of the serial part, a material only one if None. The
+    workers use the same piece-square tables
+    - tt_size_mb - Float, the size of each worker's own transposition table
+    - quiescence - Quiescence, optional, as in make_unmake_ab_search. Each worker gets a copy with its own node budget
+
+Returns:
+    (value, move), the value and the UCI move selected, as make_unmake_ab_search
+'''
+def root_split_ab_search(node, depth, curr_player, pool, tt=None, deadline=None, pv_move=None, stats=None, orderer=None, evaluator=None,
+                         tt_size_mb=16, quiescence=None):
+    if depth < 2 or node.board_state.is_game_over():
+        return make_unmake_ab_search(node, depth, -np.infty, np.infty, True, curr_player, tt, deadline, pv_move, stats, orderer, evaluator,
+                                     quiescence)
+    if tt is not None:
+        key = transposition_table.position_key(node.board_state)
+        if pv_move is None:
+            entry = tt.probe(key)
+            if entry is not None:
+                pv_move = entry.move
+    if node.children == set():
+        node.expand_children(curr_player)
+    if node.children == set():
+        # a root without children is reported by the serial search
+        return make_unmake_ab_search(node, depth, -np.infty, np.infty, True, curr_player, tt, deadline, pv_move, stats, orderer, evaluator,
+                                     quiescence)
+    board = node.board_state.copy()
+    if evaluator is None:
+        evaluator = IncrementalEval()
+    evaluator.reset(board)
+    if quiescence is not None:
+        quiescence.new_search()
+    if stats is None:
+        stats = SearchStats()
+    children = order_root_children(node, board, pv_move, orderer)
+
+    first_node, gives_check = children[0]
+    first_move = chess.Move.from_uci(first_node.move)
+    evaluator.push(board, first_move)
+    board.push(first_move)
+    value, _ = board_ab_search(board, depth-1, -np.infty, np.infty, False, curr_player, tt, gives_check, deadline, stats, orderer, evaluator,
+                               quiescence)
+    board.pop()
+    evaluator.pop()
+    move = first_node.move
+    first_node.search_value = value
+    alpha = value
+
+    jobs = [(board, child_node.move, depth-1, alpha, np.infty, curr_player, gives_check, deadline, tt_size_mb,
+             evaluator.piece_square_tables, quiescence) for child_node, gives_check in children[1:]]
+    for (child_node, _), result in zip(children[1:], pool.map(root_split_worker, jobs, chunksize=1)):
+        if result is None:
+            raise SearchTimeout()
+        new_value, worker_stats = result
+        stats.add(worker_stats)
+        child_node.search_value = new_value
+        if new_value > value:
+            value = new_value
+            move = child_node.move
+    if tt is not None:
+        tt.record(key, depth, value, move, -np.infty, np.infty)
+    return value, move
+
+
+'''
+iterative_deepening_search:
+
+Searches the root with make_unmake_ab_search at depth 1, 2, 3, ... until the time budget runs out,
+returning the result of the deepest search that completed. Every iteration stores its results in
+the transposition table, so the principal variation of the previous iteration is searched first
+(the root's best move explicitly, the rest through the hash move of each position). Depth 1 is
+always completed so that there is a move to return, and deepening stops early once an iteration
+no longer reaches its depth limit anywhere (every line ends the game before it).
+
+Parameters:
+    - node - Node object, the root node
+    - curr_player - the current player, either B or W
+    - time_limit - Float, the time budget for the move in seconds
+    - max_depth - Int, the deepest iteration to run if time allows
+    - tt - TranspositionTable, optional table of already searched positions, a fresh one is used if None
+    - orderer - MoveOrderer, optional move ordering, a fresh one is used if None
+    - stats - SearchStats, optional counters, the counters of every iteration are added to it
+    - evaluator - IncrementalEval, optional evaluation state, as in make_unmake_ab_search
+    - pool - multiprocessing Pool, optional, iterations from depth 2 on are searched with root_split_ab_search
+    - quiescence - Quiescence, optional, as in make_unmake_ab_search, its node budget is renewed every iteration
+
+Returns:
+    (value, move, depth), the value and move of the deepest completed search and its depth
+'''
+def iterative_deepening_search(node, curr_player, time_limit, max_depth=20, tt=None, orderer=None, stats=None, evaluator=None, pool=None,
+                               quiescence=None):
+    deadline = time.time() + time_limit
+    if tt is None:
+        tt = TranspositionTable()
+    if orderer is None:
+        orderer = MoveOrderer()
+    iteration_stats = SearchStats()
+    value, move = make_unmake_ab_search(node, 1, -np.infty, np.infty, True, curr_player, tt, stats=iteration_stats, orderer=orderer, evaluator=evaluator,
+                                        quiescence=quiescence)
+    completed_depth = 1
+    for depth in range(2, max_depth + 1):
+        if stats is not None:
+            stats.add(iteration_stats)
+        if iteration_stats.horizon_leaves == 0:
+            break
+        iteration_stats = SearchStats()
+        try:
+            if pool is not None:
+                value, move = root_split_ab_search(node, depth, curr_player, pool, tt, deadline, move, iteration_stats, orderer, evaluator,
+                                                   quiescence=quiescence)
+            else:
+                value, move = make_unmake_ab_search(node, depth, -np.infty, np.infty, True, curr_player, tt, deadline, move, iteration_stats, orderer, evaluator,
+                                                    quiescence)
+        except SearchTimeout:
+            if stats is not None:
+                stats.add(iteration_stats)
+            break
+        completed_depth = depth
+    else:
+        if stats is not None:
+            stats.add(iteration_stats)
+    return value, move, completed_depth
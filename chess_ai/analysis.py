@@ -0,0 +1,243 @@
+import math
+import numpy as np
+from results_store import ResultsStore
+
+INITIAL_ELO = 1200
+K = 32 # for weaker players, 16 for masters
+CONFIDENCE_Z = 1.96 # 95% confidence intervals
+RESULT_SCORES = {"1-0": 1.0, "0-1": 0.0} # white's score, any other result is a draw
+
+'''
+score_matrix:
+
+Packs the results of an experiment into one array
+
+Parameters:
+    - runs - list of lists of results ("1-0", "0-1" or a draw), one list per run in game order, None for a
+    game that was not played
+
+Returns:
+    NumPy array of shape (runs, games) of white's scores (1, 0.5 or 0), NaN for the games not played
+'''
+def score_matrix(runs):
+    num_games = max((len(run) for run in runs), default=0)
+    scores = np.full((len(runs), num_games), np.nan)
+    for run_num, run in enumerate(runs):
+        for game_num, result in enumerate(run):
+            if result is not None:
+                scores[run_num, game_num] = RESULT_SCORES.get(result, 0.5)
+    return scores
+
+'''
+store_scores:
+
+Reads the score matrix of one configuration from a results store in a single pass
+
+Parameters:
+    - store_path - String, the path of the ResultsStore
+    - config - Dictionary, optional, the experiment_config to read, matched exactly (see ResultsStore.records), every
+    game in the store if None
+    - num_games - Int, optional number of games per run, the largest game number stored if None
+
+Returns:
+    NumPy array of shape (runs, games) as score_matrix, one row per run number found in the store, in order
+'''
+def store_scores(store_path, config=None, num_games=None):
+    runs = {}
+    for record in ResultsStore(store_path).records(config):
+        runs.setdefault(record["run"], {})[record["game"]] = record["result"]
+    if num_games is None:
+        num_games = max((game_num + 1 for run in runs.values() for game_num in run), default=0)
+    return score_matrix([[runs[run_num].get(game_num) for game_num in range(num_games)] for run_num in sorted(runs)])
+
+'''
+elo_trajectories:
+
+The Elo ratings of white and black over every run at once: the games are played in order, so the loop is over
+the games while each update is one array operation over all the runs
+
+Parameters:
+    - scores - NumPy array of shape (runs, games) of white's scores, as score_matrix
+
+Returns:
+    (elo_W, elo_B), NumPy arrays of shape (runs, games + 1) starting from INITIAL_ELO and updated with K after
+    each game. A run's ratings are NaN from its first game not played on
+'''
+def elo_trajectories(scores):
+    num_runs, num_games = scores.shape
+    elo_W = np.full((num_runs, num_games + 1), float(INITIAL_ELO))
+    elo_B = np.full((num_runs, num_games + 1), float(INITIAL_ELO))
+    for game_num in range(num_games):
+        exp_result_W = 1. / (1 + 10 ** ((elo_B[:, game_num] - elo_W[:, game_num]) / 400.))
+        # the two expected results add up to 1, as do the two scores
+        elo_W[:, game_num + 1] = elo_W[:, game_num] + K * (scores[:, game_num] - exp_result_W)
+        elo_B[:, game_num + 1] = elo_B[:, game_num] + K * ((1 - scores[:, game_num]) - (1 - exp_result_W))
+    return elo_W, elo_B
+
+'''
+mean_confidence:
+
+Mean, standard deviation and confidence interval along the first axis, ignoring NaN entries (games that were
+not played)
+
+Parameters:
+    - values - NumPy array, e.g. the Elo trajectories of shape (runs, games + 1)
+    - z - Float, the normal quantile of the interval, CONFIDENCE_Z for 95%
+
+Returns:
+    (mean, std, half_width), NumPy arrays over the remaining axes: the mean is within half_width of the true
+    mean with the chosen confidence. NaN where there are no values (and half_width where there is only one)
+'''
+def mean_confidence(values, z=CONFIDENCE_Z):
+    present = ~np.isnan(values)
+    count = present.sum(axis=0)
+    filled = np.where(present, values, 0.)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = filled.sum(axis=0) / count
+        squares = np.where(present, (values - mean) ** 2, 0.).sum(axis=0)
+        std = np.sqrt(squares / count)
+        half_width = z * np.sqrt(squares / (count - 1)) / np.sqrt(count)
+    return mean, std, half_width
+
+'''
+score_to_elo:
+
+Parameters:
+    - score - Float or NumPy array, the expected score of a player, between 0 and 1
+
+Returns:
+    the Elo difference that gives that expected score (infinite for 0 and 1)
+'''
+def score_to_elo(score):
+    with np.errstate(divide="ignore"):
+        return -400. * np.log10(1. / np.asarray(score, dtype=np.float64) - 1.) + 0.  # + 0. turns -0. into 0.
+
+'''
+elo_to_score:
+
+Parameters:
+    - elo - Float, an Elo difference
+
+Returns:
+    Float, the expected score of the stronger player by elo points
+'''
+def elo_to_score(elo):
+    return 1. / (1 + 10 ** (-elo / 400.))
+
+'''
+summarize:
+
+Win, draw and loss rates of white, its mean score with a confidence interval and the Elo difference between the
+players it implies, over all the games played
+
+Parameters:
+    - scores - NumPy array of white's scores, as score_matrix (NaN entries are ignored)
+    - z - Float, the normal quantile of the interval, CONFIDENCE_Z for 95%
+
+Returns:
+    Dictionary with "games", "wins", "draws", "losses" (the rates of white), "score", "score_ci" (the half width of
+    the interval), "elo_diff" and "elo_ci" ((low, high), the Elo difference at the ends of the score interval)
+'''
+def summarize(scores, z=CONFIDENCE_Z):
+    played = scores[~np.isnan(scores)]
+    games = len(played)
+    if games == 0:
+        return {"games": 0, "wins": np.nan, "draws": np.nan, "losses": np.nan, "score": np.nan, "score_ci": np.nan,
+                "elo_diff": np.nan, "elo_ci": (np.nan, np.nan)}
+    score, _, score_ci = mean_confidence(played, z)
+    low, high = score_to_elo(np.clip([score - score_ci, score + score_ci], 0., 1.))
+    return {"games": games, "wins": np.mean(played == 1.), "draws": np.mean(played == 0.5), "losses": np.mean(played == 0.),
+            "score": float(score), "score_ci": float(score_ci), "elo_diff": float(score_to_elo(score)), "elo_ci": (float(low), float(high))}
+
+
+'''
+Classes:
+    SPRT
+        Sequential probability ratio test between two hypotheses about the Elo difference of white over black:
+        H0 "it is elo0" and H1 "it is elo1". After each game the log likelihood ratio of the results so far is
+        compared with bounds set by the error rates: the test stops as soon as one hypothesis is accepted, which
+        takes few games when the players are far apart. The ratio uses the normal approximation of the
+        win/draw/loss (trinomial) model: with N games, mean score s and per game variance v,
+        LLR = N (s1 - s0) (2s - s0 - s1) / (2v), where s0 and s1 are the expected scores of elo0 and elo1.
+
+        Properties:
+            - elo0, elo1: the Elo differences of the two hypotheses
+            - lower: log(beta / (1 - alpha)), H0 is accepted when the ratio falls below it
+            - upper: log((1 - beta) / alpha), H1 is accepted when the ratio rises above it
+            - wins, draws, losses: the results of white so far
+'''
+
+class SPRT:
+
+    '''
+    Establishes a test with no games yet
+
+    Parameters:
+        elo0 - Float, the Elo difference of H0
+        elo1 - Float, the Elo difference of H1, larger than elo0
+        alpha - Float, the probability of accepting H1 when H0 holds
+        beta - Float, the probability of accepting H0 when H1 holds
+
+    Returns:
+        A new object of class SPRT
+    '''
+    def __init__(self, elo0=0., elo1=100., alpha=0.05, beta=0.05):
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+
+    '''
+    SPRT.update:
+
+    Parameters:
+        result - String, the result of a game ("1-0", "0-1" or a draw)
+
+    Returns:
+        Boolean, whether the test has accepted a hypothesis, so that the tournament can stop
+    '''
+    def update(self, result):
+        score = RESULT_SCORES.get(result, 0.5)
+        if score == 1.:
+            self.wins += 1
+        elif score == 0.:
+            self.losses += 1
+        else:
+            self.draws += 1
+        return self.decision() is not None
+
+    '''
+    SPRT.llr:
+
+    Returns:
+        Float, the log likelihood ratio of H1 against H0 given the games so far. The variance is estimated with
+        half a game of each result added, so that a one sided match (variance 0) can still be decided
+    '''
+    def llr(self):
+        games = self.wins + self.draws + self.losses
+        if games == 0:
+            return 0.
+        score = (self.wins + 0.5 * self.draws) / games
+        wins, draws, losses = self.wins + 0.5, self.draws + 0.5, self.losses + 0.5
+        variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / (wins + draws + losses)
+        score0 = elo_to_score(self.elo0)
+        score1 = elo_to_score(self.elo1)
+        return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+    '''
+    SPRT.decision:
+
+    Returns:
+        String, "H1" if the ratio is above the upper bound, "H0" if it is below the lower bound, None while
+        the test goes on
+    '''
+    def decision(self):
+        llr = self.llr()
+        if llr >= self.upper:
+            return "H1"
+        if llr <= self.lower:
+            return "H0"
+        return None
@@ -0,0 +1,311 @@
+import chess
+import chess.polyglot
+import heapq
+import random
+from collections import Counter
+import heuristics
+from node import PAWN_TRIES
+
+PARTICLES = 64  # full boards kept by each BeliefState
+MASK_CACHE_SIZE = 4096  # masked boards kept by masked_board before the cache is cleared
+PLACEMENT_TRIES = 200  # random placements tried when every particle contradicts the umpire
+
+mask_cache = {}
+
+'''
+masked_board:
+
+The player's view of a full board: the same position with the opponent's pieces taken off, computed
+from the opponent's occupancy bitboard and cached per (Zobrist hash, player), so that a position is only
+masked once however many times it is searched or retried
+
+Parameters:
+    - board_state - python-chess BoardState, the full (ground truth) chessboard
+    - curr_player - String, the player whose view it is, "W" or "B"
+
+Returns:
+    python-chess BoardState without a move stack, a copy the caller may change
+'''
+def masked_board(board_state, curr_player):
+    key = (chess.polyglot.zobrist_hash(board_state), curr_player)
+    masked = mask_cache.get(key)
+    if masked is None:
+        if len(mask_cache) >= MASK_CACHE_SIZE:
+            mask_cache.clear()
+        masked = board_state.copy(stack=False)
+        opponent_color = chess.BLACK if curr_player == "W" else chess.WHITE
+        for square in chess.scan_reversed(masked.occupied_co[opponent_color]):
+            masked.remove_piece_at(square)
+        mask_cache[key] = masked
+    return masked.copy(stack=False)
+
+'''
+umpire_capture:
+
+The umpire's capture announcement for a move, read before the move is made on the full board
+
+Parameters:
+    - board_state - python-chess BoardState, the full (ground truth) chessboard
+    - move - python-chess Move, a legal move
+
+Returns:
+    (square, piece_type), the square the captured piece stood on and its type, (None, None) if the
+    move is not a capture
+'''
+def umpire_capture(board_state, move):
+    if board_state.is_en_passant(move):
+        return move.to_square - 8 if board_state.turn == chess.WHITE else move.to_square + 8, chess.PAWN
+    piece_type = board_state.piece_type_at(move.to_square)
+    if piece_type is None or board_state.is_castling(move):
+        return None, None
+    return move.to_square, piece_type
+
+
+'''
+Classes:
+    BeliefState
+        What a Kriegspiel player knows about the game, kept up to date from the umpire's messages only:
+        the player's own view of the board, the opponent's piece counts (captures are announced with the
+        square and the type of the captured piece, promotions are not announced) and a set of particles, full boards consistent with
+        every message so far. The start position is known to both sides, so all particles start as it;
+        after each hidden opponent move every particle plays a random opponent move that matches the
+        announcement, and particles that contradict a later message are replaced by copies of the others.
+        A player searches from its belief only: the moves it can try come from its view, ranked by searches of
+        sampled particles and by how likely the particles make them legal (plan_moves), and only the umpire
+        tells which of them are legal.
+
+        Properties:
+            - curr_player: the player, "W" or "B"
+            - color: the player's python-chess Color
+            - view: python-chess BoardState with only the player's pieces, the opponent's moves are null moves
+            - opponent_pieces: dictionary mapping the lowercase piece symbol to the number of opponent pieces
+            - in_check: whether the umpire announced that the player is in check
+            - illegal_moves: the moves the umpire rejected this turn
+            - particles: list of python-chess BoardState, the sampled full boards
+            - rng: random.Random, the source of randomness of the particles
+'''
+
+class BeliefState:
+
+    '''
+    Establishes the belief at the start of a game
+
+    Parameters:
+        board_state - python-chess BoardState, the start position, known to both players
+        curr_player - String, the player, "W" or "B"
+        num_particles - Int, the number of full boards to keep
+        seed - Int, optional seed of the particles
+
+    Returns:
+        A new object of class BeliefState
+    '''
+    def __init__(self, board_state, curr_player, num_particles=PARTICLES, seed=None):
+        self.curr_player = curr_player
+        self.color = chess.WHITE if curr_player == "W" else chess.BLACK
+        self.view = masked_board(board_state, curr_player)
+        self.opponent_pieces = heuristics.count_opponent_pieces(board_state, curr_player)
+        self.in_check = board_state.is_check() and board_state.turn == self.color
+        self.illegal_moves = []
+        self.particles = [board_state.copy(stack=False) for _ in range(num_particles)]
+        self.rng = random.Random(seed)
+
+    '''
+    BeliefState.illegal_attempt:
+
+    The umpire rejected one of the player's moves. Particles in which the move is legal are dropped.
+
+    Parameters:
+        move - python-chess Move, the rejected move
+
+    Returns:
+        Void return, updates the belief
+    '''
+    def illegal_attempt(self, move):
+        self.illegal_moves.append(move)
+        self.filter(lambda board: not board.is_legal(move))
+
+    '''
+    BeliefState.own_move:
+
+    The umpire accepted one of the player's moves
+
+    Parameters:
+        move - python-chess Move, the move
+        capture - (square, piece_type) announced by the umpire, as returned by umpire_capture
+        check - Boolean, whether the move gives check
+
+    Returns:
+        Void return, updates the view, the opponent's piece counts and the particles
+    '''
+    def own_move(self, move, capture, check):
+        self.view.push(move)
+        square, piece_type = capture
+        if piece_type is not None:
+            symbol = chess.piece_symbol(piece_type)
+            if symbol not in self.opponent_pieces:
+                # promotions are not announced, a piece the opponent did not have was a promoted pawn
+                symbol = "p"
+            self.opponent_pieces[symbol] -= 1
+            if self.opponent_pieces[symbol] == 0:
+                del self.opponent_pieces[symbol]
+        self.in_check = False
+        self.illegal_moves = []
+
+        def advance(board):
+            if not board.is_legal(move) or umpire_capture(board, move) != capture:
+                return False
+            board.push(move)
+            return board.is_check() == check
+        self.filter(advance)
+
+    '''
+    BeliefState.opponent_move:
+
+    The opponent made a move the player does not see, only its announcements
+
+    Parameters:
+        capture_square - python-chess Square, the square of the player's piece that was captured, None if
+        the move was not a capture
+        check - Boolean, whether the move gives check
+
+    Returns:
+        Void return, updates the view and the particles
+    '''
+    def opponent_move(self, capture_square, check):
+        if capture_square is not None:
+            self.view.remove_piece_at(capture_square)
+        self.view.push(chess.Move.null())
+        self.in_check = check
+
+        def advance(board):
+            moves = [move for move in board.legal_moves if umpire_capture(board, move)[0] == capture_square]
+            self.rng.shuffle(moves)
+            for move in moves:
+                board.push(move)
+                if board.is_check() == check:
+                    return True
+                board.pop()
+            return False
+        self.filter(advance)
+
+    '''
+    BeliefState.filter:
+
+    Applies an update to every particle and replaces the particles it rejects by copies of the others,
+    or all of them by new random placements consistent with the view if it rejects every one
+
+    Parameters:
+        update - function, takes a particle, updates it in place and returns whether it is still consistent
+
+    Returns:
+        Void return, updates the particles
+    '''
+    def filter(self, update):
+        alive = [board for board in self.particles if update(board)]
+        if not alive:
+            alive = [self.random_placement() for _ in self.particles]
+        self.particles = alive + [self.rng.choice(alive).copy(stack=False) for _ in range(len(self.particles) - len(alive))]
+
+    '''
+    BeliefState.random_placement:
+
+    Places the opponent's remaining pieces on random empty squares of the view (no pawns on the first and
+    last ranks, the side not to move not in check), preferring a placement that matches the check
+    announcement and the rejected moves of this turn
+
+    Returns:
+        python-chess BoardState, a full board
+    '''
+    def random_placement(self):
+        opponent_color = not self.color
+        for _ in range(PLACEMENT_TRIES):
+            board = self.view.copy(stack=False)
+            board.ep_square = None
+            empty = [square for square in chess.SQUARES if board.piece_at(square) is None]
+            self.rng.shuffle(empty)
+            for symbol, count in self.opponent_pieces.items():
+                piece = chess.Piece.from_symbol(symbol if opponent_color == chess.BLACK else symbol.upper())
+                for _ in range(count):
+                    square = next((s for s in empty if piece.piece_type != chess.PAWN or not chess.BB_SQUARES[s] & chess.BB_BACKRANKS), None)
+                    if square is None:
+                        break
+                    empty.remove(square)
+                    board.set_piece_at(square, piece)
+            board.castling_rights = board.clean_castling_rights()
+            if board.is_valid() and (board.turn != self.color or board.is_check() == self.in_check) and \
+                    not any(board.is_legal(move) for move in self.illegal_moves):
+                return board
+        return board
+
+    '''
+    BeliefState.opponent_occupancy:
+
+    Returns:
+        list of 64 Floats, per square the share of the particles with an opponent piece there
+    '''
+    def opponent_occupancy(self):
+        counts = [0] * 64
+        for board in self.particles:
+            for square in chess.scan_reversed(board.occupied_co[not self.color]):
+                counts[square] += 1
+        return [count / len(self.particles) for count in counts]
+
+    '''
+    BeliefState.sample:
+
+    Parameters:
+        k - Int, the number of full boards to draw
+
+    Returns:
+        list of python-chess BoardState, k full boards drawn from the particles (copies)
+    '''
+    def sample(self, k):
+        return [self.rng.choice(self.particles).copy(stack=False) for _ in range(k)]
+
+    '''
+    BeliefState.candidate_moves:
+
+    The moves the player can try from its view: the view's pseudo-legal moves (the opponent's pieces are missing,
+    so some are blocked or leave the king in check) and the diagonal pawn tries (PAWN_TRIES) onto squares without
+    one of the player's pieces, less the moves rejected this turn. Every legal move is among them (a promotion
+    as the queen one). They are ranked by their chance of being legal: the share of the particles a view move is
+    legal in, and for a pawn try the share with an opponent piece on its target (opponent_occupancy), which does
+    not need the try to be tested on every particle.
+
+    Returns:
+        list of python-chess Move, the most likely to be legal first
+    '''
+    def candidate_moves(self):
+        chances = {move: sum(board.is_legal(move) for board in self.particles) / len(self.particles)
+                   for move in self.view.generate_pseudo_legal_moves() if move not in self.illegal_moves}
+        own = self.view.occupied_co[self.color]
+        occupancy = self.opponent_occupancy()
+        for square in chess.scan_reversed(self.view.pawns & own):
+            for move in PAWN_TRIES[self.color][square]:
+                if not chess.BB_SQUARES[move.to_square] & own and move not in self.illegal_moves:
+                    chances.setdefault(move, occupancy[move.to_square])
+        return sorted(chances, key=lambda move: -chances[move])
+
+    '''
+    BeliefState.plan_moves:
+
+    The moves to try this turn, in order, until the umpire accepts one: the moves a search picks on k boards
+    sampled from the particles, the most often picked first, then the other candidate_moves in their order. The
+    searches and the ranking are done once, on the first move drawn, into a heap keyed by (votes, rank), and every
+    further try only pops the heap in O(log n), so a turn with many rejections does not sort the moves again.
+
+    Parameters:
+        choose - function, takes a full board and returns a move in UCI format ("" for none)
+        k - Int, the number of boards to sample and search, 0 to order the candidate moves only
+
+    Returns:
+        generator of Strings, the moves in UCI format, to be drawn with next() as the umpire rejects them
+    '''
+    def plan_moves(self, choose, k):
+        votes = Counter(move for move in map(choose, self.sample(k)) if move)
+        ranks = {move.uci(): rank for rank, move in enumerate(self.candidate_moves())}
+        # a searched move missing from the candidates (an underpromotion capture) goes after the ranked ones
+        heap = [(-votes[move], ranks.get(move, len(ranks)), move) for move in votes.keys() | ranks.keys()]
+        heapq.heapify(heap)
+        while heap:
+            yield heapq.heappop(heap)[2]
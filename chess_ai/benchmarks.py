@@ -0,0 +1,533 @@
+import argparse
+import chess
+import json
+import numpy as np
+import platform
+import random
+import sys
+import time
+import tracemalloc
+import heuristics
+import rollout
+from node import Node
+from tree_arena import TreeArena
+from alpha_beta_ai import depth_limited_ab_search, make_unmake_ab_search, SearchStats
+from mcts_ai import mcts
+from belief_state import BeliefState, masked_board
+from game_driver import play_game, RandomPlayer
+import host_chess_game
+import utils
+from datetime import datetime
+
+# the fixed positions of the suite, each also benchmarked as a Kriegspiel position for the side to move
+POSITIONS = {
+    "opening": "r1bqkbnr/pppp1ppp/2n5/1B2p3/4P3/5N2/PPPP1PPP/RNBQK2R b KQkq - 3 3",
+    "middlegame": "r2q1rk1/pp2bppp/2n1pn2/3p1b2/2PP4/2N1PN2/PP2BPPP/R1BQ1RK1 w - - 0 9",
+    "endgame": "8/5pk1/6p1/8/3R4/6P1/5PKP/r7 w - - 0 40",
+}
+AB_DEPTHS = (1, 2, 3)  # depths of the alpha-beta benchmarks
+MCTS_SIMS = 200  # simulations per MCTS benchmark
+KRIEGSPIEL_SAMPLES = 4  # sampled boards searched per Kriegspiel plan benchmark
+HEURISTIC_CALLS = 3000  # calls per heuristic benchmark, spread over the positions
+HOST_GAMES = 3  # random_ai games per host_game benchmark
+DRIVER_GAMES = 20  # random games per game_driver benchmark
+SUITE_REPEATS = 3  # each measurement is repeated and the best rate kept, to damp the noise of the machine
+MIN_MEASURE_SECONDS = 0.2  # a measurement calls its function until at least this much time has passed
+BASELINE_PATH = "benchmark_baseline.json"
+REGRESSION_TOLERANCE = 0.25  # a metric regresses when it falls more than this fraction below its baseline
+
+'''
+legacy_get_material_value:
+
+The string parsing version of heuristics.get_material_value, kept as the reference the bitboard
+version is checked and timed against
+
+Parameters:
+    - same as heuristics.get_material_value
+
+Returns:
+    the same value as heuristics.get_material_value
+'''
+def legacy_get_material_value(board_state, curr_player, kriegspiel=False, opponent_pieces=None, weight=1):
+    board_array = utils.get_board_state_array(board_state)
+    white_points = 0
+    black_points = 0
+
+    for row in range(8):
+        for col in range(8):
+            if board_array[row][col] == ".":
+                continue
+            elif kriegspiel:
+                if board_array[row][col].isupper() and curr_player == "W":
+                    white_points += heuristics.PIECE_VALUES[board_array[row][col].lower()]
+                elif board_array[row][col].islower() and curr_player == "B":
+                    black_points += heuristics.PIECE_VALUES[board_array[row][col]]
+            else:
+                if board_array[row][col].isupper():
+                    white_points += heuristics.PIECE_VALUES[board_array[row][col].lower()]
+                elif board_array[row][col].islower():
+                    black_points += heuristics.PIECE_VALUES[board_array[row][col]]
+    if kriegspiel:
+        for piece in opponent_pieces:
+            if curr_player == "W":
+                black_points += heuristics.PIECE_VALUES[piece] * opponent_pieces[piece]
+            else:
+                white_points += heuristics.PIECE_VALUES[piece] * opponent_pieces[piece]
+    if curr_player == "W":
+        return (white_points - black_points) * weight
+    return (black_points - white_points) * weight
+
+'''
+legacy_count_attacks:
+
+The string parsing version of heuristics.count_attacks, kept as the reference the bitboard
+version is checked and timed against
+
+Parameters:
+    - same as heuristics.count_attacks
+
+Returns:
+    the same value as heuristics.count_attacks
+'''
+def legacy_count_attacks(board_state, curr_player):
+    board_array = utils.get_board_state_array(board_state)
+    num_pieces_attacked = 0
+    for row in range(8):
+        for col in range(8):
+            piece = board_array[row][col]
+            pos = 8*(7-row)+col
+            if board_array[row][col] == ".":
+                continue
+            if piece.isupper() and curr_player == "W" and board_state.is_attacked_by(chess.BLACK, pos):
+                num_pieces_attacked += 1
+            elif piece.islower() and curr_player == "B" and board_state.is_attacked_by(chess.WHITE, pos):
+                num_pieces_attacked += 1
+    return num_pieces_attacked
+
+'''
+random_positions:
+
+Generates positions by playing random games from the starting position, for benchmarking
+
+Parameters:
+    - num_positions - Int, the number of positions to generate
+    - seed - Int, the seed of the random games, so that runs are comparable
+
+Returns:
+    list of python-chess BoardState
+'''
+def random_positions(num_positions, seed=0):
+    rng = random.Random(seed)
+    positions = []
+    board = chess.Board()
+    while len(positions) < num_positions:
+        if board.is_game_over():
+            board = chess.Board()
+        board.push(rng.choice(list(board.legal_moves)))
+        positions.append(board.copy(stack=False))
+    return positions
+
+'''
+time_per_call:
+
+Parameters:
+    - func - function, called once per position
+    - positions - list of python-chess BoardState
+    - repeats - Int, the number of passes over the positions
+
+Returns:
+    Float, the number of calls per second
+'''
+def time_per_call(func, positions, repeats=1):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for board in positions:
+            func(board)
+    return repeats * len(positions) / (time.perf_counter() - start)
+
+'''
+benchmark_heuristics:
+
+Microbenchmark of the leaf evaluation. Checks that the bitboard heuristics return exactly the scores
+of the string parsing versions, then prints the evaluations per second of both.
+
+Parameters:
+    - num_positions - Int, the number of random positions to evaluate
+    - repeats - Int, the number of passes over the positions
+
+Returns:
+    Dictionary mapping the name of each evaluation to its evaluations per second
+'''
+def benchmark_heuristics(num_positions=500, repeats=3):
+    positions = random_positions(num_positions)
+    for board in positions:
+        for player in ("W", "B"):
+            opponent_pieces = heuristics.count_opponent_pieces(board, player)
+            assert heuristics.get_material_value(board, player) == legacy_get_material_value(board, player)
+            assert heuristics.get_material_value(board, player, True, opponent_pieces) == \
+                legacy_get_material_value(board, player, True, opponent_pieces)
+            assert heuristics.count_attacks(board, player) == legacy_count_attacks(board, player)
+
+    results = {
+        "legacy_get_material_value": time_per_call(lambda b: legacy_get_material_value(b, "W"), positions, repeats),
+        "get_material_value": time_per_call(lambda b: heuristics.get_material_value(b, "W"), positions, repeats),
+        "legacy_count_attacks": time_per_call(lambda b: legacy_count_attacks(b, "W"), positions, repeats),
+        "count_attacks": time_per_call(lambda b: heuristics.count_attacks(b, "W"), positions, repeats),
+    }
+    for name, evals_per_sec in results.items():
+        print("{:<28} {:>12.0f} evals/sec".format(name, evals_per_sec))
+    return results
+
+'''
+benchmark_batch_evaluation:
+
+Checks that heuristics.batch_evaluate returns exactly the values of the one position at a time
+heuristics, then prints the evaluations per second of both, with and without the packing step
+
+Parameters:
+    - num_positions - Int, the number of random positions to evaluate in one batch
+    - repeats - Int, the number of passes over the positions
+
+Returns:
+    Dictionary mapping the name of each evaluation to its evaluations per second
+'''
+def benchmark_batch_evaluation(num_positions=2000, repeats=3):
+    positions = random_positions(num_positions)
+    for player in ("W", "B"):
+        expected = [heuristics.get_material_value(board, player) - heuristics.count_attacks(board, player) for board in positions]
+        assert list(heuristics.batch_evaluate(positions, player)) == expected
+
+    packed = heuristics.pack_boards(positions)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        heuristics.batch_evaluate(positions, "W")
+    with_packing = repeats * num_positions / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        heuristics.batch_evaluate(packed, "W")
+    packed_only = repeats * num_positions / (time.perf_counter() - start)
+    results = {
+        "scalar_evaluation": time_per_call(lambda b: heuristics.get_material_value(b, "W") - heuristics.count_attacks(b, "W"), positions, repeats),
+        "batch_evaluate": with_packing,
+        "batch_evaluate_prepacked": packed_only,
+    }
+    for name, evals_per_sec in results.items():
+        print("{:<28} {:>12.0f} evals/sec".format(name, evals_per_sec))
+    return results
+
+'''
+benchmark_tree_memory:
+
+Builds the same breadth-first tree of positions as Node objects (a board per node, as the search
+algorithms create them) and in a TreeArena, and prints nodes per MB and nodes per second of both
+
+Parameters:
+    - num_nodes - Int, the number of nodes to create
+
+Returns:
+    Dictionary mapping "node" and "arena" to (nodes per MB, nodes per second)
+'''
+def benchmark_tree_memory(num_nodes=5000):
+    results = {}
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    root = Node(board_state=chess.Board())
+    frontier, count = [root], 1
+    while count < num_nodes:
+        node = frontier.pop(0)
+        for move in node.board_state.legal_moves:
+            board_state = node.board_state.copy()
+            board_state.push(move)
+            child = Node(board_state=board_state, move=move.uci(), parent=node)
+            node.children.add(child)
+            frontier.append(child)
+            count += 1
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    results["node"] = (count / (used / 2**20), count / elapsed)
+    del root, frontier
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    arena = TreeArena(chess.Board())
+    frontier, board = [0], chess.Board()
+    while len(arena) < num_nodes:
+        idx = frontier.pop(0)
+        board = arena.board_at(idx)
+        first = arena.expand(idx, list(board.legal_moves))
+        frontier.extend(range(first, len(arena)))
+    elapsed = time.perf_counter() - start
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    results["arena"] = (len(arena) / (used / 2**20), len(arena) / elapsed)
+
+    for name, (nodes_per_mb, nodes_per_sec) in results.items():
+        print("{:<28} {:>12.0f} nodes/MB {:>12.0f} nodes/sec".format(name, nodes_per_mb, nodes_per_sec))
+    return results
+
+'''
+benchmark_rollouts:
+
+Prints the playouts per second of the rollout engine, for every rollout policy and depth cutoff, played
+from random positions on one board that is pushed and popped
+
+Parameters:
+    - num_positions - Int, the number of random positions to play out from
+    - depths - tuple of Int, the depth cutoffs to time
+
+Returns:
+    Dictionary mapping (policy, depth) to the playouts per second
+'''
+def benchmark_rollouts(num_positions=200, depths=(5, 20)):
+    positions = [board for board in random_positions(num_positions) if not board.is_game_over()]
+    rng = random.Random(0)
+    results = {}
+    for policy in rollout.POLICIES:
+        for depth in depths:
+            results[(policy, depth)] = time_per_call(lambda b: rollout.unplay(b, rollout.play(b, depth, policy, rng)), positions)
+            print("{:<28} {:>12.0f} playouts/sec".format("rollout {} depth {}".format(policy, depth), results[(policy, depth)]))
+    return results
+
+
+'''
+suite_positions:
+
+Parameters:
+    - NO PARAMETERS
+
+Returns:
+    list of (name, board, curr_player) for the positions of POSITIONS, curr_player being the side to move
+'''
+def suite_positions():
+    positions = []
+    for name, fen in POSITIONS.items():
+        board = chess.Board(fen)
+        positions.append((name, board, "W" if board.turn == chess.WHITE else "B"))
+    return positions
+
+'''
+best_rate:
+
+Parameters:
+    - func - function, does some work and returns how many units (nodes, simulations, calls, games) it did
+    - repeats - Int, the number of measurements, each calling func until MIN_MEASURE_SECONDS have passed
+
+Returns:
+    Float, the highest number of units per second over the measurements
+'''
+def best_rate(func, repeats=SUITE_REPEATS):
+    best = 0.
+    for _ in range(repeats):
+        units = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < MIN_MEASURE_SECONDS:
+            units += func()
+        best = max(best, units / (time.perf_counter() - start))
+    return best
+
+'''
+tree_size:
+
+Parameters:
+    - node - Node, the root of a tree built by depth_limited_ab_search
+
+Returns:
+    Int, the number of nodes in the tree, the nodes the search created
+'''
+def tree_size(node):
+    count = 0
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        count += 1
+        stack.extend(node.children)
+    return count
+
+'''
+run_suite:
+
+The benchmark suite over the fixed positions: nodes per second of depth_limited_ab_search (and of the make-unmake
+search) at each of AB_DEPTHS, simulations per second of mcts, Kriegspiel move plans per second (BeliefState.plan_moves
+over KRIEGSPIEL_SAMPLES boards searched to depth 1, with the position as the start of the belief), evaluations per
+second of each heuristics function, and games per second of host_game and of game_driver between random players. Seeded, so every run does the same work.
+
+Parameters:
+    - NO PARAMETERS
+
+Returns:
+    Dictionary mapping each metric name ("ab_nodes_per_sec/middlegame/depth2", ...) to its rate, higher is better
+'''
+def run_suite():
+    metrics = {}
+    positions = suite_positions()
+    for name, board, curr_player in positions:
+        for depth in AB_DEPTHS:
+            def node_search():
+                node = Node(board_state=board.copy())
+                depth_limited_ab_search(node, depth, -np.infty, np.infty, True, curr_player)
+                return tree_size(node)
+
+            def make_unmake_search():
+                stats = SearchStats()
+                make_unmake_ab_search(Node(board_state=board.copy()), depth, -np.infty, np.infty, True,
+                                      curr_player, stats=stats)
+                return stats.nodes
+            metrics["ab_nodes_per_sec/{}/depth{}".format(name, depth)] = best_rate(node_search)
+            metrics["ab_make_unmake_nodes_per_sec/{}/depth{}".format(name, depth)] = best_rate(make_unmake_search)
+
+        def mcts_search():
+            random.seed(0)
+            stats = {}
+            mcts(Node(board_state=board.copy()), sims=MCTS_SIMS, stats=stats, early_stop=False)
+            return stats["sims"]
+        metrics["mcts_sims_per_sec/" + name] = best_rate(mcts_search)
+
+        def kriegspiel_plan():
+            belief = BeliefState(board, curr_player, seed=0)
+            # the plan is lazy, drawing the first move runs the searches and builds the heap
+            next(belief.plan_moves(lambda sample: make_unmake_ab_search(Node(board_state=sample), 1, -np.infty, np.infty, True,
+                                                                        curr_player)[1], KRIEGSPIEL_SAMPLES))
+            return 1
+        metrics["kriegspiel_plans_per_sec/" + name] = best_rate(kriegspiel_plan)
+
+    boards = [board for _, board, _ in positions]
+    kriegspiel_boards = [(masked_board(board, curr_player), curr_player, heuristics.count_opponent_pieces(board, curr_player))
+                         for _, board, curr_player in positions]
+    evaluations = {
+        "get_material_value": lambda: [heuristics.get_material_value(board, "W") for board in boards],
+        "get_material_value_kriegspiel": lambda: [heuristics.get_material_value(board, curr_player, True, opponent_pieces)
+                                                  for board, curr_player, opponent_pieces in kriegspiel_boards],
+        "material_points": lambda: [heuristics.material_points(board, chess.WHITE) for board in boards],
+        "count_attacks": lambda: [heuristics.count_attacks(board, "W") for board in boards],
+        "attacked_squares": lambda: [heuristics.attacked_squares(board, chess.WHITE) for board in boards],
+        "count_opponent_pieces": lambda: [heuristics.count_opponent_pieces(board, "W") for board in boards],
+        "opponent_check": lambda: [heuristics.opponent_check(board, move, "W") for board, move in checks],
+        "batch_evaluate": lambda: heuristics.batch_evaluate(boards, "W"),
+    }
+    checks = [(board, next(iter(board.legal_moves)).uci()) for board in boards if any(board.legal_moves)]
+    for function, evaluate in evaluations.items():
+        def evaluate_many():
+            count = 0
+            while count < HEURISTIC_CALLS:
+                count += len(evaluate())
+            return count
+        metrics["evals_per_sec/" + function] = best_rate(evaluate_many)
+
+    for kriegspiel in (False, True):
+        variant = "kriegspiel" if kriegspiel else "standard"
+
+        def host_games():
+            for seed in range(HOST_GAMES):
+                host_chess_game.host_game(white="random_ai", black="random_ai", kriegspiel=kriegspiel, print_updates=False,
+                                          print_output=False, seed=seed)
+            return HOST_GAMES
+
+        def driver_games():
+            white, black = RandomPlayer(0), RandomPlayer(1)
+            for _ in range(DRIVER_GAMES):
+                play_game(white, black, kriegspiel=kriegspiel)
+            return DRIVER_GAMES
+        metrics["host_games_per_sec/" + variant] = best_rate(host_games)
+        metrics["driver_games_per_sec/" + variant] = best_rate(driver_games)
+    return metrics
+
+'''
+suite_report:
+
+Parameters:
+    - metrics - Dictionary, the metrics of run_suite
+
+Returns:
+    Dictionary, the machine-readable report: the metrics and the machine and versions they were measured with
+'''
+def suite_report(metrics):
+    return {
+        "machine": {"python": platform.python_version(), "python_chess": chess.__version__, "numpy": np.__version__,
+                    "platform": platform.platform(), "processor": platform.processor()},
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "metrics": metrics,
+    }
+
+'''
+compare_to_baseline:
+
+Parameters:
+    - metrics - Dictionary, the metrics of run_suite
+    - baseline - Dictionary, the metrics of a stored report
+    - tolerance - Float, the fraction a metric may fall below its baseline before it counts as a regression
+
+Returns:
+    list of (name, baseline value, value, ratio) of the metrics that regressed, worst first. Metrics missing on
+    either side are not compared
+'''
+def compare_to_baseline(metrics, baseline, tolerance=REGRESSION_TOLERANCE):
+    regressions = []
+    for name, value in metrics.items():
+        if name in baseline and baseline[name] > 0:
+            ratio = value / baseline[name]
+            if ratio < 1 - tolerance:
+                regressions.append((name, baseline[name], value, ratio))
+    regressions.sort(key=lambda regression: regression[3])
+    return regressions
+
+'''
+print_metrics:
+
+Parameters:
+    - metrics - Dictionary, the metrics of run_suite
+    - baseline - Dictionary, optional metrics to print each metric's ratio against
+
+Returns:
+    Void return, prints one line per metric
+'''
+def print_metrics(metrics, baseline=None):
+    for name, value in metrics.items():
+        line = "{:<60} {:>12.1f}/sec".format(name, value)
+        if baseline and baseline.get(name):
+            line += "  x{:.2f} of baseline".format(value / baseline[name])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of the search, evaluation and game hosting code")
+    parser.add_argument("--output", help="write the report of the suite to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="the stored report to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="fraction a metric may fall below its baseline")
+    parser.add_argument("--micro", action="store_true", help="also run the microbenchmarks against the legacy implementations")
+    args = parser.parse_args()
+
+    start = datetime.now()
+    if args.micro:
+        benchmark_heuristics()
+        benchmark_batch_evaluation()
+        benchmark_tree_memory()
+        benchmark_rollouts()
+    report = suite_report(run_suite())
+    try:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["metrics"]
+    except FileNotFoundError:
+        baseline = None
+    print_metrics(report["metrics"], baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    end = datetime.now()
+    print("Total time:", end-start)
+    if baseline is not None and not args.save_baseline:
+        regressions = compare_to_baseline(report["metrics"], baseline, args.tolerance)
+        for name, old, new, ratio in regressions:
+            print("REGRESSION {}: {:.1f}/sec -> {:.1f}/sec (x{:.2f})".format(name, old, new, ratio))
+        if regressions:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+import chess
+import heuristics
+
+# PIECE_VALUES indexed by python-chess piece type (None, pawn, knight, bishop, rook, queen, king)
+TYPE_VALUES = [0] + [heuristics.PIECE_VALUES[chess.piece_symbol(piece_type)] for piece_type in chess.PIECE_TYPES]
+
+# Optional piece-square tables, in pawns, from white's point of view with a1 = index 0
+# (black uses the square mirrored vertically). Values of the "simplified evaluation function".
+PIECE_SQUARE_TABLES = {
+    chess.PAWN: [
+        0, 0, 0, 0, 0, 0, 0, 0,
+        .05, .10, .10, -.20, -.20, .10, .10, .05,
+        .05, -.05, -.10, 0, 0, -.10, -.05, .05,
+        0, 0, 0, .20, .20, 0, 0, 0,
+        .05, .05, .10, .25, .25, .10, .05, .05,
+        .10, .10, .20, .30, .30, .20, .10, .10,
+        .50, .50, .50, .50, .50, .50, .50, .50,
+        0, 0, 0, 0, 0, 0, 0, 0],
+    chess.KNIGHT: [
+        -.50, -.40, -.30, -.30, -.30, -.30, -.40, -.50,
+        -.40, -.20, 0, .05, .05, 0, -.20, -.40,
+        -.30, .05, .10, .15, .15, .10, .05, -.30,
+        -.30, 0, .15, .20, .20, .15, 0, -.30,
+        -.30, .05, .15, .20, .20, .15, .05, -.30,
+        -.30, 0, .10, .15, .15, .10, 0, -.30,
+        -.40, -.20, 0, 0, 0, 0, -.20, -.40,
+        -.50, -.40, -.30, -.30, -.30, -.30, -.40, -.50],
+    chess.BISHOP: [
+        -.20, -.10, -.10, -.10, -.10, -.10, -.10, -.20,
+        -.10, .05, 0, 0, 0, 0, .05, -.10,
+        -.10, .10, .10, .10, .10, .10, .10, -.10,
+        -.10, 0, .10, .10, .10, .10, 0, -.10,
+        -.10, .05, .05, .10, .10, .05, .05, -.10,
+        -.10, 0, .05, .10, .10, .05, 0, -.10,
+        -.10, 0, 0, 0, 0, 0, 0, -.10,
+        -.20, -.10, -.10, -.10, -.10, -.10, -.10, -.20],
+    chess.ROOK: [
+        0, 0, 0, .05, .05, 0, 0, 0,
+        -.05, 0, 0, 0, 0, 0, 0, -.05,
+        -.05, 0, 0, 0, 0, 0, 0, -.05,
+        -.05, 0, 0, 0, 0, 0, 0, -.05,
+        -.05, 0, 0, 0, 0, 0, 0, -.05,
+        -.05, 0, 0, 0, 0, 0, 0, -.05,
+        .05, .10, .10, .10, .10, .10, .10, .05,
+        0, 0, 0, 0, 0, 0, 0, 0],
+    chess.QUEEN: [
+        -.20, -.10, -.10, -.05, -.05, -.10, -.10, -.20,
+        -.10, 0, .05, 0, 0, 0, 0, -.10,
+        -.10, .05, .05, .05, .05, .05, 0, -.10,
+        0, 0, .05, .05, .05, .05, 0, -.05,
+        -.05, 0, .05, .05, .05, .05, 0, -.05,
+        -.10, 0, .05, .05, .05, .05, 0, -.10,
+        -.10, 0, 0, 0, 0, 0, 0, -.10,
+        -.20, -.10, -.10, -.05, -.05, -.10, -.10, -.20],
+    chess.KING: [
+        .20, .30, .10, 0, 0, .10, .30, .20,
+        .20, .20, 0, 0, 0, 0, .20, .20,
+        -.10, -.20, -.20, -.20, -.20, -.20, -.20, -.10,
+        -.20, -.30, -.30, -.40, -.40, -.30, -.30, -.20,
+        -.30, -.40, -.40, -.50, -.50, -.40, -.40, -.30,
+        -.30, -.40, -.40, -.50, -.50, -.40, -.40, -.30,
+        -.30, -.40, -.40, -.50, -.50, -.40, -.40, -.30,
+        -.30, -.40, -.40, -.50, -.50, -.40, -.40, -.30],
+}
+
+
+'''
+Classes:
+    IncrementalEval
+        Evaluation state that is updated as moves are made and unmade during a search, so that the
+        material at a leaf is read in O(1) instead of being recomputed from the board. Moves must be
+        pushed on a full board, since a masked Kriegspiel view does not show captures of the
+        opponent's pieces.
+
+        Properties:
+            - piece_square_tables: dictionary mapping piece type to a 64 entry table, or None to
+            evaluate material only
+            - counts: counts[color][piece_type], the number of pieces of each type per side
+            - material: material[color], the PIECE_VALUES of each side's pieces
+            - positional: positional[color], the piece-square score of each side
+            - stack: the changes made by each pushed move, so that pop can undo them
+'''
+
+class IncrementalEval:
+
+    '''
+    Establishes the object, and optionally sets it up for a board
+
+    Parameters:
+        board_state - python-chess BoardState, the board to evaluate, None to call reset later
+        piece_square_tables - dictionary, optional piece-square tables such as PIECE_SQUARE_TABLES
+
+    Returns:
+        A new object of class IncrementalEval
+    '''
+    def __init__(self, board_state=None, piece_square_tables=None):
+        self.piece_square_tables = piece_square_tables
+        if board_state is not None:
+            self.reset(board_state)
+
+    '''
+    IncrementalEval.reset:
+
+    Recomputes the evaluation state from scratch for a board and clears the move stack
+
+    Parameters:
+        board_state - python-chess BoardState, the board to evaluate
+
+    Returns:
+        Void return, sets the counts, material and positional scores
+    '''
+    def reset(self, board_state):
+        self.counts = [[0] * 7, [0] * 7]
+        self.material = [0, 0]
+        self.positional = [0, 0]
+        self.stack = []
+        for square, piece in board_state.piece_map().items():
+            self.counts[piece.color][piece.piece_type] += 1
+            self.material[piece.color] += TYPE_VALUES[piece.piece_type]
+            self.positional[piece.color] += self.square_value(piece.piece_type, piece.color, square)
+
+    '''
+    IncrementalEval.square_value:
+
+    Parameters:
+        piece_type - python-chess PieceType
+        color - python-chess Color
+        square - python-chess Square
+
+    Returns:
+        Float, the piece-square score of the piece on the square, 0 without tables
+    '''
+    def square_value(self, piece_type, color, square):
+        if self.piece_square_tables is None:
+            return 0
+        if color == chess.BLACK:
+            square = chess.square_mirror(square)
+        return self.piece_square_tables[piece_type][square]
+
+    '''
+    IncrementalEval.push:
+
+    Updates the state for a move. Must be called before the move is pushed on the board.
+
+    Parameters:
+        board_state - python-chess BoardState, the full board, before the move is made
+        move - python-chess Move, the move that is about to be made
+
+    Returns:
+        Void return, updates the state and remembers the change for pop
+    '''
+    def push(self, board_state, move):
+        color = board_state.turn
+        piece_type = board_state.piece_type_at(move.from_square)
+        if board_state.is_en_passant(move):
+            captured_type = chess.PAWN
+            captured_square = move.to_square - 8 if color == chess.WHITE else move.to_square + 8
+        elif board_state.is_castling(move):
+            captured_type = None
+        else:
+            captured_type = board_state.piece_type_at(move.to_square)
+            captured_square = move.to_square
+        positional_change = [0, 0]
+
+        if captured_type is not None:
+            self.counts[not color][captured_type] -= 1
+            self.material[not color] -= TYPE_VALUES[captured_type]
+            positional_change[not color] -= self.square_value(captured_type, not color, captured_square)
+        if move.promotion is not None:
+            self.counts[color][chess.PAWN] -= 1
+            self.counts[color][move.promotion] += 1
+            self.material[color] += TYPE_VALUES[move.promotion] - TYPE_VALUES[chess.PAWN]
+        if self.piece_square_tables is not None:
+            if board_state.is_castling(move):
+                # python-chess encodes castling as the king's move, the rook moves as well
+                rank = chess.square_rank(move.from_square)
+                kingside = board_state.is_kingside_castling(move)
+                king_to = chess.square(6 if kingside else 2, rank)
+                rook_from = chess.square(7 if kingside else 0, rank)
+                rook_to = chess.square(5 if kingside else 3, rank)
+                positional_change[color] += self.square_value(chess.KING, color, king_to) - \
+                    self.square_value(chess.KING, color, move.from_square) + \
+                    self.square_value(chess.ROOK, color, rook_to) - self.square_value(chess.ROOK, color, rook_from)
+            else:
+                new_type = move.promotion if move.promotion is not None else piece_type
+                positional_change[color] += self.square_value(new_type, color, move.to_square) - \
+                    self.square_value(piece_type, color, move.from_square)
+            self.positional[chess.WHITE] += positional_change[chess.WHITE]
+            self.positional[chess.BLACK] += positional_change[chess.BLACK]
+        self.stack.append((color, captured_type, move.promotion, positional_change))
+
+    '''
+    IncrementalEval.pop:
+
+    Undoes the changes of the last pushed move
+
+    Returns:
+        Void return, restores the state from before the last push
+    '''
+    def pop(self):
+        color, captured_type, promotion, positional_change = self.stack.pop()
+        if captured_type is not None:
+            self.counts[not color][captured_type] += 1
+            self.material[not color] += TYPE_VALUES[captured_type]
+        if promotion is not None:
+            self.counts[color][chess.PAWN] += 1
+            self.counts[color][promotion] -= 1
+            self.material[color] -= TYPE_VALUES[promotion] - TYPE_VALUES[chess.PAWN]
+        self.positional[chess.WHITE] -= positional_change[chess.WHITE]
+        self.positional[chess.BLACK] -= positional_change[chess.BLACK]
+
+    '''
+    IncrementalEval.material_value:
+
+    The same value as heuristics.get_material_value of the full board, in O(1)
+
+    Parameters:
+        curr_player - String, the current player "W" or "B"
+
+    Returns:
+        Int, (PlayerPoints - OpponentsPoints)
+    '''
+    def material_value(self, curr_player):
+        if curr_player == "W":
+            return self.material[chess.WHITE] - self.material[chess.BLACK]
+        return self.material[chess.BLACK] - self.material[chess.WHITE]
+
+    '''
+    IncrementalEval.positional_value:
+
+    Parameters:
+        curr_player - String, the current player "W" or "B"
+
+    Returns:
+        Float, the player's piece-square score minus the opponent's, 0 without tables
+    '''
+    def positional_value(self, curr_player):
+        if curr_player == "W":
+            return self.positional[chess.WHITE] - self.positional[chess.BLACK]
+        return self.positional[chess.BLACK] - self.positional[chess.WHITE]
+
+    '''
+    IncrementalEval.opponent_pieces:
+
+    The opponent_pieces dictionary that Node.update_opponent_pieces would build for the full board
+
+    Parameters:
+        curr_player - String, the current player "W" or "B"
+
+    Returns:
+        Dictionary mapping the lowercase piece symbol to the number of opponent pieces of that type
+    '''
+    def opponent_pieces(self, curr_player):
+        counts = self.counts[chess.BLACK if curr_player == "W" else chess.WHITE]
+        return {chess.piece_symbol(piece_type): counts[piece_type] for piece_type in chess.PIECE_TYPES if counts[piece_type] > 0}
@@ -0,0 +1,416 @@
+import chess
+import random
+import time
+import numpy as np
+from node import Node, PAWN_TRIES
+from belief_state import BeliefState, masked_board, umpire_capture
+from alpha_beta_ai import make_unmake_ab_search, SearchStats
+from mcts_ai import mcts, MCTSTree
+from transposition_table import TranspositionTable
+from move_ordering import MoveOrderer
+from evaluation import IncrementalEval
+
+REPETITION_MIN_PLIES = 16  # a position cannot occur five times within fewer reversible plies
+
+'''
+Classes:
+    Player
+        A player of the headless driver. The driver calls choose_move with the player's view of the board, the
+        full board in standard chess (not a copy, the player must leave it as it found it) or the player's own
+        pieces only in Kriegspiel, and the seconds left on its clock (None without a time control). In
+        Kriegspiel a move the umpire rejects is handed to rejected and choose_move is called again, and the
+        umpire's announcements of both sides' moves are handed to moved and opponent_moved. A player that
+        searches in Kriegspiel keeps a BeliefState built from these announcements and plays the moves of its
+        plan (planned_move), as host_game does. Subclasses implement choose_move; the base class picks a random move.
+
+        Properties:
+            - color: the python-chess Color the player plays in the current game
+            - curr_player: the same as "W" or "B", as the search functions take it
+            - kriegspiel: whether the current game is Kriegspiel
+            - rejected_moves: the moves the umpire rejected this turn
+            - rng: random.Random, the source of the random moves
+            - samples: the number of boards sampled from the belief and searched per Kriegspiel turn, 0 for a
+            player that keeps no belief
+            - belief: the BeliefState of the current Kriegspiel game, None in standard chess or if samples is 0
+            - plan: the generator of the moves left to try this turn (BeliefState.plan_moves), None before the
+            first try
+'''
+
+class Player:
+
+    '''
+    Establishes the player
+
+    Parameters:
+        seed - Int, optional seed of the random moves and of the belief's particles
+        samples - Int, the boards to search per Kriegspiel turn, 0 to keep no belief
+
+    Returns:
+        A new object of class Player
+    '''
+    def __init__(self, seed=None, samples=0):
+        self.color = chess.WHITE
+        self.curr_player = "W"
+        self.kriegspiel = False
+        self.rejected_moves = []
+        self.rng = random.Random(seed)
+        self.samples = samples
+        self.belief = None
+        self.plan = None
+
+    '''
+    Player.new_game:
+
+    Parameters:
+        color - python-chess Color, the side the player plays
+        kriegspiel - Boolean, whether the game is Kriegspiel
+        board - python-chess BoardState, the start position, known to both players, the standard one if None
+
+    Returns:
+        Void return, resets the player for a new game
+    '''
+    def new_game(self, color, kriegspiel=False, board=None):
+        self.color = color
+        self.curr_player = "W" if color == chess.WHITE else "B"
+        self.kriegspiel = kriegspiel
+        self.rejected_moves = []
+        self.plan = None
+        self.belief = None
+        if kriegspiel and self.samples > 0:
+            self.belief = BeliefState(chess.Board() if board is None else board, self.curr_player, seed=self.rng.randrange(2 ** 32))
+
+    '''
+    Player.choose_move:
+
+    Parameters:
+        board_view - python-chess BoardState, what the player sees of the board, to be left unchanged
+        clock - Float, the seconds left on the player's clock, None without a time control
+
+    Returns:
+        python-chess Move, the move to play
+    '''
+    def choose_move(self, board_view, clock):
+        return self.random_move(board_view)
+
+    '''
+    Player.rejected:
+
+    Parameters:
+        move - python-chess Move, a move the umpire rejected (Kriegspiel only)
+
+    Returns:
+        Void return, the move is not tried again this turn and the belief drops the boards it is legal on
+    '''
+    def rejected(self, move):
+        self.rejected_moves.append(move)
+        if self.belief is not None:
+            self.belief.illegal_attempt(move)
+
+    '''
+    Player.moved:
+
+    Parameters:
+        move - python-chess Move, the player's move, played on the board
+        capture - (square, piece_type), the umpire's capture announcement (umpire_capture), Kriegspiel only
+        check - Boolean, whether the move gives check, Kriegspiel only
+
+    Returns:
+        Void return, starts a new turn
+    '''
+    def moved(self, move, capture=(None, None), check=False):
+        self.rejected_moves = []
+        self.plan = None
+        if self.belief is not None:
+            self.belief.own_move(move, capture, check)
+
+    '''
+    Player.opponent_moved:
+
+    Parameters:
+        capture_square - python-chess Square, the square of the player's piece the opponent captured, None if
+        the move was not a capture
+        check - Boolean, whether the move gives check
+
+    Returns:
+        Void return, the umpire's announcement of an opponent move in Kriegspiel
+    '''
+    def opponent_moved(self, capture_square, check):
+        if self.belief is not None:
+            self.belief.opponent_move(capture_square, check)
+
+    '''
+    Player.planned_move:
+
+    The next move of the Kriegspiel plan: on the first try of a turn the belief samples and searches its boards
+    (BeliefState.plan_moves), every retry draws the next move of the same plan
+
+    Parameters:
+        search - function, takes a full board and returns a move in UCI format ("" for none)
+
+    Returns:
+        python-chess Move, None if there is no move left to try
+    '''
+    def planned_move(self, search):
+        if self.plan is None:
+            self.plan = self.belief.plan_moves(search, self.samples)
+        move = next(self.plan, None)
+        return None if move is None else chess.Move.from_uci(move)
+
+    '''
+    Player.random_move:
+
+    A uniformly random move. In standard chess the pseudo-legal moves are drawn without replacement until one does not
+    leave the king in check, which is uniform over the legal moves without testing all of them. In Kriegspiel it is
+    drawn from the view's pseudo-legal moves and the diagonal pawn tries (PAWN_TRIES), less the rejected moves
+
+    Parameters:
+        board_view - python-chess BoardState, as in choose_move
+
+    Returns:
+        python-chess Move, None if there is no move left to try
+    '''
+    def random_move(self, board_view):
+        moves = list(board_view.generate_pseudo_legal_moves())
+        if self.kriegspiel:
+            own = board_view.occupied_co[self.color]
+            for square in chess.scan_reversed(board_view.pawns & own):
+                moves.extend(move for move in PAWN_TRIES[self.color][square] if not chess.BB_SQUARES[move.to_square] & own)
+            moves = [move for move in moves if move not in self.rejected_moves]
+            return self.rng.choice(moves) if moves else None
+        while moves:
+            idx = self.rng.randrange(len(moves))
+            move = moves[idx]
+            if not board_view.is_into_check(move):
+                return move
+            moves[idx] = moves[-1]
+            moves.pop()
+        return None
+
+
+'''
+Classes:
+    RandomPlayer
+        Plays uniformly random moves (Player.random_move)
+'''
+
+class RandomPlayer(Player):
+    pass
+
+
+'''
+Classes:
+    AlphaBetaPlayer
+        Plays the move of make_unmake_ab_search to a fixed depth, with its own transposition table, move orderer and
+        incremental evaluation kept across moves. In Kriegspiel it searches boards sampled from its BeliefState and
+        tries the moves of its plan (Player.planned_move)
+
+        Properties:
+            - same as Player, plus
+            - depth: the search depth
+            - tt, orderer, evaluator, stats: the search state, see alpha_beta_ai
+'''
+
+class AlphaBetaPlayer(Player):
+
+    '''
+    Establishes the player
+
+    Parameters:
+        depth - Int, the search depth
+        tt_size_mb - Float, the memory of the transposition table, 0 for none
+        move_ordering - Boolean, whether to order moves with a MoveOrderer
+        seed - Int, optional seed of the random moves and of the belief
+        samples - Int, the boards of the belief searched per Kriegspiel turn
+
+    Returns:
+        A new object of class AlphaBetaPlayer
+    '''
+    def __init__(self, depth=2, tt_size_mb=64, move_ordering=True, seed=None, samples=4):
+        super().__init__(seed, samples)
+        self.depth = depth
+        self.tt = TranspositionTable(tt_size_mb) if tt_size_mb > 0 else None
+        self.orderer = MoveOrderer() if move_ordering else None
+        self.evaluator = IncrementalEval()
+        self.stats = SearchStats()
+
+    def choose_move(self, board_view, clock):
+        if self.plan is None:
+            if self.tt is not None:
+                self.tt.new_search()
+            if self.orderer is not None:
+                self.orderer.new_search()
+        if self.belief is not None:
+            return self.planned_move(self.search)
+        move = self.search(board_view)
+        return chess.Move.from_uci(move) if move else self.random_move(board_view)
+
+    '''
+    AlphaBetaPlayer.search:
+
+    Parameters:
+        board - python-chess BoardState, a full board, the player's view in standard chess or a sampled particle
+
+    Returns:
+        String, the move found in UCI format, "" if there is none
+    '''
+    def search(self, board):
+        # the search plays on its own copy of the board
+        value, move = make_unmake_ab_search(Node(board_state=board), self.depth, -np.infty, np.infty, True, self.curr_player, self.tt,
+                                            stats=self.stats, orderer=self.orderer, evaluator=self.evaluator)
+        return move
+
+
+'''
+Classes:
+    MCTSPlayer
+        Plays the move of mcts_ai.mcts with a fixed budget, reusing its tree between moves in standard chess. In
+        Kriegspiel it searches boards sampled from its BeliefState, each with the whole budget, and tries the
+        moves of its plan (Player.planned_move)
+
+        Properties:
+            - same as Player, plus
+            - budget: the keyword arguments of mcts_ai.mcts, e.g. {"sims": 200}
+            - tree: the MCTSTree kept between moves
+'''
+
+class MCTSPlayer(Player):
+
+    '''
+    Establishes the player
+
+    Parameters:
+        budget - Dictionary, optional keyword arguments of mcts_ai.mcts
+        seed - Int, optional seed of the random moves and of the belief (the playouts draw from the random module)
+        samples - Int, the boards of the belief searched per Kriegspiel turn
+
+    Returns:
+        A new object of class MCTSPlayer
+    '''
+    def __init__(self, budget=None, seed=None, samples=4):
+        super().__init__(seed, samples)
+        self.budget = budget or {}
+        self.tree = MCTSTree()
+
+    def new_game(self, color, kriegspiel=False, board=None):
+        super().new_game(color, kriegspiel, board)
+        self.tree = MCTSTree()
+
+    def choose_move(self, board_view, clock):
+        if self.belief is not None:
+            # the sampled boards change every turn, so no tree is kept between them
+            return self.planned_move(lambda sample: mcts(Node(board_state=sample), **self.budget))
+        move = mcts(Node(board_state=board_view), tree=self.tree, **self.budget)
+        return chess.Move.from_uci(move) if move else self.random_move(board_view)
+
+
+'''
+game_over:
+
+The end of the game as board.outcome() finds it, in the same order, with the expensive tests skipped when they cannot
+apply: the legal moves are only generated up to the first one, the material is only counted when it may have changed
+and the repetitions only looked for after enough reversible plies
+
+Parameters:
+    - board - python-chess BoardState
+    - check_material - Boolean, whether a piece may have been captured since the last test
+
+Returns:
+    python-chess Termination, None if the game goes on
+'''
+def game_over(board, check_material=True):
+    has_moves = any(board.generate_legal_moves())
+    if not has_moves and board.is_check():
+        return chess.Termination.CHECKMATE
+    if check_material and board.is_insufficient_material():
+        return chess.Termination.INSUFFICIENT_MATERIAL
+    if not has_moves:
+        return chess.Termination.STALEMATE
+    if board.halfmove_clock >= 150:
+        return chess.Termination.SEVENTYFIVE_MOVES
+    if board.halfmove_clock >= REPETITION_MIN_PLIES and board.is_fivefold_repetition():
+        return chess.Termination.FIVEFOLD_REPETITION
+    return None
+
+'''
+play_game:
+
+Plays one game between two Player objects without printing, copying the board per move or going through UCI strings:
+the moves are python-chess Moves pushed on one board. In Kriegspiel each side's view is kept up to date incrementally
+(its own moves pushed, its pieces taken off when they are captured, a null move for each opponent move), the
+players are told the umpire's announcements (Player.moved and Player.opponent_moved) and retry until the umpire
+accepts a move. A player that returns None (no move left to try) or, in standard chess,
+an illegal move raises a ValueError.
+
+Parameters:
+    - white - Player, the player of the white pieces
+    - black - Player, the player of the black pieces
+    - board - python-chess BoardState, optional start position (copied once), the standard one if None
+    - kriegspiel - Boolean, whether to play Kriegspiel
+    - time_control - Float, optional seconds on each clock for the whole game, a player whose clock runs out loses
+    - max_plies - Int, optional number of plies after which the game is adjudicated a draw
+
+Returns:
+    (result, termination, plies): "1-0", "0-1" or "1/2-1/2", the name of the python-chess Termination
+    ("TIME_FORFEIT" or "MAX_PLIES" for the driver's own endings) and the number of plies played
+'''
+def play_game(white, black, board=None, kriegspiel=False, time_control=None, max_plies=None):
+    board = chess.Board() if board is None else board.copy()
+    players = {chess.WHITE: white, chess.BLACK: black}
+    white.new_game(chess.WHITE, kriegspiel, board)
+    black.new_game(chess.BLACK, kriegspiel, board)
+    views = {color: masked_board(board, "W" if color == chess.WHITE else "B") for color in chess.COLORS} if kriegspiel else None
+    clocks = {color: time_control for color in chess.COLORS}
+    plies = 0
+    while True:
+        termination = game_over(board, plies == 0 or board.halfmove_clock == 0)
+        if termination is not None:
+            outcome = chess.Outcome(termination, not board.turn if termination == chess.Termination.CHECKMATE else None)
+            return outcome.result(), termination.name, plies
+        if max_plies is not None and plies >= max_plies:
+            return "1/2-1/2", "MAX_PLIES", plies
+        color = board.turn
+        player = players[color]
+        view = views[color] if kriegspiel else board
+        if time_control is not None:
+            start = time.perf_counter()
+        move = player.choose_move(view, clocks[color])
+        if kriegspiel:
+            while move is not None and not board.is_legal(move):
+                player.rejected(move)
+                move = player.choose_move(view, clocks[color])
+        if move is None or not board.is_legal(move):
+            raise ValueError("{} played the illegal move {} in {}".format(type(player).__name__, move, board.fen()))
+        if time_control is not None:
+            clocks[color] -= time.perf_counter() - start
+            if clocks[color] < 0:
+                return ("0-1" if color == chess.WHITE else "1-0"), "TIME_FORFEIT", plies
+        if kriegspiel:
+            capture = umpire_capture(board, move)
+        board.push(move)
+        plies += 1
+        if not kriegspiel:
+            player.moved(move)
+            continue
+        check = board.is_check()
+        player.moved(move, capture, check)
+        players[not color].opponent_moved(capture[0], check)
+        views[color].push(move)
+        opponent_view = views[not color]
+        if capture[0] is not None:
+            opponent_view.remove_piece_at(capture[0])
+        opponent_view.push(chess.Move.null())
+
+'''
+play_games:
+
+Parameters:
+    - white - Player, the player of the white pieces in every game
+    - black - Player, the player of the black pieces in every game
+    - num_games - Int, the number of games
+    - other keyword arguments - as in play_game
+
+Returns:
+    list of the (result, termination, plies) of each game
+'''
+def play_games(white, black, num_games, **kwargs):
+    return [play_game(white, black, **kwargs) for _ in range(num_games)]
@@ -1,6 +1,5 @@
 import chess
 import numpy as np
-import utils
 
 PIECE_VALUES = {"p": 1, "b": 3, "n": 3, "r": 5, "q": 9, "k": 0}
 
@@ -21,26 +20,12 @@ Returns:
     from the values of the remaining pieces from each player
 '''
 def get_material_value(board_state, curr_player, kriegspiel=False, opponent_pieces=None, weight=1): # how much to weight this heuristic
-    board_array = utils.get_board_state_array(board_state)
     white_points = 0
     black_points = 0
-
-    for row in range(8):
-        for col in range(8):
-            if board_array[row][col] == ".":
-                continue
-            elif kriegspiel:
-                if board_array[row][col].isupper() and curr_player == "W":
-                    white_points += PIECE_VALUES[board_array[row][col].lower()]
-                elif board_array[row][col].islower() and curr_player == "B":
-                    black_points += PIECE_VALUES[board_array[row][col]]
-            else:
-                if board_array[row][col].isupper():
-                    white_points += PIECE_VALUES[board_array[row][col].lower()]
-                elif board_array[row][col].islower():
-                    black_points += PIECE_VALUES[board_array[row][col]]
-    # black_pts = 0
-    # kriegspiel_white_pts = 0
+    if not kriegspiel or curr_player == "W":
+        white_points = material_points(board_state, chess.WHITE)
+    if not kriegspiel or curr_player == "B":
+        black_points = material_points(board_state, chess.BLACK)
     if kriegspiel:
         for piece in opponent_pieces:
             if curr_player == "W":
@@ -51,6 +36,26 @@ def get_material_value(board_state, curr_player, kriegspiel=False, opponent_piec
         return (white_points - black_points) * weight
     return (black_points - white_points) * weight
 
+'''
+material_points:
+
+Sums the PIECE_VALUES of one side's pieces by popcounting the board's piece bitboards
+
+Parameters:
+    - board_state - python-chess BoardState, the current chessboard
+    - color - python-chess Color, chess.WHITE or chess.BLACK
+
+Returns:
+    Int, the material of that side
+'''
+def material_points(board_state, color):
+    own = board_state.occupied_co[color]
+    return chess.popcount(board_state.pawns & own) * PIECE_VALUES["p"] + \
+        chess.popcount(board_state.knights & own) * PIECE_VALUES["n"] + \
+        chess.popcount(board_state.bishops & own) * PIECE_VALUES["b"] + \
+        chess.popcount(board_state.rooks & own) * PIECE_VALUES["r"] + \
+        chess.popcount(board_state.queens & own) * PIECE_VALUES["q"]
+
 '''
 count_attacks:
 
@@ -66,19 +71,192 @@ Returns:
     based on their remaining pieces
 '''
 def count_attacks(board_state, curr_player):
-    board_array = utils.get_board_state_array(board_state)
-    num_pieces_attacked = 0
-    for row in range(8):
-        for col in range(8):
-            piece = board_array[row][col]
-            pos = 8*(7-row)+col
-            if board_array[row][col] == ".":
-                continue
-            if piece.isupper() and curr_player == "W" and board_state.is_attacked_by(chess.BLACK, pos):
-                num_pieces_attacked += 1
-            elif piece.islower() and curr_player == "B" and board_state.is_attacked_by(chess.WHITE, pos):
-                num_pieces_attacked += 1
-    return num_pieces_attacked
+    if curr_player == "W":
+        own, opponent_color = board_state.occupied_co[chess.WHITE], chess.BLACK
+    else:
+        own, opponent_color = board_state.occupied_co[chess.BLACK], chess.WHITE
+    return chess.popcount(own & attacked_squares(board_state, opponent_color))
+
+'''
+attacked_squares:
+
+Bitboard of every square attacked by one side. Pawn attacks are computed for all pawns at once by
+shifting the pawn bitboard, the other pieces use python-chess's attack tables.
+
+Parameters:
+    - board_state - python-chess BoardState, the current status of the chessboard
+    - color - python-chess Color, the attacking side
+
+Returns:
+    Int, the bitboard of attacked squares
+'''
+def attacked_squares(board_state, color):
+    pieces = board_state.occupied_co[color]
+    pawns = board_state.pawns & pieces
+    if color == chess.WHITE:
+        attacks = ((pawns << 9) & ~chess.BB_FILE_A | (pawns << 7) & ~chess.BB_FILE_H) & chess.BB_ALL
+    else:
+        attacks = (pawns >> 7) & ~chess.BB_FILE_A | (pawns >> 9) & ~chess.BB_FILE_H
+    for square in chess.scan_reversed(pieces & ~pawns):
+        attacks |= board_state.attacks_mask(square)
+    return attacks
+
+'''
+count_opponent_pieces:
+
+Counts the opponent pieces of each type left on a board, the same dictionary that
+Node.update_opponent_pieces builds, but read straight off the board's piece bitboards
+
+Parameters:
+    - board_state - python-chess BoardState, the full (ground truth) chessboard
+    - curr_player - String, the current player "W" or "B"
+
+Returns:
+    Dictionary mapping the lowercase piece symbol to the number of opponent pieces of that type
+'''
+def count_opponent_pieces(board_state, curr_player):
+    opponent_color = chess.BLACK if curr_player == "W" else chess.WHITE
+    opponent_pieces = {}
+    for piece_type in chess.PIECE_TYPES:
+        count = chess.popcount(board_state.pieces_mask(piece_type, opponent_color))
+        if count > 0:
+            opponent_pieces[chess.piece_symbol(piece_type)] = count
+    return opponent_pieces
+
+'''
+pack_boards:
+
+Packs the piece bitboards of many boards into one NumPy array, the input of the batch functions
+
+Parameters:
+    - boards - list of python-chess BoardState
+
+Returns:
+    uint64 NumPy array of shape (N, 2, 6), indexed [board, color, piece_type - 1] with
+    chess.BLACK = 0 and chess.WHITE = 1
+'''
+def pack_boards(boards):
+    packed = []
+    for board_state in boards:
+        by_color = []
+        for color in (chess.BLACK, chess.WHITE):
+            own = board_state.occupied_co[color]
+            by_color.append([board_state.pawns & own, board_state.knights & own, board_state.bishops & own,
+                             board_state.rooks & own, board_state.queens & own, board_state.kings & own])
+        packed.append(by_color)
+    return np.array(packed, dtype=np.uint64).reshape(len(boards), 2, 6)
+
+BATCH_PIECE_VALUES = np.array([PIECE_VALUES[chess.piece_symbol(piece_type)] for piece_type in chess.PIECE_TYPES], dtype=np.int64)
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+_NOT_FILE_A = np.uint64(chess.BB_ALL & ~chess.BB_FILE_A)
+_NOT_FILE_H = np.uint64(chess.BB_ALL & ~chess.BB_FILE_H)
+_NOT_FILE_AB = np.uint64(chess.BB_ALL & ~chess.BB_FILE_A & ~chess.BB_FILE_B)
+_NOT_FILE_GH = np.uint64(chess.BB_ALL & ~chess.BB_FILE_G & ~chess.BB_FILE_H)
+# (shift, mask applied after shifting) of the eight ray directions, positive shifts go up the board
+_ROOK_DIRECTIONS = ((8, None), (-8, None), (1, _NOT_FILE_A), (-1, _NOT_FILE_H))
+_BISHOP_DIRECTIONS = ((9, _NOT_FILE_A), (7, _NOT_FILE_H), (-7, _NOT_FILE_A), (-9, _NOT_FILE_H))
+_KNIGHT_STEPS = ((17, _NOT_FILE_A), (15, _NOT_FILE_H), (10, _NOT_FILE_AB), (6, _NOT_FILE_GH),
+                 (-6, _NOT_FILE_AB), (-10, _NOT_FILE_GH), (-15, _NOT_FILE_A), (-17, _NOT_FILE_H))
+_KING_STEPS = _ROOK_DIRECTIONS + _BISHOP_DIRECTIONS
+
+'''
+batch_popcount:
+
+Parameters:
+    - bitboards - uint64 NumPy array
+
+Returns:
+    int64 NumPy array of the same shape with the number of set bits of each bitboard
+'''
+def batch_popcount(bitboards):
+    x = bitboards - ((bitboards >> np.uint64(1)) & _M1)
+    x = (x & _M2) + ((x >> np.uint64(2)) & _M2)
+    x = (x + (x >> np.uint64(4))) & _M4
+    return ((x * _H01) >> np.uint64(56)).astype(np.int64)
+
+def _shift(bitboards, shift, mask):
+    if shift > 0:
+        bitboards = bitboards << np.uint64(shift)
+    else:
+        bitboards = bitboards >> np.uint64(-shift)
+    if mask is not None:
+        bitboards = bitboards & mask
+    return bitboards
+
+def _slide(sliders, empty, shift, mask):
+    # Kogge-Stone fill of the sliders along one direction, stopped by occupied squares
+    if mask is not None:
+        empty = empty & mask
+    for step in (1, 2, 4):
+        sliders = sliders | (empty & _shift(sliders, shift * step, None))
+        empty = empty & _shift(empty, shift * step, None)
+    return _shift(sliders, shift, mask)
+
+'''
+batch_attacked_squares:
+
+Vectorized attacked_squares: the bitboard of squares attacked by one side, for every packed board
+
+Parameters:
+    - packed - uint64 NumPy array from pack_boards
+    - color - python-chess Color, the attacking side
+
+Returns:
+    uint64 NumPy array of shape (N,) with the attacked squares of each board
+'''
+def batch_attacked_squares(packed, color):
+    pieces = packed[:, int(color)]
+    empty = ~np.bitwise_or.reduce(packed.reshape(len(packed), 12), axis=1)
+    pawns, knights = pieces[:, 0], pieces[:, 1]
+    rooks_queens = pieces[:, 3] | pieces[:, 4]
+    bishops_queens = pieces[:, 2] | pieces[:, 4]
+    if color == chess.WHITE:
+        attacks = _shift(pawns, 9, _NOT_FILE_A) | _shift(pawns, 7, _NOT_FILE_H)
+    else:
+        attacks = _shift(pawns, -7, _NOT_FILE_A) | _shift(pawns, -9, _NOT_FILE_H)
+    for shift, mask in _KNIGHT_STEPS:
+        attacks |= _shift(knights, shift, mask)
+    for shift, mask in _KING_STEPS:
+        attacks |= _shift(pieces[:, 5], shift, mask)
+    for shift, mask in _ROOK_DIRECTIONS:
+        attacks |= _slide(rooks_queens, empty, shift, mask)
+    for shift, mask in _BISHOP_DIRECTIONS:
+        attacks |= _slide(bishops_queens, empty, shift, mask)
+    return attacks
+
+'''
+batch_evaluate:
+
+Vectorized Node.get_heuristic for many positions at once: get_material_value minus count_attacks
+in standard chess, get_material_value against opponent_pieces in Kriegspiel. Returns exactly the
+values of the one position at a time functions.
+
+Parameters:
+    - boards - list of python-chess BoardState, or the packed array of pack_boards
+    - curr_player - String, the current player "W" or "B"
+    - kriegspiel - Boolean, whether we are playing kriegspiel or not
+    - opponent_pieces - Dictionary, or a list with one dictionary per board, for kriegspiel
+
+Returns:
+    int64 NumPy array with the heuristic value of each board
+'''
+def batch_evaluate(boards, curr_player, kriegspiel=False, opponent_pieces=None):
+    packed = boards if isinstance(boards, np.ndarray) else pack_boards(boards)
+    own_color = chess.WHITE if curr_player == "W" else chess.BLACK
+    own_material = batch_popcount(packed[:, int(own_color), :5]) @ BATCH_PIECE_VALUES[:5]
+    if kriegspiel:
+        if isinstance(opponent_pieces, dict):
+            opponent_pieces = [opponent_pieces] * len(packed)
+        opponent_material = np.array([sum(PIECE_VALUES[piece] * count for piece, count in pieces.items())
+                                      for pieces in opponent_pieces], dtype=np.int64)
+        return own_material - opponent_material
+    opponent_material = batch_popcount(packed[:, int(not own_color), :5]) @ BATCH_PIECE_VALUES[:5]
+    own = np.bitwise_or.reduce(packed[:, int(own_color)], axis=1)
+    num_attacked = batch_popcount(own & batch_attacked_squares(packed, not own_color))
+    return own_material - opponent_material - num_attacked
 
 '''
 opponent_check:
@@ -1,15 +1,34 @@
 import chess
+import multiprocessing
 import numpy as np
+import random
+import time
 from enum import Enum
-from alpha_beta_ai import depth_limited_ab_search
-from mcts_ai import mcts
+from alpha_beta_ai import depth_limited_ab_search, make_unmake_ab_search, root_split_ab_search, iterative_deepening_search, SearchStats, Quiescence
+from mcts_ai import mcts, MCTSTree
 from node import Node
+from transposition_table import TranspositionTable
+from move_ordering import MoveOrderer
+from evaluation import IncrementalEval, PIECE_SQUARE_TABLES
+from belief_state import BeliefState, masked_board, umpire_capture
 import copy
 import utils
 from tqdm import tqdm
 from datetime import datetime
 
 DEPTH = {"W": 2, "B": 2}
+TT_SIZE_MB = {"W": 64, "B": 64}  # memory cap of each alpha-beta player's transposition table, 0 to disable
+TT_POLICY = "depth"
+MAX_DEPTH = 20  # deepest iteration of the Alpha Beta AI when it plays with a time control
+AB_MAKE_UNMAKE = True  # search below the root with push/pop on one board instead of a Node per position
+AB_MOVE_ORDERING = True  # order moves by hash move, MVV-LVA, checks, killers and history (make-unmake search only)
+AB_PIECE_SQUARE_TABLES = {"W": False, "B": False}  # add piece-square scores to the incremental evaluation (make-unmake search only)
+AB_QUIESCENCE = {"W": False, "B": False}  # search captures past the horizon before scoring (make-unmake search only)
+QS_MAX_NODES = 20000  # quiescence positions per search
+QS_CHECKS = False  # also search checks at the first quiescence ply
+MCTS_TREE_REUSE = True  # keep the MCTS tree between moves and re-root it after the opponent's reply
+MCTS_PARALLEL = "root"  # parallel MCTS with more than one worker: "root" (independent trees) or "tree" (virtual loss)
+KRIEGSPIEL_SAMPLES = {"W": 4, "B": 4}  # full boards sampled from the belief state and searched per Kriegspiel move, 0 to only rank the moves of the view
 
 '''
 setup_board:
@@ -29,12 +48,33 @@ def setup_board(initial_setup=""):
         return chess.Board()
     return chess.Board(initial_setup)
 
+'''
+next_planned_move:
+
+Parameters:
+    - plan - generator of Strings, the moves a Kriegspiel AI tries this turn (BeliefState.plan_moves), one is drawn
+    - curr_side - String, "W" or "B"
+
+Returns:
+String, the next move to try in UCI format. Every legal move is in the plan, so running out of moves means the belief
+state has gone wrong
+'''
+def next_planned_move(plan, curr_side):
+    move = next(plan, None)
+    if move is None:
+        raise RuntimeError(curr_side + " has no Kriegspiel move left to try")
+    return move
+
 '''
 host_game:
 
 Effectively hosts the game between two players. Drives the two players, calling their respective functions based on the type of 
 player that was selected to play. Switches the player and updates the board when the current players turn is over.
-Prints updates to the board itself following opponent moves and prints the final state of the board upon conclusion of the game
+Prints updates to the board itself following opponent moves and prints the final state of the board upon conclusion of the game.
+In Kriegspiel each AI side keeps a BeliefState, updated from the umpire's announcements only (its own moves and captures, rejected
+tries, the opponent's captures and checks) and never looks at the real board: it tries the moves of BeliefState.plan_moves, the
+ones picked by searches of KRIEGSPIEL_SAMPLES full boards sampled from the belief first, until the umpire accepts one. A time
+control or an MCTS time limit is shared between the sampled boards
 
 Parameters:
 - initial_setup - String, the initial setup of the board that is requested: either standard or a board in FEN notation
@@ -43,6 +83,19 @@ Parameters:
 - kriegspiel - Boolean, whether or not we will be playing Kriegspiel (T) or standard Chess (F)
 - print_updates - Boolean, whether we should print updates after each move (T) or not (F)
 - print_output - Boolean, whether we should print the final game state (T) or not (F) following the end of the game
+- time_control - Dictionary, optional seconds per move for each side, e.g. {"W": 1.0, "B": 0.5}. An Alpha Beta AI with
+a time control uses iterative deepening up to MAX_DEPTH instead of searching to DEPTH
+- mcts_budget - Dictionary, optional search budget of each MCTS side, the keyword arguments of mcts_ai.mcts,
+e.g. {"W": {"sims": None, "time_limit": 0.5}, "B": {"sims": 1000, "max_memory_mb": 64}}
+- mcts_workers - Dictionary, optional number of worker processes of each MCTS side, e.g. {"W": 8}. Sides with more
+than one worker search in parallel with the MCTS_PARALLEL scheme
+- ab_workers - Dictionary, optional number of worker processes of each Alpha Beta side. Sides with more than one
+worker split the root moves between them (root_split_ab_search). Each setting only applies to the sides played
+by its player type, and the pools are released when the game ends, also by an exception
+- seed - Int, optional seed of the random players, the MCTS playouts and the Kriegspiel belief states, so that a
+game can be replayed
+- stats - Dictionary, optional, filled in with the termination, the number of plies and the seconds each move took
+(move_times, retries included)
 
 Returns:
 IF there is an error with the type of player specified in the original function call, return "INVALID AI TYPE"
@@ -54,90 +107,183 @@ Returns:
 The outcome of the chess game, if there are no errors in the way that the function is specified (namely, if the AI type passed in
 is not defined)
 '''
-def host_game(initial_setup="", white="human", black="human", kriegspiel=False, print_updates=True, print_output=True):
-    rng = np.random.default_rng()
+def host_game(initial_setup="", white="human", black="human", kriegspiel=False, print_updates=True, print_output=True, time_control=None, mcts_budget=None,
+              mcts_workers=None, ab_workers=None, seed=None, stats=None):
+    if seed is not None:
+        # MCTS playouts draw from the random module
+        random.seed(seed)
+    rng = np.random.default_rng(seed)
     board = setup_board(initial_setup)
     curr_side = "W"
-    while not board.outcome():
-        curr_move = -1
-        count = 0
-        while curr_move == -1 or not chess.Move.from_uci(curr_move) in board.legal_moves:
-            if count > 0 and print_updates:
-                print("Invalid move, try again.")
-            if (curr_side == "W" and white == "human") or (curr_side == "B" and black == "human"):
-                curr_move = input(curr_side + ", make a move: ")
-            else:
-                if (curr_side == "W" and white == "random_ai") or (curr_side == "B" and black == "random_ai"):
-                    if count == 0:
-                        node = Node(board_state=copy.deepcopy(board), kriegspiel=kriegspiel)
-                    if kriegspiel:
-                        node.remove_opponent_pieces(curr_side)
-                    if node.possible_moves == [] and kriegspiel:
-                        node.get_diag_pawn_moves(curr_side)
-                        node.possible_moves = list(node.board_state.legal_moves) + node.diag_pawn_moves
-
-                    elif node.possible_moves == -1:
-                        print("problem 1 found")
-                        intersection = list(set(board.legal_moves) & set(list(node.board_state.legal_moves)+node.diag_pawn_moves))
-                        print(intersection)
-
-                    elif not kriegspiel:
-                        node.possible_moves = list(node.board_state.legal_moves)
-
-                    if node.possible_moves == -1:
-                        print("hi")
-                    move_idx = rng.choice(len(node.possible_moves))
-                    curr_move = node.possible_moves[move_idx].uci()
-                    node.possible_moves.remove(node.possible_moves[move_idx])
-
-                    if node.possible_moves == []:
-                        node.possible_moves = -1
-
-                elif (curr_side == "W" and white == "alpha_beta_ai") or (curr_side == "B" and black == "alpha_beta_ai"):
-                    if count == 0:
-                        node = Node(board_state=copy.deepcopy(board), kriegspiel=kriegspiel, gt_board_state=copy.deepcopy(board))
-                        if list(set(node.board_state.legal_moves) & set(board.legal_moves)) == []:
-                            print("problem 2")
-                    if kriegspiel:
-                        node.remove_opponent_pieces(curr_side)
-                        node.update_opponent_pieces(curr_side, board)
-                    if count == 0:
-                        value, curr_move = depth_limited_ab_search(node, DEPTH[curr_side], -np.infty, np.infty, True, curr_side)
-                    else:
-                        value, curr_move = node.get_nth_best_move(count, curr_side)
-                        if len(curr_move) == 0:
-                            print("uh oh 3")
+    tables = {}
+    orderers = {}
+    evaluators = {}
+    search_stats = {}
+    quiescences = {}
+    trees = {}
+    beliefs = {}
+    for side, player in (("W", white), ("B", black)):
+        if kriegspiel and player in ("mcts_ai", "alpha_beta_ai"):
+            beliefs[side] = BeliefState(board, side, seed=random.randrange(2**32))
+        if player == "mcts_ai" and MCTS_TREE_REUSE and not kriegspiel:
+            trees[side] = MCTSTree()
+        if player == "alpha_beta_ai":
+            if TT_SIZE_MB[side] > 0:
+                tables[side] = TranspositionTable(TT_SIZE_MB[side], TT_POLICY)
+            if AB_MOVE_ORDERING:
+                orderers[side] = MoveOrderer()
+            evaluators[side] = IncrementalEval(piece_square_tables=PIECE_SQUARE_TABLES if AB_PIECE_SQUARE_TABLES[side] else None)
+            search_stats[side] = SearchStats()
+            if AB_QUIESCENCE[side]:
+                quiescences[side] = Quiescence(QS_MAX_NODES, QS_CHECKS)
+    # the worker counts of each side come from the setting of its own player type, other players get no pool
+    workers = {}
+    for side, player in (("W", white), ("B", black)):
+        if player == "alpha_beta_ai":
+            workers[side] = (ab_workers or {}).get(side, 1)
+        elif player == "mcts_ai":
+            workers[side] = (mcts_workers or {}).get(side, 1)
+    pools = {}
+    try:
+        for side, num_workers in workers.items():
+            if num_workers > 1:
+                pools[side] = multiprocessing.Pool(num_workers)
 
+        # the Alpha Beta search of one side from a node, the one its settings pick
+        def ab_search(search_node, side, time_limit):
+            if time_limit is not None:
+                value, move, depth = iterative_deepening_search(search_node, side, time_limit, MAX_DEPTH, tables.get(side), orderers.get(side),
+                                                                search_stats[side], evaluators[side], pools.get(side), quiescences.get(side))
+                if print_updates:
+                    print(side + " searched to depth", depth)
+                return value, move
+            if side in pools:
+                return root_split_ab_search(search_node, DEPTH[side], side, pools[side], tables.get(side), stats=search_stats[side],
+                                            orderer=orderers.get(side), evaluator=evaluators[side], quiescence=quiescences.get(side))
+            if AB_MAKE_UNMAKE:
+                return make_unmake_ab_search(search_node, DEPTH[side], -np.infty, np.infty, True, side, tables.get(side), stats=search_stats[side],
+                                             orderer=orderers.get(side), evaluator=evaluators[side], quiescence=quiescences.get(side))
+            return depth_limited_ab_search(search_node, DEPTH[side], -np.infty, np.infty, True, side, tables.get(side))
 
-                elif (curr_side == "W" and white == "mcts_ai") or (curr_side == "B" and black == "mcts_ai"):
-                    node = Node(board_state=copy.deepcopy(board), kriegspiel=kriegspiel, gt_board_state=copy.deepcopy(board))
-                    if kriegspiel:
-                        node.remove_opponent_pieces(curr_side)
-                        node.update_opponent_pieces(curr_side, board)
-                    try:
-                        query = mcts(node, kriegspiel)
-                        curr_move = board.parse_san(query).uci()
-                    except ValueError:
-                        value, curr_move = node.get_nth_best_move(count, curr_side)
+        move_times = []
+        while not board.outcome():
+            move_start = time.perf_counter()
+            curr_move = -1
+            count = 0
+            while curr_move == -1 or not chess.Move.from_uci(curr_move) in board.legal_moves:
+                if count > 0 and print_updates:
+                    print("Invalid move, try again.")
+                if count > 0 and curr_move != -1 and curr_side in beliefs:
+                    beliefs[curr_side].illegal_attempt(chess.Move.from_uci(curr_move))
+                if (curr_side == "W" and white == "human") or (curr_side == "B" and black == "human"):
+                    curr_move = input(curr_side + ", make a move: ")
+                else:
+                    if (curr_side == "W" and white == "random_ai") or (curr_side == "B" and black == "random_ai"):
+                        if count == 0:
+                            node = Node(board_state=masked_board(board, curr_side) if kriegspiel else copy.deepcopy(board), kriegspiel=kriegspiel)
+                        if node.possible_moves == [] and kriegspiel:
+                            node.get_diag_pawn_moves(curr_side)
+                            node.possible_moves = list(node.board_state.legal_moves) + node.diag_pawn_moves
 
+                        elif node.possible_moves == -1:
+                            print("problem 1 found")
+                            intersection = list(set(board.legal_moves) & set(list(node.board_state.legal_moves)+node.diag_pawn_moves))
+                            print(intersection)
 
+                        elif not kriegspiel:
+                            node.possible_moves = list(node.board_state.legal_moves)
+
+                        if node.possible_moves == -1:
+                            print("hi")
+                        move_idx = rng.choice(len(node.possible_moves))
+                        curr_move = node.possible_moves[move_idx].uci()
+                        node.possible_moves.remove(node.possible_moves[move_idx])
+
+                        if node.possible_moves == []:
+                            node.possible_moves = -1
+
+                    elif (curr_side == "W" and white == "alpha_beta_ai") or (curr_side == "B" and black == "alpha_beta_ai"):
+                        if count == 0:
+                            tt = tables.get(curr_side)
+                            if tt is not None:
+                                tt.new_search()
+                            orderer = orderers.get(curr_side)
+                            if orderer is not None:
+                                orderer.new_search()
+                            time_limit = None if time_control is None else time_control.get(curr_side)
+                            if curr_side in beliefs:
+                                # each sampled full board is searched as standard chess, in a share of the time
+                                num_samples = KRIEGSPIEL_SAMPLES[curr_side]
+                                if time_limit is not None:
+                                    time_limit /= max(num_samples, 1)
+                                plan = beliefs[curr_side].plan_moves(lambda sample: ab_search(Node(board_state=sample), curr_side, time_limit)[1], num_samples)
+                            else:
+                                node = Node(board_state=copy.deepcopy(board))
+                                if list(set(node.board_state.legal_moves) & set(board.legal_moves)) == []:
+                                    print("problem 2")
+                                value, curr_move = ab_search(node, curr_side, time_limit)
+                        elif curr_side not in beliefs:
+                            value, curr_move = node.get_nth_best_move(count, curr_side)
+                            if len(curr_move) == 0:
+                                print("uh oh 3")
+                        if curr_side in beliefs:
+                            curr_move = next_planned_move(plan, curr_side)
+
+                    elif (curr_side == "W" and white == "mcts_ai") or (curr_side == "B" and black == "mcts_ai"):
+                        if count == 0:
+                            budget = {} if mcts_budget is None else dict(mcts_budget.get(curr_side, {}))
+                            if curr_side in beliefs:
+                                num_samples = KRIEGSPIEL_SAMPLES[curr_side]
+                                if budget.get("time_limit") is not None:
+                                    budget["time_limit"] /= max(num_samples, 1)
+                                plan = beliefs[curr_side].plan_moves(lambda sample: mcts(Node(board_state=sample), pool=pools.get(curr_side),
+                                                                                         workers=workers.get(curr_side, 1), parallel=MCTS_PARALLEL,
+                                                                                         **budget), num_samples)
+                            else:
+                                node = Node(board_state=copy.deepcopy(board))
+                                curr_move = mcts(node, tree=trees.get(curr_side), pool=pools.get(curr_side),
+                                                 workers=workers.get(curr_side, 1), parallel=MCTS_PARALLEL, **budget) or -1
+                        elif curr_side not in beliefs:
+                            value, curr_move = node.get_nth_best_move(count, curr_side)
+                        if curr_side in beliefs:
+                            curr_move = next_planned_move(plan, curr_side)
+
+
+                    else:
+                        print("Invalid AI type")
+                        return
+                    if print_updates:
+                        print(curr_side + "'s move:", curr_move)
+                count += 1
+            move_times.append(time.perf_counter() - move_start)
+            if beliefs:
+                move = chess.Move.from_uci(curr_move)
+                capture = umpire_capture(board, move)
+            board.push_san(curr_move)
+            for side, belief in beliefs.items():
+                if side == curr_side:
+                    belief.own_move(move, capture, board.is_check())
                 else:
-                    print("Invalid AI type")
-                    return
-                if print_updates:
-                    print(curr_side + "'s move:", curr_move)
-            count += 1
-        board.push_san(curr_move)
-        if curr_side == "W":
-            curr_side = "B"
-        else:
-            curr_side = "W"
-        if print_updates:
-            print()
-            utils.pretty_print_board(board)
-            print()
+                    belief.opponent_move(capture[0], board.is_check())
+            if curr_side == "W":
+                curr_side = "B"
+            else:
+                curr_side = "W"
+            if print_updates:
+                print()
+                utils.pretty_print_board(board)
+                print()
+    finally:
+        # also on an exception in a search, so that no worker process is left behind
+        for pool in pools.values():
+            pool.terminate()
+            pool.join()
     game_outcome = board.outcome()
     game_termination = game_outcome.termination.name
+    if stats is not None:
+        stats["termination"] = game_termination
+        stats["plies"] = len(board.move_stack)
+        stats["move_times"] = move_times
     if print_output:
         if game_termination == "CHECKMATE":
             winner = game_outcome.winner
@@ -148,6 +294,14 @@ def host_game(initial_setup="", white="human", black="human", kriegspiel=False,
         else:
             print("Outcome:", game_termination)
         print("Number of moves:", board.fullmove_number)
+        for side, side_stats in search_stats.items():
+            if side_stats.nodes > 0:
+                print(side, "search: {} nodes, {} quiescence nodes, {} beta cutoffs, {:.3f} on the first move".format(
+                    side_stats.nodes, side_stats.qnodes, side_stats.beta_cutoffs, side_stats.first_move_cutoff_rate()))
+        for side, tt in tables.items():
+            tt_stats = tt.get_stats()
+            print(side, "transposition table: hit rate {:.3f}, {} probes, {} cutoffs, {}/{} slots used".format(
+                tt_stats["hit_rate"], tt_stats["probes"], tt_stats["cutoffs"], tt_stats["used_slots"], tt_stats["num_slots"]))
     return game_outcome.result()
 
 
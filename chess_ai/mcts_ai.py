@@ -1,184 +1,710 @@
 import chess
-from node import Node
+import chess.polyglot
+import math
 import numpy as np
 import random
-import sys
+import time
 import heuristics
+import rollout
+from tree_arena import TreeArena, RaveArena, NO_NODE, encode_move, decode_move
+
+EXPLORATION = math.sqrt(2)
+SIMS = 200
+PLAYOUT_DEPTH = 0
+ROLLOUT_POLICY = "uniform"
+RAVE_SCHEDULE = "equivalence"  # how the weight of the AMAF value decays with visits, see rave_beta
+RAVE_K = 300  # visits at which UCT and AMAF values weigh the same under the "equivalence" schedule
+RAVE_BIAS = 0.05  # assumed bias of the AMAF values under the "mse" schedule
+TREE_BATCH = 8  # leaves each worker plays out per round of tree parallelization
+SMALL_BRANCHING = 24  # nodes with at most this many children are scored with plain floats instead of NumPy
 
 '''
-Exploration/Exploitation function. currentNode.v + np.sqrt(2) *
-        (np.sqrt(np.log(currentNode.N + np.exp(1) + (10**-7)) / (currentNode.n + (10**-11))))
-        as defined by the book. Notice the terms to avoid DivisionByZero.
+Exploration/Exploitation function. value / visits + c * sqrt(ln(parent_visits) / visits)
+as defined by the book. Children that have not been visited yet are always tried first.
+Works on plain floats, selection scores many children at once with ucb1_scores instead.
 
 Parameters:
-    - currentNode: node, the node that has been passed to the UCB1 algorithm, is a child
-    of the current node from selection
+    - value - Float, the total reward of the child, from the point of view of the player who moved into it
+    - visits - Int, the number of visits to the child
+    - parent_visits - Int, the number of visits to the parent
+    - c - Float, the exploration constant
 
 Returns:
     The UCB1 value calculated by the formula for the child.
 '''
-def ucb1(currentNode):
-    return currentNode.v + np.sqrt(2) * \
-        (np.sqrt(np.log(currentNode.N + np.exp(1) + (10**-7)) / (currentNode.n + (10**-11))))
+def ucb1(value, visits, parent_visits, c=EXPLORATION):
+    if visits == 0:
+        return math.inf
+    return value / visits + c * math.sqrt(math.log(parent_visits) / visits)
+
+
+'''
+ucb1_scores:
+
+ucb1 of a whole slice of visited children in one NumPy pass
+
+Parameters:
+    - means - NumPy float array, the mean reward of each child (value / visits, or the RAVE blend)
+    - visits - NumPy int array, the visits to each child, all above 0
+    - parent_visits - Int, the number of visits to the parent
+    - c - Float, the exploration constant
+
+Returns:
+    NumPy float array with the UCB1 value of each child
+'''
+def ucb1_scores(means, visits, parent_visits, c=EXPLORATION):
+    return means + c * np.sqrt(math.log(parent_visits) / visits)
 
 
 '''
 selection:
 
-The selection algorithm. Iterate through all the child of the given state and select 
-the one with highest UCB value.
+The selection algorithm. Scores all the children of the given node and selects
+the one with highest UCB value; unvisited children come first, in order. In a RaveArena the
+mean of a visited child is first blended with its AMAF mean by rave_beta, and the unvisited
+children are tried in order of their AMAF mean. The children are a contiguous slice of the
+arena's arrays, so nodes with more than SMALL_BRANCHING children are scored with one vectorized
+argmax, and smaller ones with plain floats, which is faster than NumPy at that size.
+
+Parameters:
+    - arena - TreeArena, the search tree
+    - idx - Int, the node to select a child from, must be expanded
+
+Returns:
+    The index of the child of the node with the highest UCB1 value
+'''
+def selection(arena, idx):
+    children = arena.children(idx)
+    if len(children) <= SMALL_BRANCHING:
+        return small_selection(arena, children, int(arena.visits[idx]))
+    start, stop = children.start, children.stop
+    visits = arena.visits[start:stop]
+    least = int(visits.argmin())
+    if not isinstance(arena, RaveArena):
+        if visits[least] == 0:
+            return start + least
+        return start + int((arena.value[start:stop] / visits + EXPLORATION * np.sqrt(math.log(int(arena.visits[idx])) / visits)).argmax())
+    amaf_visits = arena.amaf_visits[start:stop]
+    amaf_means = arena.amaf_value[start:stop] / np.maximum(amaf_visits, 1)
+    if visits[least] == 0:
+        # unvisited children are still tried first, the one whose move did best elsewhere first
+        amaf_means[amaf_visits == 0] = 0.5
+        amaf_means[visits > 0] = -np.inf
+        return start + int(amaf_means.argmax())
+    beta = rave_beta(visits, amaf_visits)
+    beta[amaf_visits == 0] = 0.
+    means = (1. - beta) * (arena.value[start:stop] / visits) + beta * amaf_means
+    return start + int(ucb1_scores(means, visits, int(arena.visits[idx])).argmax())
+
+
+'''
+small_selection:
+
+selection for a node with few children, one child at a time on plain floats
 
 Parameters:
-    - currentNode - Node, the current node to select a child from
+    - arena - TreeArena, the search tree
+    - children - range of the indices of the node's children
+    - parent_visits - Int, the number of visits to the node
 
 Returns:
-    The child of the current node with the highest UCB1 value
+    The index of the selected child, as selection
 '''
-def selection(currentNode): #SELECTION
-    # if player == "white":
-    selection = None
-    ucb_value = -np.infty
-    for child in currentNode.children:
-        child_ucb = ucb1(child)
+def small_selection(arena, children, parent_visits):
+    start, stop = children.start, children.stop
+    visits = arena.visits[start:stop].tolist()
+    values = arena.value[start:stop].tolist()
+    rave = isinstance(arena, RaveArena)
+    if rave:
+        amaf_visits = arena.amaf_visits[start:stop].tolist()
+        amaf_values = arena.amaf_value[start:stop].tolist()
+    selected = NO_NODE
+    ucb_value = -math.inf
+    unvisited, unvisited_value = NO_NODE, -math.inf
+    for i, n in enumerate(visits):
+        if n == 0:
+            if not rave:
+                return start + i
+            # unvisited children are still tried first, the one whose move did best elsewhere first
+            amaf_mean = amaf_values[i] / amaf_visits[i] if amaf_visits[i] > 0 else 0.5
+            if amaf_mean > unvisited_value:
+                unvisited, unvisited_value = start + i, amaf_mean
+            continue
+        value = values[i]
+        if rave and amaf_visits[i] > 0:
+            beta = rave_beta(n, amaf_visits[i])
+            value = ((1. - beta) * value / n + beta * amaf_values[i] / amaf_visits[i]) * n
+        child_ucb = ucb1(value, n, parent_visits)
         if child_ucb > ucb_value:
             ucb_value = child_ucb
-            selection = child
-        return selection
+            selected = start + i
+    if unvisited != NO_NODE:
+        return unvisited
+    return selected
+
 
 '''
-Recursively keep on calling the 
-child with maximum UCB1 till we reach the end of the tree or number of simulations.
+rave_beta:
+
+The weight of the AMAF value in the RAVE blend (1 - beta) * UCT mean + beta * AMAF mean. It starts at 1 and
+decays as the child gathers visits of its own, following the RAVE_SCHEDULE:
+    - "equivalence": sqrt(RAVE_K / (3 * visits + RAVE_K)), the hand-selected schedule, where RAVE_K visits
+    weigh both means about the same
+    - "mse": amaf_visits / (visits + amaf_visits + 4 * RAVE_BIAS^2 * visits * amaf_visits), the schedule that
+    minimizes the mean squared error for AMAF values with bias RAVE_BIAS
 
 Parameters:
-    currentNode - Node, the current node in question to expand
-    player - String, either the black or white player.
+    - visits - Int, the visits to the child, or a NumPy array of them
+    - amaf_visits - Int, the AMAF visits to the child, or a NumPy array of them
 
 Returns:
-    The currentNode as selected by repeated calls to selection, either returned because end of 
-    tree reached, or simulations ended
+    Float, beta between 0 and 1 (an array for arrays)
 '''
-def expansion(currentNode, player): #EXPANSION
-    if len(currentNode.children) == 0:
-        return currentNode
-    if player == "white":
-        descendant = selection(currentNode)
-        return expansion(descendant, "black")
-    if player == "black":
-        descendant = selection(currentNode)
-        return (expansion(descendant, "white"))
+def rave_beta(visits, amaf_visits):
+    if RAVE_SCHEDULE == "equivalence":
+        return (RAVE_K / (3. * visits + RAVE_K)) ** 0.5
+    if RAVE_SCHEDULE == "mse":
+        return amaf_visits / (visits + amaf_visits + 4. * RAVE_BIAS**2 * visits * amaf_visits)
+    raise ValueError("Unknown RAVE schedule: " + str(RAVE_SCHEDULE))
+
 
 '''
-Upon getting a Node from expansion, playout will make moves based on heuristic function or random value
-till we reach end of the game and will return leaf node. 
-If we reach the end of the game, we evaluate the result of the game and send values back accordingly.
+expansion:
+
+Descends from the root by repeated calls to selection, pushing the moves on the board, until it
+reaches a node that has not been visited yet or a position where the game is over. Nodes are
+expanded (given a child entry per legal move) the first time the descent passes through them, and
+selection tries unvisited children first, so exactly one new node joins the tree per iteration.
 
 Parameters:
-    - currentNode - Node, playout from the current Node in question
-    - depth - Int, experimental parameter for depth efficiency testing
+    - arena - TreeArena, the search tree
+    - board - python-chess BoardState, the root position, moves are pushed onto it
 
 Returns:
-    The currentNode that we ended with and the reward associated with reaching that node per the end game
-    result.
+    list of node indices from the root to the selected node
 '''
-def playout(currentNode, depth): #ROLLOUT
-    if currentNode.board_state.is_game_over():
-        chessboard = currentNode.board_state
-        if chessboard.result() == "1-0":
-            return (currentNode, 1)
-        elif chessboard.result() == "0-1":
-            return (currentNode,0)
-        else:
-            return (currentNode,0.5)
-    elif depth == 0:
-        val = currentNode.get_heuristic("W", update_v=False)
-        if val > 0:
-            return (currentNode, 1)
-        elif val < 0:
-            return (currentNode, 0)
-        else:
-            return (currentNode, 0.5)
+def expansion(arena, board):
+    idx = 0
+    path = [0]
+    while not board.is_game_over():
+        if not arena.is_expanded(idx):
+            arena.expand(idx, list(board.legal_moves))
+        if arena.num_children[idx] == 0:
+            break
+        idx = selection(arena, idx)
+        move = arena.get_move(idx)
+        board.push(move)
+        path.append(idx)
+        if arena.visits[idx] == 0:
+            break
+    return path
+
+
+'''
+evaluate_leaf:
+
+Scores the position at the end of a playout. A finished game scores its result, other positions score
+1, 0.5 or 0 by the sign of the heuristic.
+
+Parameters:
+    - board - python-chess BoardState, the position to score
+
+Returns:
+    Float, the reward from white's point of view
+'''
+def evaluate_leaf(board):
+    if board.is_game_over():
+        result = board.result()
+        if result == "1-0":
+            return 1.
+        elif result == "0-1":
+            return 0.
+        return 0.5
+    val = heuristics.get_material_value(board, "W") - heuristics.count_attacks(board, "W")
+    if val > 0:
+        return 1.
+    elif val < 0:
+        return 0.
+    return 0.5
+
+
+'''
+Upon getting a position from expansion, playout plays a rollout on the same board with the rollout engine
+(rollout.play: sampled moves, up to depth of them or until a side has no legal move) and scores the
+position it ends in. The moves are popped again before returning, so no rollout position is ever added
+to the tree.
+
+Parameters:
+    - board - python-chess BoardState, the position to play out from
+    - depth - Int, the maximum number of moves
+    - policy - String, the rollout policy, one of rollout.POLICIES
+    - moves - list, optional, the moves of the playout are appended to it, packed by encode_move
+
+Returns:
+    The reward from white's point of view of the position the playout ended in.
+'''
+def playout(board, depth, policy=ROLLOUT_POLICY, moves=None):
+    num_moves = rollout.play(board, depth, policy)
+    reward = evaluate_leaf(board)
+    if moves is not None and num_moves > 0:
+        moves.extend(encode_move(move) for move in board.move_stack[-num_moves:])
+    rollout.unplay(board, num_moves)
+    return reward
+
+
+'''
+Receives the path from expansion and the reward from playout, and updates the visits and value of every
+node on the path. The value of a node is kept from the point of view of the player who made the move
+leading to it, which is what selection maximizes when that player is to choose.
+
+Parameters:
+    - arena - TreeArena, the search tree
+    - path - list of node indices from the root, as returned by expansion
+    - reward - Float, the reward from white's point of view
+    - count_visit - Boolean, whether to add the visits, False when apply_virtual_loss already added them
+
+Returns:
+    Void return, updates the arena
+'''
+def backpropagate(arena, path, reward, count_visit=True):
+    root_white = arena.root_board.turn == chess.WHITE
+    for depth, idx in enumerate(path):
+        if count_visit:
+            arena.visits[idx] += 1
+        if depth > 0:
+            # moves at odd depths are made by the player to move at the root
+            mover_white = root_white if depth % 2 == 1 else not root_white
+            arena.value[idx] += reward if mover_white else 1. - reward
+
+
+'''
+update_amaf:
+
+Updates the AMAF statistics of a RaveArena after a simulation. For every node on the path, each child
+whose move the player to move at that node went on to play at any later point of the simulation (in the
+tree or in the playout) gets an AMAF visit and the reward, from that player's point of view. The children
+of a node are contiguous, so each node's children are matched and updated as one slice.
+
+Parameters:
+    - arena - RaveArena, the search tree
+    - path - list of node indices from the root, as returned by expansion
+    - playout_moves - list of the moves of the playout, packed by encode_move
+    - reward - Float, the reward from white's point of view
+
+Returns:
+    Void return, updates the arena
+'''
+def update_amaf(arena, path, playout_moves, reward):
+    moves = [int(arena.move[idx]) for idx in path[1:]] + playout_moves
+    root_white = arena.root_board.turn == chess.WHITE
+    for depth, idx in enumerate(path):
+        children = arena.children(idx)
+        if len(children) == 0:
+            continue
+        # the moves made by the player to move at this node, from here on
+        played = np.array(moves[depth::2], dtype=np.int32)
+        hits = np.isin(arena.move[children.start:children.stop], played)
+        if not hits.any():
+            continue
+        mover_white = root_white if depth % 2 == 0 else not root_white
+        arena.amaf_visits[children.start:children.stop] += hits
+        arena.amaf_value[children.start:children.stop] += hits * (reward if mover_white else 1. - reward)
+
+
+'''
+apply_virtual_loss:
+
+Adds the visits of a simulation along its path before its reward is known. Until backpropagate adds the
+reward, the path looks like a loss to selection, which steers the other descents of the same round away.
+
+Parameters:
+    - arena - TreeArena, the search tree
+    - path - list of node indices from the root, as returned by expansion
+
+Returns:
+    Void return, updates the arena
+'''
+def apply_virtual_loss(arena, path):
+    for idx in path:
+        arena.visits[idx] += 1
+
+
+'''
+best_child:
+
+Parameters:
+    - arena - TreeArena, the search tree
+
+Returns:
+    The index of the most visited child of the root, NO_NODE if the root has no children
+'''
+def best_child(arena):
+    children = arena.children(0)
+    if len(children) == 0:
+        return NO_NODE
+    return children[int(np.argmax(arena.visits[children.start:children.stop]))]
+
+
+'''
+Classes:
+    MCTSTree
+        Keeps the search tree of an MCTS player between its moves. After the player's move and the
+        opponent's reply the tree is re-rooted at the matching grandchild, so the simulations already
+        spent below it are not thrown away, and the rest of the tree is freed.
+
+        Properties:
+            - arena: the TreeArena of the last search, None before the first one
+            - ply: the number of moves of the game that were played at the root of the arena
+'''
+
+class MCTSTree:
+
+    '''
+    Establishes the object without a tree
+
+    Returns:
+        A new object of class MCTSTree
+    '''
+    def __init__(self):
+        self.arena = None
+        self.ply = 0
+
+    '''
+    MCTSTree.reroot:
+
+    Follows the moves played since the last search down the stored tree, a fresh tree is started if they
+    are not in it.
+
+    Parameters:
+        board - python-chess BoardState, the position to search, with its move stack
+        moves - list of python-chess Move, the moves of the game
+        arena_class - TreeArena or RaveArena, the kind of tree to search, a stored tree of another kind is
+        not reused
+
+    Returns:
+        TreeArena with board at its root, holding the reused subtree if one was found
+    '''
+    def reroot(self, board, moves, arena_class=TreeArena):
+        arena = self.arena
+        if type(arena) is arena_class and 0 < len(moves) - self.ply <= 2:
+            idx = 0
+            for move in moves[self.ply:]:
+                idx = arena.find_child(idx, move)
+                if idx == NO_NODE:
+                    break
+            if idx != NO_NODE and chess.polyglot.zobrist_hash(arena.board_at(idx)) == chess.polyglot.zobrist_hash(board):
+                self.arena = arena.subtree(idx)
+                self.ply = len(moves)
+                return self.arena
+        self.arena = arena_class(board)
+        self.ply = len(moves)
+        return self.arena
+
+
+'''
+remaining_sims:
+
+Estimates how many more simulations the budget allows, for the early stop check
+
+Parameters:
+    - sim_num - Int, the number of simulations run so far
+    - sims - Int, the simulation budget, None for no limit
+    - elapsed - Float, the time taken so far in seconds
+    - time_limit - Float, the time budget in seconds, None for no limit
+
+Returns:
+    Float, the number of simulations that can still be run (np.inf if there is no limit)
+'''
+def remaining_sims(sim_num, sims, elapsed, time_limit):
+    remaining = np.inf
+    if sims is not None:
+        remaining = sims - sim_num
+    if time_limit is not None and elapsed > 0:
+        remaining = min(remaining, sim_num / elapsed * (time_limit - elapsed))
+    return remaining
+
+
+'''
+budget_exhausted:
+
+Checks the search budget before a simulation (or a batch of simulations)
+
+Parameters:
+    - arena - TreeArena, the search tree
+    - sim_num - Int, the number of simulations run so far
+    - elapsed - Float, the time taken so far in seconds
+    - budget - Dictionary with the sims, time_limit, max_nodes, max_memory_mb and early_stop of mcts
+    - check_decided - Boolean, whether to also test if the best move can still change (done every few
+    simulations, as it sorts the visits of the root's children)
+
+Returns:
+    String, the reason to stop: "sims", "time", "nodes", "memory" or "decided", None to go on
+'''
+def budget_exhausted(arena, sim_num, elapsed, budget, check_decided=False):
+    sims = budget["sims"]
+    if sims is not None and sim_num >= sims:
+        return "sims"
+    if budget["time_limit"] is not None and elapsed >= budget["time_limit"]:
+        return "time"
+    if budget["max_nodes"] is not None and len(arena) >= budget["max_nodes"]:
+        return "nodes"
+    if budget["max_memory_mb"] is not None and arena.memory_bytes() >= budget["max_memory_mb"] * 2**20:
+        return "memory"
+    if budget["early_stop"] and check_decided and sim_num > 0:
+        children = arena.children(0)
+        visits = np.sort(arena.visits[children.start:children.stop])
+        if len(visits) < 2 or visits[-1] - visits[-2] > remaining_sims(sim_num, sims, elapsed, budget["time_limit"]):
+            return "decided"
+    return None
+
+'''
+run_simulations:
 
-    legalMoves = list(currentNode.board_state.legal_moves)
-    possibleMoves = [currentNode.board_state.san(i) for i in legalMoves]
-    values = []
-    for i in possibleMoves:
-        descendant = Node()
-        state = chess.Board(currentNode.board_state.fen())
-        state.push_san(i)
+The serial search loop: selection/expansion, playout and backpropagation on one board, until the budget
+runs out. In a RaveArena the moves of each simulation also update the AMAF statistics.
 
-        descendant.board_state = state
-        descendant.parent = currentNode
-        currentNode.children.add(descendant)
-        val = descendant.get_heuristic("W", update_v=False)
-        values.append(val+1)
-    values = np.array(values, dtype="float64")
-    if np.amin(values) < 0:
-        values += -1*np.amin(values)
-    rng = np.random.default_rng()
-    return playout(random.choice(list(currentNode.children)), depth-1)
-    
+Parameters:
+    - arena - TreeArena, the search tree, its root is the position of board
+    - board - python-chess BoardState, the position to search, moves are pushed and popped on it
+    - playout_depth - Int, the number of random moves of each playout
+    - budget - Dictionary with the sims, time_limit, max_nodes, max_memory_mb and early_stop of mcts
+    - rollout_policy - String, the rollout policy of the playouts, one of rollout.POLICIES
+
+Returns:
+    (sims, stop_reason), the number of simulations run and the reason the search stopped
+'''
+def run_simulations(arena, board, playout_depth, budget, rollout_policy=ROLLOUT_POLICY):
+    rave = isinstance(arena, RaveArena)
+    start = time.perf_counter()
+    sim_num = 0
+    while True:
+        stop_reason = budget_exhausted(arena, sim_num, time.perf_counter() - start, budget, sim_num % 16 == 0)
+        if stop_reason is not None:
+            return sim_num, stop_reason
+        path = expansion(arena, board)
+        playout_moves = [] if rave else None
+        reward = playout(board, playout_depth, rollout_policy, playout_moves)
+        backpropagate(arena, path, reward)
+        if rave:
+            update_amaf(arena, path, playout_moves, reward)
+        for _ in range(len(path) - 1):
+            board.pop()
+        sim_num += 1
+
+'''
+root_parallel_worker:
+
+Runs one independent search in a worker process for root parallelization
+
+Parameters:
+    - args - tuple (board, playout_depth, budget, seed, rollout_policy, arena_class), the seed of
+    the worker's random playouts and the kind of tree to grow
+
+Returns:
+    (moves, visits, values, sims, tree_size), the packed moves of the root's children with their visits
+    and total values, the number of simulations run and the size of the worker's tree
+'''
+def root_parallel_worker(args):
+    board, playout_depth, budget, seed, rollout_policy, arena_class = args
+    random.seed(seed)
+    arena = arena_class(board)
+    sim_num, _ = run_simulations(arena, board, playout_depth, budget, rollout_policy)
+    children = arena.children(0)
+    return (arena.move[children.start:children.stop].copy(), arena.visits[children.start:children.stop].copy(),
+            arena.value[children.start:children.stop].copy(), sim_num, len(arena))
+
+'''
+playout_worker:
+
+Runs a batch of playouts in a worker process for tree parallelization. The root position is sent once per
+batch and each leaf as the packed moves leading to it from the root, which are replayed and taken back
+
+Parameters:
+    - args - tuple (board, leaves, playout_depth, seed, rollout_policy, rave), the root position, a list of
+    lists of packed moves (encode_move), one per leaf, and whether the moves of the playouts are needed for
+    AMAF statistics
+
+Returns:
+    list of (reward, moves), one per leaf: the reward from white's point of view, as returned by playout, and
+    the packed moves of the playout (None without rave)
+'''
+def playout_worker(args):
+    board, leaves, playout_depth, seed, rollout_policy, rave = args
+    random.seed(seed)
+    results = []
+    for leaf in leaves:
+        for code in leaf:
+            board.push(decode_move(code))
+        moves = [] if rave else None
+        results.append((playout(board, playout_depth, rollout_policy, moves), moves))
+        for _ in leaf:
+            board.pop()
+    return results
 
 '''
-Receives the final node and reward from playout. Traverses that reward till the root of the tree which will
-in turn update the Node parameters N, n and v, that impact the UCB1 values of each node in the path.
+root_parallel_search:
+
+Root parallelization: every worker grows its own tree from the root with a share of the simulation, node
+and memory budgets (the time limit applies to each of them), and the visits and values of the root's
+children are summed over the workers
 
 Parameters:
-    - currentNode - Node, the current node in question
-    - reward - Float, the reward associated with the currentNode being the leaf
+    - board - python-chess BoardState, the position to search
+    - playout_depth - Int, the number of random moves of each playout
+    - budget - Dictionary with the sims, time_limit, max_nodes, max_memory_mb and early_stop of mcts
+    - pool - multiprocessing Pool, the workers
+    - workers - Int, the number of independent searches
+    - rollout_policy - String, the rollout policy of the playouts
+    - arena_class - TreeArena or RaveArena, the kind of tree the workers grow
 
 Returns:
-    Returns the currentNode. 
+    (moves, sims, tree_size), a dictionary mapping each packed root move to its summed
+    [visits, value], the total number of simulations and the total number of nodes
+'''
+def root_parallel_search(board, playout_depth, budget, pool, workers, rollout_policy=ROLLOUT_POLICY,
+                         arena_class=TreeArena):
+    share = dict(budget)
+    for name in ("sims", "max_nodes"):
+        if budget[name] is not None:
+            share[name] = max(1, budget[name] // workers)
+    if budget["max_memory_mb"] is not None:
+        share["max_memory_mb"] = budget["max_memory_mb"] / workers
+    seeds = [random.randrange(2**32) for _ in range(workers)]
+    results = pool.map(root_parallel_worker, [(board, playout_depth, share, seed, rollout_policy, arena_class)
+                                                for seed in seeds])
+    moves = {}
+    sims, tree_size = 0, 0
+    for codes, visits, values, worker_sims, worker_size in results:
+        for code, n, v in zip(codes, visits, values):
+            total = moves.setdefault(int(code), [0, 0.])
+            total[0] += int(n)
+            total[1] += float(v)
+        sims += worker_sims
+        tree_size += worker_size
+    return moves, sims, tree_size
+
 '''
+tree_parallel_search:
 
-def backpropagate(currentNode, result): #BACKPROPAGATE
-    currentNode.n += 1
-    currentNode.v += result
-    while currentNode.parent is not None:
-        currentNode.N += 1
-        currentNode = currentNode.parent
-    return currentNode
+Tree parallelization: one tree in the main process. Each round selects TREE_BATCH leaves per worker, with
+a virtual loss (a visit without reward) added along every selected path so that the next descents spread
+out over other leaves, farms the playouts out to the workers in one batch each, then backs up the rewards
+(and updates the AMAF statistics of a RaveArena). A batch holds the root position once, without the part
+of its move stack that repetitions cannot reach, and each leaf as its packed moves, so the cost of sending
+work to the workers no longer grows with the number of playouts times the length of the game.
 
+Parameters:
+    - arena - TreeArena, the search tree, its root is the position of board
+    - board - python-chess BoardState, the position to search
+    - playout_depth - Int, the number of random moves of each playout
+    - budget - Dictionary with the sims, time_limit, max_nodes, max_memory_mb and early_stop of mcts
+    - pool - multiprocessing Pool, the workers
+    - workers - Int, the number of batches per round
+    - rollout_policy - String, the rollout policy of the playouts
+
+Returns:
+    (sims, stop_reason), the number of simulations run and the reason the search stopped
+'''
+def tree_parallel_search(arena, board, playout_depth, budget, pool, workers, rollout_policy=ROLLOUT_POLICY):
+    rave = isinstance(arena, RaveArena)
+    start = time.perf_counter()
+    sim_num = 0
+    while True:
+        stop_reason = budget_exhausted(arena, sim_num, time.perf_counter() - start, budget, True)
+        if stop_reason is not None:
+            return sim_num, stop_reason
+        batch = workers * TREE_BATCH if budget["sims"] is None else min(workers * TREE_BATCH, budget["sims"] - sim_num)
+        paths = []
+        for _ in range(batch):
+            path = expansion(arena, board)
+            apply_virtual_loss(arena, path)
+            paths.append(path)
+            for _ in range(len(path) - 1):
+                board.pop()
+        # only the last halfmove_clock plies can repeat a position, the rest of the stack is not sent
+        root = board.copy(stack=min(board.halfmove_clock, len(board.move_stack)))
+        chunks = [paths[worker::workers] for worker in range(min(workers, batch))]
+        jobs = [(root, [arena.move[path[1:]].tolist() for path in chunk], playout_depth, random.randrange(2**32), rollout_policy, rave)
+                for chunk in chunks]
+        for chunk, results in zip(chunks, pool.map(playout_worker, jobs)):
+            for path, (reward, playout_moves) in zip(chunk, results):
+                backpropagate(arena, path, reward, count_visit=False)
+                if rave:
+                    update_amaf(arena, path, playout_moves, reward)
+        sim_num += batch
 
 '''
 mcts:
 
-The driver for the MCTS algorithm. Gnerates the possible moves, and sets
-the number of simulations for the selection, expansion, playout and backprop
-functions. Calculates the final move to return
-
-Parameters:
-    - currentNode - Node, the current node in question, generated by host_game
-    - kriegspiel - Boolean, whether we are playing kriegspiel or not
-
-Returns:
-    Returns the node that is selected by MCTS, the move that is played on the board
-'''
-def mcts(currentNode, kriegspiel=False):
-    legalMoves = list(currentNode.board_state.legal_moves)
-    possibleMoves = [currentNode.board_state.san(i) for i in legalMoves]
-    move_map = dict()
-    for i in possibleMoves:
-        # Get FEN Notation of Board
-        state = chess.Board(currentNode.board_state.fen())
-        state.push_san(i) 
-        descendant = Node()
-        descendant.board_state = state
-        descendant.parent = currentNode
-        currentNode.children.add(descendant)
-        move_map[descendant] = i
-
-    sims = 200  # I.E "Until We Run Out of Time..."
-    for sim_num in range(sims):
-        child = selection(currentNode, "white", -np.infty)
-        leaf = expansion(child, "white")
-        finalNode, reward = playout(leaf, 0)
-        currentNode = backpropagate(finalNode, reward)
-
-    move = ''
-    ucb_value = -np.infty
-    for child in currentNode.children:
-        child_ucb = ucb1(child)
-        if child_ucb > ucb_value:
-            ucb_value = child_ucb
-            move = move_map[child]
+The driver for the MCTS algorithm. Builds a TreeArena for the position and runs simulations of
+selection/expansion, playout and backpropagation until the first budget runs out: the number of
+simulations, the time limit, the number of nodes in the tree or its memory. With early_stop the search
+also ends as soon as the most visited child of the root can no longer be overtaken in the simulations
+the budget has left. Plays the most visited move. Given an MCTSTree, the search continues from the part of
+the previous tree that is still reachable instead of starting from an empty one. Given a pool of worker
+processes, the simulations are run in parallel, see root_parallel_search and tree_parallel_search.
+
+Parameters:
+    - currentNode - Node, the current node in question, generated by host_game. A Kriegspiel player searches
+    full boards sampled from its BeliefState, see BeliefState.plan_moves
+    - sims - Int, the number of simulations, None for no limit
+    - playout_depth - Int, the number of random moves of each playout, 0 scores the new node directly
+    - stats - Dictionary, optional, filled in with the number of simulations, the time taken, the
+    simulations per second, the size of the tree, the number of nodes reused from the previous tree and
+    the reason the search stopped
+    - time_limit - Float, the time budget in seconds, None for no limit
+    - max_nodes - Int, the maximum number of nodes in the tree, None for no limit
+    - max_memory_mb - Float, the maximum memory of the tree in megabytes, None for no limit
+    - early_stop - Boolean, whether to stop once the best move can no longer change
+    - tree - MCTSTree, optional, the tree of the previous move is reused and the new tree kept in it (not
+    with root parallelization, whose trees live in the workers)
+    - pool - multiprocessing Pool, optional, the worker processes of a parallel search
+    - workers - Int, the number of workers to use, the search is serial if it is 1 or there is no pool
+    - parallel - String, "root" for root parallelization (independent trees, root statistics merged) or
+    "tree" for tree parallelization (one tree with virtual loss, playouts run by the workers)
+    - rollout_policy - String, how the playouts pick their moves, one of rollout.POLICIES: "uniform",
+    "capture" (capture-biased) or "heuristic" (weighted by the evaluation of the position after each move)
+    - rave - Boolean, whether to search a RaveArena, blending each child's value with the AMAF value of its
+    move (see rave_beta for the schedule)
+
+Returns:
+    Returns the move selected by MCTS in UCI format, the move that is played on the board
+'''
+def mcts(currentNode, sims=SIMS, playout_depth=PLAYOUT_DEPTH, stats=None, time_limit=None, max_nodes=None,
+         max_memory_mb=None, early_stop=True, tree=None, pool=None, workers=1, parallel="root", rollout_policy=ROLLOUT_POLICY,
+         rave=False):
+    if sims is None and time_limit is None and max_nodes is None and max_memory_mb is None:
+        raise ValueError("mcts needs at least one of sims, time_limit, max_nodes or max_memory_mb")
+    board = currentNode.board_state.copy()
+    budget = {"sims": sims, "time_limit": time_limit, "max_nodes": max_nodes, "max_memory_mb": max_memory_mb,
+              "early_stop": early_stop}
+    arena_class = RaveArena if rave else TreeArena
+    start = time.perf_counter()
+    reused_nodes = 1
+    if pool is not None and workers > 1 and parallel == "root":
+        root_moves, sim_num, tree_size = root_parallel_search(board, playout_depth, budget, pool, workers, rollout_policy,
+                                                               arena_class)
+        stop_reason = "workers"
+        move = decode_move(max(root_moves, key=lambda code: root_moves[code][0])).uci() if root_moves else ""
+    else:
+        if tree is None:
+            arena = arena_class(board)
+        else:
+            arena = tree.reroot(board, board.move_stack, arena_class)
+        reused_nodes = len(arena)
+        if pool is not None and workers > 1:
+            sim_num, stop_reason = tree_parallel_search(arena, board, playout_depth, budget, pool, workers, rollout_policy)
+        else:
+            sim_num, stop_reason = run_simulations(arena, board, playout_depth, budget, rollout_policy)
+        tree_size = len(arena)
+        best = best_child(arena)
+        move = arena.get_move(best).uci() if best != NO_NODE else ""
+    elapsed = time.perf_counter() - start
+    if stats is not None:
+        stats["sims"] = sim_num
+        stats["time"] = elapsed
+        stats["sims_per_sec"] = sim_num / elapsed if elapsed > 0 else 0.
+        stats["tree_size"] = tree_size
+        stats["reused_nodes"] = reused_nodes - 1
+        stats["stop_reason"] = stop_reason
     return move
@@ -0,0 +1,134 @@
+import chess
+
+HASH_MOVE_SCORE = 10000000
+CAPTURE_SCORE = 1000000
+CHECK_SCORE = 500000
+KILLER_SCORES = (400000, 399000)
+HISTORY_MAX = 300000
+NUM_KILLERS = 2
+
+# MVV-LVA values, indexed by python-chess piece type (None, pawn, knight, bishop, rook, queen, king)
+MVV_LVA_VALUES = (0, 1, 3, 3, 5, 9, 20)
+
+'''
+mvv_lva:
+
+Most valuable victim / least valuable attacker score of a capture. Captures of valuable pieces come
+first and, among those, captures made with cheap pieces.
+
+Parameters:
+    - board_state - python-chess BoardState, the board before the move
+    - move - python-chess Move, a capturing move
+
+Returns:
+    Int, the MVV-LVA score of the capture
+'''
+def mvv_lva(board_state, move):
+    if board_state.is_en_passant(move):
+        victim = chess.PAWN
+    else:
+        victim = board_state.piece_type_at(move.to_square)
+    attacker = board_state.piece_type_at(move.from_square)
+    return 10 * MVV_LVA_VALUES[victim] - MVV_LVA_VALUES[attacker]
+
+
+'''
+Classes:
+    MoveOrderer
+        Orders the moves of a position for the alpha-beta search so that the move most likely to
+        cause a cutoff is searched first: the hash/PV move, then captures by MVV-LVA, then moves
+        giving check, then killer moves and finally quiet moves by their history score.
+
+        Properties:
+            - killers: dictionary mapping the ply (board.ply()) to the last NUM_KILLERS quiet moves
+            that caused a beta cutoff at that ply
+            - history: flat list indexed by side to move, from square and to square, increased by
+            depth * depth every time a quiet move causes a beta cutoff
+'''
+
+class MoveOrderer:
+
+    '''
+    Establishes the object with empty killer and history tables
+
+    Returns:
+        A new object of class MoveOrderer
+    '''
+    def __init__(self):
+        self.killers = {}
+        self.history = [0] * (2 * 64 * 64)
+
+    '''
+    MoveOrderer.new_search:
+
+    Called before searching a new move of the game. Killers are dropped, history scores are halved
+    so that the current position's cutoffs count for more than the old ones.
+
+    Returns:
+        Void return, ages the tables
+    '''
+    def new_search(self):
+        self.killers = {}
+        self.history = [h // 2 for h in self.history]
+
+    '''
+    MoveOrderer.order_moves:
+
+    Sorts the moves of a position, best candidates first
+
+    Parameters:
+        board_state - python-chess BoardState, the position the moves are played from
+        moves - list of python-chess Move, the moves to order
+        hash_move - python-chess Move, the best move stored in the transposition table or of the previous
+        iteration, None if there is none
+
+    Returns:
+        list of (move, gives_check) tuples in the order they should be searched
+    '''
+    def order_moves(self, board_state, moves, hash_move=None):
+        ply = board_state.ply()
+        killers = self.killers.get(ply, ())
+        side = 4096 if board_state.turn == chess.WHITE else 0
+        scored = []
+        for move in moves:
+            gives_check = board_state.gives_check(move)
+            if move == hash_move:
+                score = HASH_MOVE_SCORE
+            elif board_state.is_capture(move):
+                score = CAPTURE_SCORE + mvv_lva(board_state, move)
+            elif move.promotion is not None:
+                score = CAPTURE_SCORE + MVV_LVA_VALUES[move.promotion]
+            elif gives_check:
+                score = CHECK_SCORE
+            elif move in killers:
+                score = KILLER_SCORES[killers.index(move)]
+            else:
+                score = self.history[side + move.from_square * 64 + move.to_square]
+            scored.append((score, move, gives_check))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [(move, gives_check) for score, move, gives_check in scored]
+
+    '''
+    MoveOrderer.record_cutoff:
+
+    Updates the killer and history tables after a move caused a beta cutoff. Captures and
+    promotions are already ordered first, so only quiet moves are recorded.
+
+    Parameters:
+        board_state - python-chess BoardState, the position the move was played from
+        move - python-chess Move, the move that caused the cutoff
+        depth - Int, the remaining depth at the position
+
+    Returns:
+        Void return, updates the tables
+    '''
+    def record_cutoff(self, board_state, move, depth):
+        if board_state.is_capture(move) or move.promotion is not None:
+            return
+        ply = board_state.ply()
+        killers = self.killers.get(ply, ())
+        if move not in killers:
+            self.killers[ply] = ((move,) + killers)[:NUM_KILLERS]
+        side = 4096 if board_state.turn == chess.WHITE else 0
+        idx = side + move.from_square * 64 + move.to_square
+        self.history[idx] = min(HISTORY_MAX, self.history[idx] + depth * depth)
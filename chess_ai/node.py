@@ -1,11 +1,16 @@
 """
 """
 import chess
-import numpy as np
+import heapq
 import heuristics
-import utils
 import copy
 
+# PAWN_TRIES[color][square]: the diagonal pawn captures from a square as python-chess Moves, built once from
+# python-chess's pawn attack bitboards, promoting to a queen on the last rank
+PAWN_TRIES = [[[chess.Move(square, target, chess.QUEEN if chess.BB_SQUARES[target] & chess.BB_BACKRANKS else None)
+                for target in chess.scan_forward(chess.BB_PAWN_ATTACKS[color][square])]
+               for square in chess.SQUARES] for color in (chess.BLACK, chess.WHITE)]
+
 '''
 Classes:
     Node
@@ -22,7 +27,10 @@ Classes:
             - v: winning score of current node
             - n: number of visits to the current node
             - possible_moves: holds possible moves from current node
-            - sorted_children: sorted list containing children of current node
+            - sorted_children: heap of the moves of the children not tried yet, best first, built by
+            get_nth_best_move (-1 once they are all used up)
+            - search_value: the value the last alpha-beta search gave the node as a child of the root, None
+            if it was not searched
             - diag_pawn_moves: diagonal pawn moves that can be made from current node
             - kriegspiel: T/F as to if we are playing Kriegspiel or normal chess,
             respectively
@@ -30,12 +38,13 @@ Classes:
             opponent pieces still remain on the board (specifically how many of each type.
              something a kriegspiel player would be able to deduce from capture messages from the
              referee.
-            - gt_board_state: ground truth board state (both sides of board). 
-            Used for error checking and getting umpire messages 
 '''
 
 class Node:
 
+    __slots__ = ("board_state", "move", "children", "parent", "N", "n", "v", "possible_moves", "sorted_children",
+                 "search_value", "diag_pawn_moves", "kriegspiel", "opponent_pieces")
+
     '''
     Establishes the Object with properties passed in
                 
@@ -46,12 +55,11 @@ class Node:
         kriegspiel - Boolean, depending on what variant we are playing
         opponent_pieces - List, None to start, will include which opponent pieces remain
         from the ground_truth board
-        gt_board_state - BoardState, None to start, ground_truth_board simulating umpire messages
     
     Returns:
         A new object of class Node
     '''
-    def __init__(self, board_state=chess.Board(), move="", parent=None, kriegspiel=False, opponent_pieces=None, gt_board_state=None):
+    def __init__(self, board_state=chess.Board(), move="", parent=None, kriegspiel=False, opponent_pieces=None):
         self.board_state = board_state
         self.move = move
         self.children = set()
@@ -61,10 +69,10 @@ class Node:
         self.v = 0
         self.possible_moves = []
         self.sorted_children = []
+        self.search_value = None
         self.diag_pawn_moves = []
         self.kriegspiel = kriegspiel
         self.opponent_pieces = opponent_pieces
-        self.gt_board_state = gt_board_state
     
     '''
     Node.get_heuristic:
@@ -94,7 +102,8 @@ class Node:
     '''
     Node.remove_opponent_pieces:
 
-    For Kriegspiel, removes the opponents pieces from the legal_moves array when playing Kriegspiel
+    For Kriegspiel, removes the opponents pieces from the legal_moves array when playing Kriegspiel.
+    The squares come from the opponent's occupancy bitboard (belief_state.masked_board caches the result per position)
 
     Parameters:
         curr_player - the current player, I.E whose turn it is when this function is called
@@ -103,15 +112,9 @@ class Node:
         Void return, instead removes pieces on the board_state of the node
     '''
     def remove_opponent_pieces(self, curr_player):
-        board_array = utils.get_board_state_array(self.board_state)
-        cols = chess.FILE_NAMES
-        for row in range(8):
-            for col in range(8):
-                if board_array[row][col] == ".":
-                    continue
-                elif (board_array[row][col].isupper() and curr_player=="B") or \
-                     (board_array[row][col].islower() and curr_player=="W"): # current player is black and want to remove white pieces
-                    self.board_state.remove_piece_at(8*(7-row)+col)
+        opponent_color = chess.BLACK if curr_player == "W" else chess.WHITE
+        for square in chess.scan_reversed(self.board_state.occupied_co[opponent_color]):
+            self.board_state.remove_piece_at(square)
 
     '''
     Node.get_diag_pawn_moves:
@@ -119,107 +122,114 @@ class Node:
     For Kriegspiel, an edge case state when we need to get the number of diagonal pawn moves that can be made.
     Given the setup of Kriegspiel, not knowing where the opponent's pieces are can make python-chess think there aren't 
     legal moves remaining, so this checks to see if a pawn capture can be made, as diagonal pawn moves aren't legal unless
-    it is a legal capture move
+    it is a legal capture move. The tries are read from the PAWN_TRIES tables, without the ones onto the player's own
+    pieces or already among the legal moves (en passant), and replace any earlier list, so repeated calls do not add
+    duplicates.
 
     Parameters:
         curr_player - the current player, I.E whose turn it is when this function is called
 
     Returns:
-        Void return, instead adds potential diagonal pawn moves for capture to the diag_pawn_moves property of the current node
+        Void return, instead sets the potential diagonal pawn moves for capture as the diag_pawn_moves property of the current node
     '''
     def get_diag_pawn_moves(self, curr_player):
-        board_array = utils.get_board_state_array(self.board_state)
-        for row in range(8):
-            for col in range(8):
-                curr_pos = chess.FILE_NAMES[col] + str(8-row)
-                if board_array[row][col] == ".":
-                    continue
-                elif board_array[row][col] == "P" and curr_player == "W":
-                    if (row - 1) >= 0 and (col - 1) >= 0:
-                        diag_move = curr_pos + chess.FILE_NAMES[col-1] + str(8 - (row - 1))
-                        self.diag_pawn_moves.append(chess.Move.from_uci(diag_move))
-                    if (row - 1) >= 0 and (col + 1) <= 7:
-                        diag_move = curr_pos + chess.FILE_NAMES[col+1] + str(8 - (row - 1))
-                        self.diag_pawn_moves.append(chess.Move.from_uci(diag_move))
-                elif board_array[row][col] == "p" and curr_player == "B":
-                    if (row + 1) <= 7 and (col - 1) >= 0:
-                        diag_move = curr_pos + chess.FILE_NAMES[col-1] + str(8 - (row + 1))
-                        self.diag_pawn_moves.append(chess.Move.from_uci(diag_move))
-                    if (row + 1) <= 7 and (col + 1) <= 7:
-                        diag_move = curr_pos + chess.FILE_NAMES[col+1] + str(8 - (row + 1))
-                        self.diag_pawn_moves.append(chess.Move.from_uci(diag_move))
+        color = chess.WHITE if curr_player == "W" else chess.BLACK
+        own = self.board_state.occupied_co[color]
+        tries = [move for square in chess.scan_forward(self.board_state.pieces_mask(chess.PAWN, color))
+                 for move in PAWN_TRIES[color][square]
+                 if not chess.BB_SQUARES[move.to_square] & own and move.to_square != self.board_state.ep_square]
+        self.diag_pawn_moves = tries
+
+    '''
+    Node.expand_children:
+
+    Creates a child node for every legal move from the current node. In Kriegspiel these are the moves of the
+    player's view, the children keep the opponent_pieces of the node (the view cannot tell which moves capture)
+    and the diagonal pawn tries are added; in standard chess the child's v starts with the
+    reward for putting the opponent in check.
+
+    Parameters:
+        curr_player - the current player, I.E whose turn it is when this function is called
+
+    Returns:
+        Void return, instead adds the new nodes to the children property of the current node
+    '''
+    def expand_children(self, curr_player):
+        for next_move in list(self.board_state.legal_moves):
+            new_board_state = copy.deepcopy(self.board_state)
+            next_move = next_move.uci()
+            new_board_state.push_san(next_move)
+
+            child_node = Node(board_state=new_board_state, move=next_move, parent=self, kriegspiel=self.kriegspiel,
+                              opponent_pieces=self.opponent_pieces)
+            if not self.kriegspiel:
+                child_node.v = heuristics.opponent_check(self.board_state, child_node.move, curr_player)
+            self.children.add(child_node)
+        if self.kriegspiel and self.diag_pawn_moves == []:
+            self.get_diag_pawn_moves(curr_player)
 
     '''
     Node.get_nth_best_move:
 
-    Returns the nth best move according to the search algorithm where n is the number of move attempts
+    Returns the nth best move according to the search algorithm where n is the number of move attempts. The children
+    go into a heap the first time, scored by the value the preceding alpha-beta search gave them (search_value) or,
+    without one, by their heuristic, so every further attempt only pops the next best move in O(log n). Once the
+    children are used up, the diagonal pawn tries follow.
 
     Parameters:
         n - Int, number of move attempts
         curr_player - the current player, I.E whose turn it is when this function is called
     
     Returns:
-        Int, returns the nth best move according to the search algorithm where n is the number of move attempts
+        (value, move), the score of the nth best move and the move in UCI format
     '''
     def get_nth_best_move(self, n, curr_player):
         if self.children == set():
-            for next_move in list(self.board_state.legal_moves):
-                new_board_state = copy.deepcopy(self.board_state)
-                if self.kriegspiel:
-                    new_gt_board_state = copy.deepcopy(self.gt_board_state)
-                    if next_move not in new_gt_board_state.legal_moves:
-                        continue
-                else:
-                    new_gt_board_state = None
-                next_move = next_move.uci()
-                new_board_state.push_san(next_move)
-                if self.kriegspiel:
-                    new_gt_board_state.push_san(next_move)
-                child_node = Node(board_state=new_board_state, move=next_move, parent=self, kriegspiel=self.kriegspiel, gt_board_state=new_gt_board_state)
-                if node.kriegspiel:
-                    child_node.update_opponent_pieces(curr_player, child_node.gt_board_state)
-                else:
-                    child_node.v = heuristics.opponent_check(node.board_state, child_node.move, curr_player)
-                self.children.add(child_node)
-            if self.kriegspiel:
-                self.get_diag_pawn_moves(curr_player)
+            self.expand_children(curr_player)
         if self.sorted_children == []:
-            children_lst = []
-            children_v = []
-            for child_node in self.children:
-                if child_node.v == 0:
-                    child_node.get_heuristic(curr_player)
-                children_v.append(child_node.v)
-                children_lst.append(child_node)
-            children_lst = np.array(children_lst)
-            children_v = np.array(children_v)
-            idx = np.argsort(children_v)
-            sorted_values = children_v[idx]
-            self.sorted_children = list(children_lst[idx])
-
-
-            for i in range(len(children_lst)):
-                if self.sorted_children[i].v != sorted_values[i]:
-                    print("uh oh")
-        if self.sorted_children == -1:
-            if self.diag_pawn_moves == []:
-                print("hm")
-                print("problem 2, found")
-            next_move = self.diag_pawn_moves.pop()
-            next_move = next_move.uci()
-            return self.v, next_move
-
-        else:
-            selected_child = self.sorted_children.pop(-1)
+            self.build_move_heap(curr_player)
+        while self.sorted_children != -1:
+            negative_value, next_move = heapq.heappop(self.sorted_children)
             if self.sorted_children == []:
                 self.sorted_children = -1
-            return selected_child.v, selected_child.move
+            return -negative_value, next_move
+        if self.diag_pawn_moves:
+            return self.v, self.diag_pawn_moves.pop(0).uci()
+        print("problem 2, found")
+        return self.v, ""
+
+    '''
+    Node.build_move_heap:
+
+    Scores the children for get_nth_best_move: children the alpha-beta search reached keep its value, the rest are
+    scored by their v, with the positions not scored yet evaluated in one heuristics.batch_evaluate call
+
+    Parameters:
+        curr_player - the current player, I.E whose turn it is when this function is called
+
+    Returns:
+        Void return, sets sorted_children to a heap of (-value, move), -1 if there are no children
+    '''
+    def build_move_heap(self, curr_player):
+        unscored = [child_node for child_node in self.children if child_node.search_value is None and child_node.v == 0]
+        if unscored:
+            values = heuristics.batch_evaluate([child_node.board_state for child_node in unscored], curr_player, self.kriegspiel,
+                                               [child_node.opponent_pieces for child_node in unscored])
+            for child_node, val in zip(unscored, values):
+                child_node.v += int(val)
+        self.sorted_children = [(-(child_node.v if child_node.search_value is None else child_node.search_value), child_node.move)
+                                for child_node in self.children]
+        if self.sorted_children == []:
+            self.sorted_children = -1
+        else:
+            heapq.heapify(self.sorted_children)
 
     '''
     Node.update_opponent_pieces
 
     opponent_pieces is the dictionary that maps piece type to the number of 
-    opponent pieces of that type remaining
+    opponent pieces of that type remaining, counted from the piece bitboards. In host_game the
+    Kriegspiel AIs take it from their BeliefState instead, which only knows what the umpire announced
 
     Parameters:
         curr_player - the current player, I.E whose turn it is when this function is called
@@ -229,16 +239,4 @@ class Node:
         an update to the opponent_pieces dictionary
     '''
     def update_opponent_pieces(self, curr_player, full_board_state):
-        self.opponent_pieces = {}
-        board_array = utils.get_board_state_array(full_board_state)
-        for row in range(8):
-            for col in range(8):
-                if board_array[row][col] == ".":
-                    continue
-                elif (board_array[row][col].isupper() and curr_player=="B") or \
-                     (board_array[row][col].islower() and curr_player=="W"): 
-                    piece = board_array[row][col].lower()
-                    if piece not in self.opponent_pieces:
-                        self.opponent_pieces[piece] = 1
-                    else:
-                        self.opponent_pieces[piece] += 1
+        self.opponent_pieces = heuristics.count_opponent_pieces(full_board_state, curr_player)
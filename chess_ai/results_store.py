@@ -0,0 +1,151 @@
+import json
+import os
+
+'''
+experiment_config:
+
+The configuration a game is stored under, the key experiments are resumed and queried by
+
+Parameters:
+    - white - String, the type of player that white is
+    - black - String, the type of player that black is
+    - kriegspiel - Boolean, whether the games are Kriegspiel
+    - seed - Int, the seed of the experiment, None if it is not seeded
+    - game_options - Dictionary, optional extra keyword arguments of host_game
+    - name - String, optional label to tell apart experiments that differ in ways the other fields do not show
+    (e.g. the search depth globals of host_chess_game)
+
+Returns:
+    Dictionary with the configuration, made of JSON types only
+'''
+def experiment_config(white, black, kriegspiel=False, seed=None, game_options=None, name=None):
+    config = {"white": white, "black": black, "kriegspiel": kriegspiel, "seed": seed, "game_options": game_options or {}}
+    if name is not None:
+        config["name"] = name
+    # round trip so that a config compares equal to one read back from the file (tuples become lists and so on)
+    return json.loads(json.dumps(config, sort_keys=True))
+
+
+'''
+Classes:
+    ResultsStore
+        Append-only store of experiment results, one JSON object per line and one line per game:
+        {"config": ..., "run": ..., "game": ..., "seed": ..., "result": ..., "termination": ..., "plies": ...,
+        "move_times": [...]}. Every game is written and flushed as soon as it ends, so a crash loses at most
+        the games in flight, and reading streams through the file one line at a time.
+
+        Properties:
+            - path: the path of the JSONL file
+'''
+
+class ResultsStore:
+
+    '''
+    Establishes the store on a file, which is created on the first append if it does not exist yet
+
+    Parameters:
+        path - String, the path of the JSONL file
+
+    Returns:
+        A new object of class ResultsStore
+    '''
+    def __init__(self, path):
+        self.path = path
+
+    '''
+    ResultsStore.append:
+
+    Parameters:
+        record - Dictionary, the record of one game, with at least config, run and game
+
+    Returns:
+        Void return, writes the record as one line at the end of the file
+    '''
+    def append(self, record):
+        with open(self.path, "a+b") as f:
+            # a crash in the middle of a write leaves a partial line, start on a fresh one after it
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write((json.dumps(record, sort_keys=True) + "\n").encode())
+            f.flush()
+
+    '''
+    ResultsStore.records:
+
+    Streams the stored games, optionally only those of one configuration
+
+    Parameters:
+        config - Dictionary, optional, an experiment_config, only the records stored under exactly that config
+        are returned (an experiment without a name does not pick up the named ones)
+
+    Returns:
+        generator of the matching records, in the order they were written. Lines that are not complete
+        JSON (a write cut short by a crash) are skipped
+    '''
+    def records(self, config=None):
+        return self.matching(lambda record_config: config is None or record_config == config)
+
+    '''
+    ResultsStore.query:
+
+    Streams the stored games of every configuration that has some given items, to look across experiments
+
+    Parameters:
+        items - Dictionary, the records whose config has all of these items are returned, e.g.
+        {"white": "mcts_ai", "kriegspiel": True}
+
+    Returns:
+        generator of the matching records, in the order they were written
+    '''
+    def query(self, items):
+        return self.matching(lambda record_config: all(record_config.get(key) == value for key, value in items.items()))
+
+    '''
+    ResultsStore.matching:
+
+    Parameters:
+        accept - function, takes the config of a record and returns whether the record is wanted
+
+    Returns:
+        generator of the records accepted, in the order they were written. Lines that are not complete JSON
+        (a write cut short by a crash) are skipped
+    '''
+    def matching(self, accept):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if accept(record["config"]):
+                    yield record
+
+    '''
+    ResultsStore.completed:
+
+    Parameters:
+        config - Dictionary, the experiment_config of an experiment
+
+    Returns:
+        Dictionary mapping (run, game) to the record of every game of that experiment already stored, so an
+        interrupted experiment can be resumed
+    '''
+    def completed(self, config):
+        return {(record["run"], record["game"]): record for record in self.records(config)}
+
+    '''
+    ResultsStore.configs:
+
+    Returns:
+        list of the distinct configs in the store, in the order they first appear
+    '''
+    def configs(self):
+        configs = []
+        for record in self.records():
+            if record["config"] not in configs:
+                configs.append(record["config"])
+        return configs
@@ -0,0 +1,209 @@
+import chess
+import numpy as np
+import random
+import heuristics
+
+POLICIES = ("uniform", "capture", "heuristic")
+CAPTURE_WEIGHT = 8.  # weight of captures and promotions against 1 for quiet moves under the "capture" policy
+TEMPERATURE = 1.  # softmax temperature of the "heuristic" policy, in pawns
+UNIFORM_TRIES = 8  # draws of uniform_pseudo_legal_move before sample_move falls back to listing every move
+
+'''
+pack_children:
+
+Builds the packed bitboards (as heuristics.pack_boards) of the positions after each move, straight from the
+parent's bitboards, without pushing the moves or copying the board
+
+Parameters:
+    - board_state - python-chess BoardState, the parent position
+    - moves - list of python-chess Move, pseudo-legal moves of the side to move
+
+Returns:
+    NumPy uint64 array of shape (len(moves), 2, 6), indexed [move, color, piece_type - 1]
+'''
+def pack_children(board_state, moves):
+    parent = [[int(board_state.pieces_mask(piece_type, color)) for piece_type in chess.PIECE_TYPES] for color in chess.COLORS[::-1]]
+    mover = int(board_state.turn)
+    rows = []
+    for move in moves:
+        child = [parent[0][:], parent[1][:]]
+        own, opponent = child[mover], child[1 - mover]
+        from_bb = chess.BB_SQUARES[move.from_square]
+        to_bb = chess.BB_SQUARES[move.to_square]
+        if board_state.is_castling(move):
+            rank = chess.square_rank(move.from_square)
+            kingside = board_state.is_kingside_castling(move)
+            own[chess.KING - 1] ^= from_bb | chess.BB_SQUARES[chess.square(6 if kingside else 2, rank)]
+            own[chess.ROOK - 1] ^= chess.BB_SQUARES[chess.square(7 if kingside else 0, rank)] | \
+                chess.BB_SQUARES[chess.square(5 if kingside else 3, rank)]
+        else:
+            piece_type = board_state.piece_type_at(move.from_square)
+            own[piece_type - 1] &= ~from_bb & chess.BB_ALL
+            own[(move.promotion or piece_type) - 1] |= to_bb
+            for i in range(6):
+                opponent[i] &= ~to_bb & chess.BB_ALL
+            if board_state.is_en_passant(move):
+                captured = move.to_square - 8 if board_state.turn == chess.WHITE else move.to_square + 8
+                opponent[chess.PAWN - 1] &= ~chess.BB_SQUARES[captured] & chess.BB_ALL
+        rows.append(child)
+    return np.array(rows, dtype=np.uint64).reshape(len(moves), 2, 6)
+
+'''
+move_weights:
+
+Parameters:
+    - board_state - python-chess BoardState, the position the moves are played from
+    - moves - list of python-chess Move, pseudo-legal moves of the side to move
+    - policy - String, one of POLICIES: "uniform" (every move alike), "capture" (captures and promotions
+    CAPTURE_WEIGHT times as likely as quiet moves) or "heuristic" (softmax of heuristics.batch_evaluate of
+    the position after each move, for the side making it)
+    - temperature - Float, the softmax temperature of the "heuristic" policy
+
+Returns:
+    list of the sampling weight of each move, None for the uniform policy
+'''
+def move_weights(board_state, moves, policy, temperature=TEMPERATURE):
+    if policy == "uniform":
+        return None
+    if policy == "capture":
+        return [CAPTURE_WEIGHT if board_state.is_capture(move) or move.promotion is not None else 1. for move in moves]
+    if policy == "heuristic":
+        values = heuristics.batch_evaluate(pack_children(board_state, moves), "W" if board_state.turn == chess.WHITE else "B")
+        values = values.astype(np.float64) / temperature
+        return list(np.exp(values - values.max()))
+    raise ValueError("Unknown rollout policy: " + str(policy))
+
+'''
+uniform_pseudo_legal_move:
+
+Draws one pseudo-legal move uniformly without generating all of them: the moves of each piece are counted
+from its attack mask (pushes and captures for pawns), a piece is drawn in proportion to its count, and only
+that piece's moves are generated
+
+Parameters:
+    - board_state - python-chess BoardState, the position to move in
+    - rng - random.Random or the random module, the source of randomness
+
+Returns:
+    python-chess Move, None if the side to move has no pseudo-legal move
+'''
+def uniform_pseudo_legal_move(board_state, rng=random):
+    color = board_state.turn
+    own = board_state.occupied_co[color]
+    empty = ~board_state.occupied & chess.BB_ALL
+    targets = board_state.occupied_co[not color]
+    if board_state.ep_square is not None and board_state.has_pseudo_legal_en_passant():
+        targets |= chess.BB_SQUARES[board_state.ep_square]
+    squares, counts, total = [], [], 0
+    for square in chess.scan_reversed(own & ~board_state.pawns):
+        count = chess.popcount(board_state.attacks_mask(square) & ~own)
+        if square == board_state.king(color) and board_state.castling_rights & own:
+            count += sum(1 for _ in board_state.generate_castling_moves())
+        if count:
+            squares.append(square)
+            counts.append(count)
+            total += count
+    forward = 8 if color == chess.WHITE else -8
+    start_rank, last_rank = (1, 7) if color == chess.WHITE else (6, 0)
+    for square in chess.scan_reversed(own & board_state.pawns):
+        count = chess.popcount(chess.BB_PAWN_ATTACKS[color][square] & targets)
+        if chess.BB_SQUARES[square + forward] & empty:
+            count += 1
+            if chess.square_rank(square) == start_rank and chess.BB_SQUARES[square + 2 * forward] & empty:
+                count += 1
+        if chess.square_rank(square + forward) == last_rank:
+            count *= 4
+        if count:
+            squares.append(square)
+            counts.append(count)
+            total += count
+    if total == 0:
+        return None
+    r = rng.randrange(total)
+    for square, count in zip(squares, counts):
+        if r < count:
+            moves = list(board_state.generate_pseudo_legal_moves(chess.BB_SQUARES[square]))
+            return moves[r] if len(moves) == count else rng.choice(moves)
+        r -= count
+
+'''
+sample_move:
+
+Draws a legal move by rejection sampling over the pseudo-legal moves: a drawn move that turns out to be
+illegal is taken out and another one is drawn, so only the moves that are drawn are checked for legality.
+The uniform policy first tries uniform_pseudo_legal_move, which does not generate every move.
+
+Parameters:
+    - board_state - python-chess BoardState, the position to move in
+    - policy - String, one of POLICIES
+    - rng - random.Random or the random module, the source of randomness
+
+Returns:
+    python-chess Move, None if there is no legal move
+'''
+def sample_move(board_state, policy="uniform", rng=random):
+    if policy == "uniform":
+        # redrawing from all pseudo-legal moves until one is legal is still uniform over the legal moves,
+        # positions with few legal moves (in check) fall through to the exhaustive draw below
+        for _ in range(UNIFORM_TRIES):
+            move = uniform_pseudo_legal_move(board_state, rng)
+            if move is None:
+                return None
+            if board_state.is_legal(move):
+                return move
+    moves = list(board_state.generate_pseudo_legal_moves())
+    weights = move_weights(board_state, moves, policy) if moves else None
+    while moves:
+        if weights is None:
+            i = rng.randrange(len(moves))
+        else:
+            i = rng.choices(range(len(moves)), weights)[0]
+        move = moves[i]
+        if board_state.is_legal(move):
+            return move
+        moves[i] = moves[-1]
+        moves.pop()
+        if weights is not None:
+            weights[i] = weights[-1]
+            weights.pop()
+            if sum(weights) <= 0:
+                weights = None
+    return None
+
+'''
+play:
+
+Plays a rollout on the board in place: up to depth sampled moves, fewer if a side runs out of legal moves
+
+Parameters:
+    - board_state - python-chess BoardState, the position to play from, the moves are pushed on it
+    - depth - Int, the depth cutoff, the maximum number of moves
+    - policy - String, one of POLICIES
+    - rng - random.Random or the random module, the source of randomness
+
+Returns:
+    Int, the number of moves pushed, to be taken back with unplay
+'''
+def play(board_state, depth, policy="uniform", rng=random):
+    num_moves = 0
+    while num_moves < depth:
+        move = sample_move(board_state, policy, rng)
+        if move is None:
+            break
+        board_state.push(move)
+        num_moves += 1
+    return num_moves
+
+'''
+unplay:
+
+Parameters:
+    - board_state - python-chess BoardState, the board a rollout was played on
+    - num_moves - Int, the number of moves returned by play
+
+Returns:
+    Void return, pops the moves of the rollout
+'''
+def unplay(board_state, num_moves):
+    for _ in range(num_moves):
+        board_state.pop()
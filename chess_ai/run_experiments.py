@@ -1,14 +1,105 @@
 import chess
 import host_chess_game
+import multiprocessing
+from results_store import ResultsStore, experiment_config
+from analysis import SPRT, score_matrix, store_scores, elo_trajectories, mean_confidence, summarize
 import numpy as np
 import matplotlib.pyplot as plt
 from datetime import datetime
 from tqdm import tqdm
-from os import listdir
 
-INITIAL_ELO = 1200
-K = 32 # for weaker players, 16 for masters
 
+'''
+game_seeds:
+
+Parameters:
+    - seed - Int, the seed of the experiment, None for unseeded games
+    - num_runs - Int, the number of runs
+    - num_games - Int, the number of games per run
+
+Returns:
+    list of num_runs lists of num_games seeds, one per game, drawn from the experiment's seed so that every
+    game can be replayed on its own (all None without a seed)
+'''
+def game_seeds(seed, num_runs, num_games):
+    if seed is None:
+        return [[None] * num_games for _ in range(num_runs)]
+    return np.random.SeedSequence(seed).generate_state(num_runs * num_games).reshape(num_runs, num_games).tolist()
+
+'''
+play_game:
+
+Plays one game of a tournament, in the calling process or in a worker process of the pool
+
+Parameters:
+    - args - tuple (run_num, game_num, white, black, kriegspiel, seed, game_options), game_options being extra
+    keyword arguments of host_game
+
+Returns:
+    (run_num, game_num, result, game_stats), the result as returned by host_game and the stats it filled in
+'''
+def play_game(args):
+    run_num, game_num, white, black, kriegspiel, seed, game_options = args
+    game_stats = {}
+    result = host_chess_game.host_game(white=white, black=black, kriegspiel=kriegspiel, print_updates=False, print_output=False, seed=seed,
+                                       stats=game_stats, **game_options)
+    return run_num, game_num, result, game_stats
+
+'''
+play_tournament:
+
+Plays num_runs x num_games games, one after another or spread over a pool of worker processes. With a pool the
+games finish out of order, each result is handed to on_result as soon as it comes back and is put in its place
+in the original order.
+
+Parameters:
+    - white - String, the type of player that white is
+    - black - String, the type of player that black is
+    - kriegspiel - Boolean, whether the games are Kriegspiel
+    - num_games - Int, the number of games per run
+    - num_runs - Int, the number of runs
+    - workers - Int, the number of worker processes, the games are played in this process if it is 1
+    - seed - Int, the seed of the experiment, see game_seeds
+    - game_options - Dictionary, optional extra keyword arguments of host_game, e.g. {"mcts_budget": ...}. With more
+    than one worker it cannot set mcts_workers or ab_workers (a ValueError is raised), the games are already
+    spread over the processes
+    - on_result - function, optional, called with (run_num, game_num, result, game_stats) as each game completes
+    - completed - Dictionary, optional, maps (run_num, game_num) to the result of games already played, which are
+    not played again
+    - stop - function, optional, called with each result (those of the completed games first), the tournament
+    stops as soon as it returns True, e.g. SPRT.update
+
+Returns:
+    list of num_runs lists of the num_games results, in game order, None for the games not played
+'''
+def play_tournament(white, black, kriegspiel=False, num_games=10, num_runs=10, workers=1, seed=None, game_options=None, on_result=None,
+                    completed=None, stop=None):
+    seeds = game_seeds(seed, num_runs, num_games)
+    completed = completed or {}
+    results = [[completed.get((run_num, game_num)) for game_num in range(num_games)] for run_num in range(num_runs)]
+    if stop is not None and any([stop(result) for result in completed.values()]):
+        return results
+    jobs = [(run_num, game_num, white, black, kriegspiel, seeds[run_num][game_num], game_options or {})
+            for run_num in range(num_runs) for game_num in range(num_games) if (run_num, game_num) not in completed]
+    nested = [option for option in ("mcts_workers", "ab_workers") if (game_options or {}).get(option)]
+    if workers > 1 and nested:
+        # pool workers are daemonic and cannot start the search pools of their games
+        raise ValueError("game_options cannot set " + " and ".join(nested) + " when the games are played by more than one worker")
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        finished = map(play_game, jobs) if pool is None else pool.imap_unordered(play_game, jobs)
+        for run_num, game_num, result, game_stats in tqdm(finished, total=len(jobs)):
+            results[run_num][game_num] = result
+            if on_result is not None:
+                on_result(run_num, game_num, result, game_stats)
+            if stop is not None and stop(result):
+                break
+    finally:
+        # the games still in flight after an early stop or an exception are dropped
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    return results
 
 '''
 simulate_many_games:
@@ -17,7 +108,12 @@ This function calls upon host_chess_game functionality to simulate the chess gam
 will run the simulations a set number of times. For each game, it calculates the resulting ELO, 
 and appends it to a list of elo scores, helping an end user understand how the players are doing over time.
 Also calls upon the make plots function with the number of games so as to plot the changes in ELO scores over
-a set number of games
+a set number of games. The games can be spread over a pool of worker processes (see play_tournament); the Elo
+of a run is computed once all its games are in, in game order, so it is the same as in a serial experiment with
+the same seed, and saved right away. Given a results store, every game is appended to it as it ends instead,
+the games of the same configuration already in the store are not played again (an interrupted experiment
+resumes where it stopped), and the plot only shows that configuration. With an SPRT the tournament stops as
+soon as the test accepts a hypothesis about the Elo difference, instead of always playing num_games x num_runs.
 
 Parameters:
     - white - String, the type of player that white is: random, an AI player, or human
@@ -25,45 +121,60 @@ Parameters:
     - kriegspiel - Boolean, whether the experiments are for kriegspiel or not
     - num_games - Int, the number of games per run to simulate
     - num_runs - Int, the number of runs to simulate in an experiment
+    - workers - Int, the number of worker processes playing games at the same time
+    - seed - Int, optional seed of the experiment, every game gets its own seed drawn from it
+    - game_options - Dictionary, optional extra keyword arguments of host_game
+    - store_path - String, optional path of a ResultsStore JSONL file to write the games to, instead of npz files
+    - name - String, optional label of the configuration in the store, see experiment_config
+    - sprt - SPRT, optional sequential test to stop the tournament early, e.g. SPRT(elo0=0, elo1=100)
 
 Returns:
     Null, effectively calculates the changes in ELO and then calls the make_plot function to generate a plot
     for the observed 
 '''
-def simulate_many_games(white, black, kriegspiel=False, num_games=10, num_runs=10):
-    total_runs_W = []
-    total_runs_B = []
-    for run_num in range(num_runs):
-        elo_W = [INITIAL_ELO]
-        elo_B = [INITIAL_ELO]
-        for game_num in tqdm(range(num_games)):
-            exp_result_W = 1./(1+10**((elo_B[-1] - elo_W[-1])/400.))
-            exp_result_B = 1./(1+10**((elo_W[-1] - elo_B[-1])/400.))
-            result = host_chess_game.host_game(white=white, black=black, kriegspiel=kriegspiel, print_updates=False, print_output=False)
-            if result == "1-0":
-                s_w = 1
-                s_b = 0
-            elif result == "0-1":
-                s_w = 0
-                s_b = 1
-            else:
-                s_w = 0.5
-                s_b = 0.5
-            elo_W.append(elo_W[-1] + K * (s_w - exp_result_W))
-            elo_B.append(elo_B[-1] + K * (s_b - exp_result_B))
-        total_runs_W.append(elo_W)
-        total_runs_B.append(elo_B)
+def simulate_many_games(white, black, kriegspiel=False, num_games=10, num_runs=10, workers=1, seed=None, game_options=None, store_path=None,
+                        name=None, sprt=None):
+    stop = sprt.update if sprt is not None else None
+    if store_path is not None:
+        store = ResultsStore(store_path)
+        config = experiment_config(white, black, kriegspiel, seed, game_options, name)
+        seeds = game_seeds(seed, num_runs, num_games)
+
+        def store_game(run_num, game_num, result, game_stats):
+            store.append({"config": config, "run": run_num, "game": game_num, "seed": seeds[run_num][game_num], "result": result,
+                          **game_stats})
+
+        completed = {key: record["result"] for key, record in store.completed(config).items()}
+        play_tournament(white, black, kriegspiel, num_games, num_runs, workers, seed, game_options, store_game, completed, stop)
+        scores = store_scores(store_path, config, num_games)
+    else:
+        run_results = [[None] * num_games for _ in range(num_runs)]
+        remaining = [num_games] * num_runs
         rng = np.random.default_rng()
-        np.savez("results" + str(rng.integers(10000000)) + ".npz", elo_W=np.array(elo_W), elo_B=np.array(elo_B))
-    total_runs_W = np.array(total_runs_W)
-    total_runs_B = np.array(total_runs_B)
 
-    make_plot(num_games)
+        def save_run(run_num, game_num, result, game_stats):
+            run_results[run_num][game_num] = result
+            remaining[run_num] -= 1
+            if remaining[run_num] == 0:
+                elo_W, elo_B = elo_trajectories(score_matrix([run_results[run_num]]))
+                np.savez("results" + str(rng.integers(10000000)) + ".npz", elo_W=elo_W[0], elo_B=elo_B[0])
+
+        scores = score_matrix(play_tournament(white, black, kriegspiel, num_games, num_runs, workers, seed, game_options, save_run,
+                                              stop=stop))
+
+    summary = summarize(scores)
+    print("games: {games}, white wins {wins:.1%}, draws {draws:.1%}, losses {losses:.1%}".format(**summary))
+    print("white score: {:.3f} +/- {:.3f}, Elo difference: {:.0f} [{:.0f}, {:.0f}]".format(
+        summary["score"], summary["score_ci"], summary["elo_diff"], *summary["elo_ci"]))
+    if sprt is not None:
+        print("SPRT elo0={} elo1={}: LLR {:.2f} in [{:.2f}, {:.2f}], accepted: {}".format(
+            sprt.elo0, sprt.elo1, sprt.llr(), sprt.lower, sprt.upper, sprt.decision()))
+    make_plot(num_games, scores)
 
     # avg_per_game_W = np.average(total_runs_W, axis=0)
     # avg_per_game_B = np.average(total_runs_B, axis=0)
     # std_per_game_W = np.std(total_runs_W, axis=0)
-    # std_per_game_B = np.std(total_runs_W, axis=0)
+    # std_per_game_B = np.std(total_runs_B, axis=0)
     #
     # colors = ["tab:blue", "tab:orange", "tab:green"]
     # light_colors = ["lightblue", "peachpuff", "honeydew"]
@@ -90,26 +201,18 @@ Similar to HW4 in setup as for the plotting.
 
 Parameters:
     - num_games - the number of games to plot for
+    - scores - NumPy array of shape (runs, games) of white's scores, see analysis.score_matrix. The runs without
+    any game are left out and the others are averaged over the games they played
 
 Returns:
     A plot showing the average elo scores for each game, with the number of elo scores being average for a specific game as the
     number of runs passed in
 '''
-def make_plot(num_games):
-    total_runs_W = []
-    total_runs_B = []
-    for filename in listdir("."):
-        if filename[-1] == "z":
-            data = np.load(filename)
-            total_runs_W.append(data["elo_W"])
-            total_runs_B.append(data["elo_B"])
-    total_runs_W = np.array(total_runs_W)
-    total_runs_B = np.array(total_runs_B)
-
-    avg_per_game_W = np.average(total_runs_W, axis=0)
-    avg_per_game_B = np.average(total_runs_B, axis=0)
-    std_per_game_W = np.std(total_runs_W, axis=0)
-    std_per_game_B = np.std(total_runs_W, axis=0)
+def make_plot(num_games, scores):
+    scores = scores[~np.isnan(scores).all(axis=1)]
+    elo_W, elo_B = elo_trajectories(scores)
+    avg_per_game_W, std_per_game_W, _ = mean_confidence(elo_W)
+    avg_per_game_B, std_per_game_B, _ = mean_confidence(elo_B)
 
     colors = ["tab:blue", "tab:orange", "tab:green"]
     light_colors = ["lightblue", "peachpuff", "honeydew"]
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of chess_ai import each other by their flat names, as when the scripts are run from that folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
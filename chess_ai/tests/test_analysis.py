@@ -0,0 +1,69 @@
+import math
+import random
+import numpy as np
+import pytest
+from analysis import SPRT, elo_to_score, elo_trajectories, score_matrix, score_to_elo, summarize, INITIAL_ELO
+
+
+def games_to_decision(sprt, rng, elo, draw_rate=0.3, max_games=20000):
+    # white wins, draws or loses with the expected score of an Elo difference of elo
+    score = elo_to_score(elo)
+    win_rate = score - draw_rate / 2
+    for games in range(1, max_games + 1):
+        draw = rng.random()
+        result = "1/2-1/2" if draw < draw_rate else ("1-0" if rng.random() < win_rate / (1 - draw_rate) else "0-1")
+        if sprt.update(result):
+            return games
+    return None
+
+
+def test_sprt_needs_games():
+    sprt = SPRT()
+    assert sprt.llr() == 0. and sprt.decision() is None
+
+
+def test_sprt_one_sided_matches_are_decided_quickly():
+    wins, losses = SPRT(), SPRT()
+    assert any(wins.update("1-0") for _ in range(20)) and wins.decision() == "H1"
+    assert any(losses.update("0-1") for _ in range(20)) and losses.decision() == "H0"
+    assert wins.wins < 20 and losses.losses < 20
+
+
+def test_sprt_bounds():
+    sprt = SPRT(alpha=0.05, beta=0.1)
+    assert sprt.lower == pytest.approx(math.log(0.1 / 0.95))
+    assert sprt.upper == pytest.approx(math.log(0.9 / 0.05))
+
+
+@pytest.mark.parametrize("true_elo, accepted", [(0., "H0"), (100., "H1")])
+def test_sprt_accepts_the_true_hypothesis_within_its_error_rate(true_elo, accepted):
+    rng = random.Random(0)
+    decisions = []
+    for _ in range(100):
+        sprt = SPRT(elo0=0., elo1=100., alpha=0.05, beta=0.05)
+        assert games_to_decision(sprt, rng, true_elo) is not None
+        decisions.append(sprt.decision())
+    # 5% errors are allowed, with room for the noise of 100 tests
+    assert decisions.count(accepted) >= 88
+
+
+def test_score_and_elo_conversions_are_inverse():
+    for elo in (-400., -50., 0., 120.):
+        assert score_to_elo(elo_to_score(elo)) == pytest.approx(elo)
+    assert score_to_elo(0.5) == 0. and score_to_elo(1.) == np.inf
+
+
+def test_elo_trajectories_are_zero_sum_and_stop_at_missing_games():
+    scores = score_matrix([["1-0", "1/2-1/2", "0-1"], ["1-0", None]])
+    elo_W, elo_B = elo_trajectories(scores)
+    assert elo_W.shape == (2, 4)
+    played = ~np.isnan(elo_W)
+    assert np.allclose((elo_W + elo_B)[played], 2 * INITIAL_ELO)
+    assert elo_W[0, 1] == INITIAL_ELO + 16 and np.isnan(elo_W[1, 2:]).all()
+
+
+def test_summarize_rates():
+    summary = summarize(score_matrix([["1-0", "0-1", "1/2-1/2", "1-0"]]))
+    assert summary["games"] == 4 and summary["wins"] == 0.5 and summary["draws"] == 0.25 and summary["losses"] == 0.25
+    assert summary["score"] == 0.625 and summary["elo_diff"] > 0
+    assert summarize(score_matrix([[None]]))["games"] == 0
@@ -0,0 +1,92 @@
+import random
+import chess
+import pytest
+from belief_state import BeliefState, masked_board, umpire_capture
+
+
+def assert_consistent(belief, board):
+    own = belief.view.occupied_co[belief.color]
+    for particle in belief.particles:
+        # the player's own pieces are known exactly, the opponent's only by their number
+        assert particle.occupied_co[belief.color] == own
+        for square in chess.scan_reversed(own):
+            assert particle.piece_at(square) == belief.view.piece_at(square)
+        assert chess.popcount(particle.occupied_co[not belief.color]) == sum(belief.opponent_pieces.values())
+        assert particle.turn == board.turn
+        for move in belief.illegal_moves:
+            assert not particle.is_legal(move)
+
+
+def play(board, beliefs, move):
+    color = board.turn
+    capture = umpire_capture(board, move)
+    board.push(move)
+    check = board.is_check()
+    beliefs[color].own_move(move, capture, check)
+    beliefs[not color].opponent_move(capture[0], check)
+
+
+def test_capture_announcements():
+    board = chess.Board()
+    beliefs = {chess.WHITE: BeliefState(board, "W", seed=0), chess.BLACK: BeliefState(board, "B", seed=1)}
+    for uci in ("e2e4", "d7d5", "e4d5"):
+        play(board, beliefs, chess.Move.from_uci(uci))
+    white, black = beliefs[chess.WHITE], beliefs[chess.BLACK]
+    assert white.opponent_pieces["p"] == 7
+    assert all(particle.piece_at(chess.D5) == chess.Piece(chess.PAWN, chess.WHITE) for particle in white.particles)
+    assert black.view.piece_at(chess.D5) is None and chess.popcount(black.view.pawns) == 7
+    # black only hears that a piece was taken on d5, not which white piece took it
+    assert all(particle.color_at(chess.D5) == chess.WHITE for particle in black.particles)
+    for belief in beliefs.values():
+        assert_consistent(belief, board)
+
+
+def test_illegal_attempt_drops_the_particles_it_is_legal_in():
+    board = chess.Board()
+    beliefs = {chess.WHITE: BeliefState(board, "W", seed=0), chess.BLACK: BeliefState(board, "B", seed=1)}
+    play(board, beliefs, chess.Move.from_uci("e2e4"))
+    play(board, beliefs, chess.Move.from_uci("e7e5"))
+    white = beliefs[chess.WHITE]
+    # the pawn try is rejected: there is no black piece on d5 or f5
+    for uci in ("e4d5", "e4f5"):
+        move = chess.Move.from_uci(uci)
+        assert not board.is_legal(move)
+        white.illegal_attempt(move)
+        assert_consistent(white, board)
+    assert not any(particle.piece_at(chess.D5) or particle.piece_at(chess.F5) for particle in white.particles)
+    assert chess.Move.from_uci("e4d5") not in white.candidate_moves()
+    # a new turn forgets the rejected moves
+    play(board, beliefs, chess.Move.from_uci("g1f3"))
+    assert white.illegal_moves == []
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_belief_stays_consistent_over_a_random_game(seed):
+    rng = random.Random(seed)
+    board = chess.Board()
+    beliefs = {chess.WHITE: BeliefState(board, "W", num_particles=16, seed=seed),
+               chess.BLACK: BeliefState(board, "B", num_particles=16, seed=seed + 1)}
+    while not board.is_game_over() and len(board.move_stack) < 60:
+        belief = beliefs[board.turn]
+        for move in belief.candidate_moves():
+            if board.is_legal(move):
+                break
+            belief.illegal_attempt(move)
+            assert_consistent(belief, board)
+        # every legal move is a candidate, so the loop always ends on one
+        assert board.is_legal(move)
+        if rng.random() < 0.5:
+            move = rng.choice(list(board.legal_moves))
+        play(board, beliefs, move)
+        for color, belief in beliefs.items():
+            assert_consistent(belief, board)
+            view = masked_board(board, "W" if color == chess.WHITE else "B")
+            assert belief.view.board_fen() == view.board_fen()
+
+
+def test_plan_moves_puts_the_searched_move_first_and_covers_the_legal_moves():
+    belief = BeliefState(chess.Board(), "W", seed=0)
+    plan = list(belief.plan_moves(lambda sample: "g1f3", 2))
+    assert plan[0] == "g1f3"
+    assert len(plan) == len(set(plan))
+    assert {move.uci() for move in chess.Board().legal_moves} <= set(plan)
@@ -0,0 +1,93 @@
+import time
+import chess
+import pytest
+from game_driver import play_game, play_games, Player, RandomPlayer, AlphaBetaPlayer, MCTSPlayer
+
+
+class ScriptedPlayer(Player):
+    # plays the given moves in order, each try of a Kriegspiel turn takes the next one
+
+    def __init__(self, moves, delay=0.):
+        super().__init__()
+        self.script = [chess.Move.from_uci(move) if move else None for move in moves]
+        self.delay = delay
+        self.rejections = []
+
+    def new_game(self, color, kriegspiel=False, board=None):
+        super().new_game(color, kriegspiel, board)
+        self.moves = iter(self.script)
+
+    def choose_move(self, board_view, clock):
+        time.sleep(self.delay)
+        return next(self.moves)
+
+    def rejected(self, move):
+        super().rejected(move)
+        self.rejections.append(move)
+
+
+def test_checkmate():
+    white, black = ScriptedPlayer(["f2f3", "g2g4"]), ScriptedPlayer(["e7e5", "d8h4"])
+    assert play_game(white, black) == ("0-1", "CHECKMATE", 4)
+
+
+def test_finished_positions_end_before_any_move():
+    mated = chess.Board("rnb1kbnr/pppp1ppp/8/4p3/6Pq/5P2/PPPPP2P/RNBQKBNR w KQkq - 1 3")
+    assert play_game(RandomPlayer(), RandomPlayer(), board=mated) == ("0-1", "CHECKMATE", 0)
+    stalemate = chess.Board("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    assert play_game(RandomPlayer(), RandomPlayer(), board=stalemate) == ("1/2-1/2", "STALEMATE", 0)
+    kings = chess.Board("8/8/4k3/8/8/3K4/8/8 w - - 0 1")
+    assert play_game(RandomPlayer(), RandomPlayer(), board=kings) == ("1/2-1/2", "INSUFFICIENT_MATERIAL", 0)
+
+
+def test_insufficient_material_after_a_capture():
+    board = chess.Board("8/8/4k3/8/8/3K4/4r3/8 w - - 0 1")
+    white, black = ScriptedPlayer(["d3e2"]), ScriptedPlayer([])
+    assert play_game(white, black, board=board) == ("1/2-1/2", "INSUFFICIENT_MATERIAL", 1)
+
+
+def test_fivefold_repetition():
+    white = ScriptedPlayer(["g1f3", "f3g1"] * 4)
+    black = ScriptedPlayer(["g8f6", "f6g8"] * 4)
+    assert play_game(white, black) == ("1/2-1/2", "FIVEFOLD_REPETITION", 16)
+
+
+def test_max_plies():
+    assert play_game(RandomPlayer(0), RandomPlayer(1), max_plies=7) == ("1/2-1/2", "MAX_PLIES", 7)
+
+
+def test_time_forfeit():
+    white, black = ScriptedPlayer(["e2e4", "d2d4"]), ScriptedPlayer(["e7e5", "d7d5"], delay=0.05)
+    assert play_game(white, black, time_control=0.08) == ("1-0", "TIME_FORFEIT", 3)
+
+
+def test_bad_moves_raise():
+    with pytest.raises(ValueError):
+        play_game(ScriptedPlayer([None]), RandomPlayer())
+    with pytest.raises(ValueError):
+        play_game(ScriptedPlayer(["e2e5"]), RandomPlayer())
+    # in Kriegspiel an illegal move is rejected and the player tries again, until it has no move left
+    white = ScriptedPlayer(["e2e5", "d1h5", "e2e4"])
+    assert play_game(white, RandomPlayer(), kriegspiel=True, max_plies=1) == ("1/2-1/2", "MAX_PLIES", 1)
+    assert [move.uci() for move in white.rejections] == ["e2e5", "d1h5"]
+    with pytest.raises(ValueError):
+        play_game(ScriptedPlayer(["e2e5", None]), RandomPlayer(), kriegspiel=True)
+
+
+@pytest.mark.parametrize("kriegspiel", [False, True])
+def test_random_games_end_with_the_board_outcome(kriegspiel):
+    for result, termination, plies in play_games(RandomPlayer(0), RandomPlayer(1), 5, kriegspiel=kriegspiel):
+        assert termination in chess.Termination.__members__
+        assert (result == "1/2-1/2") == (termination != "CHECKMATE")
+        assert 0 < plies
+
+
+@pytest.mark.parametrize("kriegspiel", [False, True])
+def test_search_players_finish_their_games(kriegspiel):
+    white = AlphaBetaPlayer(depth=1, tt_size_mb=1, seed=0, samples=2)
+    black = MCTSPlayer({"sims": 10}, seed=1, samples=2)
+    result, termination, plies = play_game(white, black, kriegspiel=kriegspiel, max_plies=30)
+    assert plies <= 30 and result in ("1-0", "0-1", "1/2-1/2")
+    if kriegspiel:
+        assert white.belief is not None and black.belief is not None
+        assert sum(white.belief.opponent_pieces.values()) <= 16
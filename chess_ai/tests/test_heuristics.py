@@ -0,0 +1,42 @@
+import pytest
+import heuristics
+from belief_state import masked_board
+from benchmarks import legacy_get_material_value, legacy_count_attacks, random_positions
+
+POSITIONS = random_positions(300, seed=1)
+
+
+@pytest.mark.parametrize("curr_player", ["W", "B"])
+def test_bitboard_material_matches_legacy(curr_player):
+    for board in POSITIONS:
+        assert heuristics.get_material_value(board, curr_player) == legacy_get_material_value(board, curr_player)
+
+
+@pytest.mark.parametrize("curr_player", ["W", "B"])
+def test_bitboard_kriegspiel_material_matches_legacy(curr_player):
+    for board in POSITIONS:
+        view = masked_board(board, curr_player)
+        opponent_pieces = heuristics.count_opponent_pieces(board, curr_player)
+        assert heuristics.get_material_value(view, curr_player, True, opponent_pieces) == \
+            legacy_get_material_value(view, curr_player, True, opponent_pieces)
+
+
+@pytest.mark.parametrize("curr_player", ["W", "B"])
+def test_bitboard_attacks_match_legacy(curr_player):
+    for board in POSITIONS:
+        assert heuristics.count_attacks(board, curr_player) == legacy_count_attacks(board, curr_player)
+
+
+@pytest.mark.parametrize("curr_player", ["W", "B"])
+def test_batch_evaluate_matches_scalar(curr_player):
+    expected = [legacy_get_material_value(board, curr_player) - legacy_count_attacks(board, curr_player) for board in POSITIONS]
+    assert list(heuristics.batch_evaluate(POSITIONS, curr_player)) == expected
+    assert list(heuristics.batch_evaluate(heuristics.pack_boards(POSITIONS), curr_player)) == expected
+
+
+@pytest.mark.parametrize("curr_player", ["W", "B"])
+def test_batch_evaluate_kriegspiel_matches_scalar(curr_player):
+    views = [masked_board(board, curr_player) for board in POSITIONS]
+    opponent_pieces = [heuristics.count_opponent_pieces(board, curr_player) for board in POSITIONS]
+    expected = [legacy_get_material_value(view, curr_player, True, pieces) for view, pieces in zip(views, opponent_pieces)]
+    assert list(heuristics.batch_evaluate(views, curr_player, True, opponent_pieces)) == expected
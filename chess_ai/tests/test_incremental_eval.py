@@ -0,0 +1,58 @@
+import random
+import chess
+import pytest
+import heuristics
+from evaluation import IncrementalEval, PIECE_SQUARE_TABLES
+
+
+def state(evaluator):
+    return [list(counts) for counts in evaluator.counts], list(evaluator.material), list(evaluator.positional)
+
+
+def assert_matches_board(evaluator, board):
+    fresh = IncrementalEval(board, evaluator.piece_square_tables)
+    assert evaluator.counts == fresh.counts and evaluator.material == fresh.material
+    assert evaluator.positional == pytest.approx(fresh.positional)
+    for curr_player in ("W", "B"):
+        assert evaluator.material_value(curr_player) == heuristics.get_material_value(board, curr_player)
+        assert evaluator.opponent_pieces(curr_player) == heuristics.count_opponent_pieces(board, curr_player)
+
+
+@pytest.mark.parametrize("tables", [None, PIECE_SQUARE_TABLES])
+@pytest.mark.parametrize("seed", range(5))
+def test_push_pop_round_trip_over_random_games(tables, seed):
+    rng = random.Random(seed)
+    board = chess.Board()
+    evaluator = IncrementalEval(board, tables)
+    start = state(evaluator)
+    while not board.is_game_over() and len(board.move_stack) < 200:
+        move = rng.choice(list(board.legal_moves))
+        evaluator.push(board, move)
+        board.push(move)
+        assert_matches_board(evaluator, board)
+    while board.move_stack:
+        board.pop()
+        evaluator.pop()
+    assert state(evaluator)[:2] == start[:2]
+    assert state(evaluator)[2] == pytest.approx(start[2])
+
+
+@pytest.mark.parametrize("fen, uci", [
+    ("4k3/8/8/3pP3/8/8/8/4K3 w - d6 0 2", "e5d6"),  # en passant
+    ("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1", "e1g1"),  # castling
+    ("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1", "e8c8"),
+    ("1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7b8q"),  # capture with promotion
+    ("4k3/8/8/8/8/8/p7/4K3 b - - 0 1", "a2a1n"),  # underpromotion
+])
+@pytest.mark.parametrize("tables", [None, PIECE_SQUARE_TABLES])
+def test_special_moves(fen, uci, tables):
+    board = chess.Board(fen)
+    evaluator = IncrementalEval(board, tables)
+    start = state(evaluator)
+    move = chess.Move.from_uci(uci)
+    evaluator.push(board, move)
+    board.push(move)
+    assert_matches_board(evaluator, board)
+    evaluator.pop()
+    assert state(evaluator)[:2] == start[:2]
+    assert state(evaluator)[2] == pytest.approx(start[2])
@@ -0,0 +1,24 @@
+import chess
+import numpy as np
+import pytest
+from alpha_beta_ai import depth_limited_ab_search, make_unmake_ab_search
+from benchmarks import POSITIONS
+from node import Node
+
+
+@pytest.mark.parametrize("name", sorted(POSITIONS))
+@pytest.mark.parametrize("depth", [1, 2])
+def test_make_unmake_matches_node_search(name, depth):
+    board = chess.Board(POSITIONS[name])
+    curr_player = "W" if board.turn == chess.WHITE else "B"
+    expected = depth_limited_ab_search(Node(board_state=board.copy()), depth, -np.infty, np.infty, True, curr_player)
+    node = Node(board_state=board.copy())
+    assert make_unmake_ab_search(node, depth, -np.infty, np.infty, True, curr_player) == expected
+    # every move made during the search was taken back
+    assert node.board_state == board and node.board_state.move_stack == board.move_stack
+
+
+def test_make_unmake_finds_mate_in_one():
+    board = chess.Board("6k1/5ppp/8/8/8/8/5PPP/R5K1 w - - 0 1")
+    value, move = make_unmake_ab_search(Node(board_state=board), 2, -np.infty, np.infty, True, "W")
+    assert move == "a1a8"
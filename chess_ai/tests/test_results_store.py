@@ -0,0 +1,56 @@
+import numpy as np
+from analysis import store_scores
+from results_store import ResultsStore, experiment_config
+
+
+def game(config, run, game_num, result="1-0"):
+    return {"config": config, "run": run, "game": game_num, "seed": None, "result": result, "termination": "CHECKMATE",
+            "plies": 10, "move_times": [0.1]}
+
+
+def test_completed_resumes_exactly_one_experiment(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.jsonl"))
+    unnamed = experiment_config("random_ai", "random_ai")
+    named = experiment_config("random_ai", "random_ai", name="depth 3")
+    store.append(game(unnamed, 0, 0))
+    store.append(game(named, 0, 0, "0-1"))
+    store.append(game(named, 0, 1, "0-1"))
+    assert set(store.completed(unnamed)) == {(0, 0)}
+    assert set(store.completed(named)) == {(0, 0), (0, 1)}
+    assert len(list(store.records(unnamed))) == 1
+    assert len(list(store.query({"white": "random_ai"}))) == 3
+    assert store.configs() == [unnamed, named]
+    assert store_scores(store.path, unnamed, 1).tolist() == [[1.]]
+    assert store_scores(store.path, named).tolist() == [[0., 0.]]
+
+
+def test_partial_line_is_skipped_and_repaired(tmp_path):
+    path = tmp_path / "results.jsonl"
+    store = ResultsStore(str(path))
+    config = experiment_config("mcts_ai", "random_ai", kriegspiel=True, seed=3, game_options={"mcts_budget": {"W": {"sims": 5}}})
+    store.append(game(config, 0, 0))
+    # a crash in the middle of a write
+    with open(path, "a") as f:
+        f.write('{"config": {"white": "mcts_ai", "bla')
+    assert set(store.completed(config)) == {(0, 0)}
+    store.append(game(config, 0, 1, "1/2-1/2"))
+    lines = path.read_text().split("\n")
+    assert lines[-1] == "" and len(lines) == 4
+    assert set(store.completed(config)) == {(0, 0), (0, 1)}
+    assert store_scores(str(path), config).tolist() == [[1., 0.5]]
+
+
+def test_config_round_trips_through_the_file(tmp_path):
+    store = ResultsStore(str(tmp_path / "results.jsonl"))
+    # tuples become lists in JSON, the config is built to compare equal to what is read back
+    config = experiment_config("alpha_beta_ai", "random_ai", game_options={"time_control": (1, 2)})
+    store.append(game(config, 1, 0))
+    assert list(store.completed(config)) == [(1, 0)]
+
+
+def test_missing_store_and_missing_games(tmp_path):
+    store = ResultsStore(str(tmp_path / "missing.jsonl"))
+    assert list(store.records()) == [] and store.completed(experiment_config("a", "b")) == {}
+    store.append(game(experiment_config("a", "b"), 0, 2))
+    scores = store_scores(store.path, experiment_config("a", "b"), 3)
+    assert np.isnan(scores[0, :2]).all() and scores[0, 2] == 1.
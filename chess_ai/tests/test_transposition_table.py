@@ -0,0 +1,63 @@
+import chess
+import numpy as np
+from alpha_beta_ai import depth_limited_ab_search
+from node import Node
+from transposition_table import TranspositionTable, position_key, EXACT, LOWER, UPPER
+
+
+def test_record_sets_the_bound_from_the_window():
+    tt = TranspositionTable(1)
+    tt.record(1, 2, -5, "e2e4", -1, 1)
+    tt.record(2, 2, 5, "e2e4", -1, 1)
+    tt.record(3, 2, 0, "e2e4", -1, 1)
+    assert [tt.probe(key).flag for key in (1, 2, 3)] == [UPPER, LOWER, EXACT]
+
+
+def test_lookup_answers_exact_entries_deep_enough_only():
+    tt = TranspositionTable(1)
+    tt.store(7, 3, EXACT, 4, "g1f3")
+    assert tt.lookup(7, 3, -10, 10) == (True, 4, "g1f3", -10, 10)
+    # a shallower entry only gives the move to search first
+    assert tt.lookup(7, 4, -10, 10) == (False, None, "g1f3", -10, 10)
+
+
+def test_lookup_narrows_the_window_with_bounds():
+    tt = TranspositionTable(1)
+    tt.store(1, 2, LOWER, 3, "a2a3")
+    tt.store(2, 2, UPPER, -3, "a2a3")
+    assert tt.lookup(1, 2, -10, 10) == (False, None, "a2a3", 3, 10)
+    assert tt.lookup(2, 2, -10, 10) == (False, None, "a2a3", -10, -3)
+    # a bound outside the window is a cutoff
+    assert tt.lookup(1, 2, -10, 2)[0]
+    assert tt.lookup(2, 2, -2, 10)[0]
+
+
+def test_depth_policy_keeps_the_deeper_entry_of_the_same_search():
+    tt = TranspositionTable(0)  # a single slot, every key collides
+    assert tt.num_slots == 1
+    tt.store(1, 4, EXACT, 0, "e2e4")
+    tt.store(2, 2, EXACT, 0, "d2d4")
+    assert tt.probe(1) is not None and tt.probe(2) is None
+    assert tt.rejected == 1
+    # entries of an older search give way
+    tt.new_search()
+    tt.store(2, 2, EXACT, 0, "d2d4")
+    assert tt.probe(1) is None and tt.probe(2) is not None
+    assert tt.overwrites == 1
+
+
+def test_always_policy_replaces_every_time():
+    tt = TranspositionTable(0, policy="always")
+    tt.store(1, 4, EXACT, 0, "e2e4")
+    tt.store(2, 2, EXACT, 0, "d2d4")
+    assert tt.probe(1) is None and tt.probe(2).move == "d2d4"
+    assert tt.rejected == 0
+
+
+def test_search_with_table_matches_search_without():
+    board = chess.Board("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+    plain = depth_limited_ab_search(Node(board_state=board.copy()), 3, -np.infty, np.infty, True, "W")
+    tt = TranspositionTable(4)
+    cached = depth_limited_ab_search(Node(board_state=board.copy()), 3, -np.infty, np.infty, True, "W", tt)
+    assert cached[0] == plain[0]
+    assert tt.probe(position_key(board)) is not None
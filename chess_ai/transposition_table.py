@@ -0,0 +1,236 @@
+import chess
+import chess.polyglot
+from collections import namedtuple
+
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# rough footprint of one stored entry (tuple + ints + move string) in bytes,
+# used to turn a memory cap into a number of slots
+ENTRY_BYTES = 160
+REPLACEMENT_POLICIES = ("depth", "always")
+
+TTEntry = namedtuple("TTEntry", ["key", "depth", "flag", "score", "move", "age"])
+
+'''
+position_key:
+
+Computes the key a position is stored under in the transposition table: the Zobrist hash of the board.
+A Kriegspiel player searches full boards sampled from its belief, so their keys are standard ones too.
+
+Parameters:
+    - board_state - python-chess BoardState, the board the search is walking
+
+Returns:
+    Int, a 64 bit key for the position
+'''
+def position_key(board_state):
+    return chess.polyglot.zobrist_hash(board_state)
+
+
+'''
+Classes:
+    TranspositionTable
+        Bounded table of previously searched positions used by depth_limited_ab_search so that
+        positions reached through a different move order are not searched again.
+
+        Properties:
+            - policy: the replacement policy used when two positions map to the same slot,
+            "depth" (keep the deeper result unless it is from an older search) or "always"
+            - num_slots: the number of slots, derived from the memory cap
+            - slots: list holding one TTEntry (or None) per slot
+            - age: the search counter, bumped by new_search so stale entries can be replaced
+            - probes, hits, cutoffs, stores, overwrites, rejected: counters describing how much
+            work the table saves
+'''
+
+class TranspositionTable:
+
+    '''
+    Establishes the table with the requested memory cap and replacement policy
+
+    Parameters:
+        size_mb - Float, the memory cap of the table in megabytes
+        policy - String, the replacement policy, one of REPLACEMENT_POLICIES
+
+    Returns:
+        A new object of class TranspositionTable
+    '''
+    def __init__(self, size_mb=64, policy="depth"):
+        if policy not in REPLACEMENT_POLICIES:
+            raise ValueError("Unknown replacement policy: " + str(policy))
+        self.policy = policy
+        self.num_slots = max(1, int(size_mb * 2**20) // ENTRY_BYTES)
+        self.slots = [None] * self.num_slots
+        self.age = 0
+        self.reset_stats()
+
+    '''
+    TranspositionTable.reset_stats:
+
+    Sets all of the hit-rate counters back to zero
+
+    Returns:
+        Void return, resets the counters of the table
+    '''
+    def reset_stats(self):
+        self.probes = 0
+        self.hits = 0
+        self.cutoffs = 0
+        self.stores = 0
+        self.overwrites = 0
+        self.rejected = 0
+
+    '''
+    TranspositionTable.new_search:
+
+    Marks the start of a new search (a new move in the game). Entries from older searches are
+    always allowed to be replaced under the "depth" policy.
+
+    Returns:
+        Void return, bumps the age of the table
+    '''
+    def new_search(self):
+        self.age += 1
+
+    '''
+    TranspositionTable.clear:
+
+    Removes every entry from the table and resets the counters
+
+    Returns:
+        Void return, empties the table
+    '''
+    def clear(self):
+        self.slots = [None] * self.num_slots
+        self.age = 0
+        self.reset_stats()
+
+    '''
+    TranspositionTable.probe:
+
+    Looks up the entry stored for a position
+
+    Parameters:
+        key - Int, the key of the position, from position_key
+
+    Returns:
+        the TTEntry stored for the position, or None if there is no entry for it
+    '''
+    def probe(self, key):
+        self.probes += 1
+        entry = self.slots[key % self.num_slots]
+        if entry is not None and entry.key == key:
+            self.hits += 1
+            return entry
+        return None
+
+    '''
+    TranspositionTable.store:
+
+    Stores the result of searching a position, subject to the replacement policy
+
+    Parameters:
+        key - Int, the key of the position, from position_key
+        depth - Int, the remaining depth the position was searched to
+        flag - Int, EXACT, LOWER (score is a lower bound) or UPPER (score is an upper bound)
+        score - Float, the score found by the search
+        move - String, the best move found in UCI format, -1 if there is none
+
+    Returns:
+        Void return, updates the slot for the position
+    '''
+    def store(self, key, depth, flag, score, move):
+        idx = key % self.num_slots
+        old = self.slots[idx]
+        if old is not None and self.policy == "depth" and old.age == self.age and old.depth > depth:
+            self.rejected += 1
+            return
+        if old is not None and old.key != key:
+            self.overwrites += 1
+        self.stores += 1
+        self.slots[idx] = TTEntry(key, depth, flag, score, move, self.age)
+
+    '''
+    TranspositionTable.lookup:
+
+    Probes the table for a position inside an alpha-beta search. An entry searched at least as deep
+    either answers the position outright or narrows the alpha-beta window.
+
+    Parameters:
+        key - Int, the key of the position, from position_key
+        depth - Int, the remaining depth of the search at the position
+        alpha - Float, the current value of alpha
+        beta - Float, the current value of beta
+
+    Returns:
+        (cutoff, score, move, alpha, beta), cutoff is True when score and move can be returned
+        without searching, alpha and beta are the possibly narrowed window otherwise. move is the
+        stored best move whenever there is an entry (even a shallower one), so it can be searched first
+    '''
+    def lookup(self, key, depth, alpha, beta):
+        entry = self.probe(key)
+        if entry is None:
+            return False, None, None, alpha, beta
+        if entry.depth < depth:
+            return False, None, entry.move, alpha, beta
+        if entry.flag == EXACT:
+            self.cutoffs += 1
+            return True, entry.score, entry.move, alpha, beta
+        elif entry.flag == LOWER:
+            alpha = max(alpha, entry.score)
+        elif entry.flag == UPPER:
+            beta = min(beta, entry.score)
+        if alpha >= beta:
+            self.cutoffs += 1
+            return True, entry.score, entry.move, alpha, beta
+        return False, None, entry.move, alpha, beta
+
+    '''
+    TranspositionTable.record:
+
+    Stores the result of an alpha-beta search of a position, working out the bound type from the
+    window the position was searched with
+
+    Parameters:
+        key - Int, the key of the position, from position_key
+        depth - Int, the remaining depth the position was searched to
+        value - Float, the value returned by the search
+        move - String, the best move found in UCI format
+        alpha - Float, alpha at the start of the search of the position
+        beta - Float, beta at the start of the search of the position
+
+    Returns:
+        Void return, stores the entry
+    '''
+    def record(self, key, depth, value, move, alpha, beta):
+        if value <= alpha:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.store(key, depth, flag, value, move)
+
+    '''
+    TranspositionTable.hit_rate:
+
+    Returns:
+        Float, the fraction of probes that found an entry for the position
+    '''
+    def hit_rate(self):
+        if self.probes == 0:
+            return 0.
+        return self.hits / self.probes
+
+    '''
+    TranspositionTable.get_stats:
+
+    Returns:
+        Dictionary with the counters of the table, its hit rate and how full it is
+    '''
+    def get_stats(self):
+        return {"probes": self.probes, "hits": self.hits, "hit_rate": self.hit_rate(), "cutoffs": self.cutoffs,
+                "stores": self.stores, "overwrites": self.overwrites, "rejected": self.rejected,
+                "used_slots": self.num_slots - self.slots.count(None), "num_slots": self.num_slots}
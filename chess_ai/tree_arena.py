@@ -0,0 +1,311 @@
+import chess
+import numpy as np
+
+NO_NODE = -1
+INITIAL_CAPACITY = 1024
+
+'''
+encode_move:
+
+Packs a python-chess Move into one integer so that it can be stored in a NumPy array
+
+Parameters:
+    - move - python-chess Move
+
+Returns:
+    Int, from_square + 64 * to_square + 4096 * promotion
+'''
+def encode_move(move):
+    return move.from_square + 64 * move.to_square + 4096 * (move.promotion or 0)
+
+'''
+decode_move:
+
+Parameters:
+    - code - Int, a move packed by encode_move
+
+Returns:
+    the python-chess Move
+'''
+def decode_move(code):
+    code = int(code)
+    promotion = code // 4096
+    return chess.Move(code % 64, (code // 64) % 64, promotion if promotion else None)
+
+
+'''
+Classes:
+    TreeArena
+        Compact search tree stored as a structure of arrays instead of one Node object per position.
+        Node i is described by entry i of every array; the children of a node are stored next to each
+        other, so they can be read (and scored) as one slice. Boards are not stored per node, they are
+        rebuilt by replaying the moves from the root.
+
+        Properties:
+            - root_board: python-chess BoardState of the root, without its move stack
+            - size: the number of nodes in use
+            - parent: index of the parent node, NO_NODE for the root
+            - move: the move leading to the node, packed by encode_move
+            - visits: the number of visits to the node (n)
+            - value: the total reward backed up through the node, from the point of view of the
+            player who made the move leading to it
+            - first_child: index of the first child, NO_NODE while the node is not expanded
+            - num_children: the number of children of an expanded node
+'''
+
+class TreeArena:
+
+    '''
+    Establishes the arena with a root node for a board
+
+    Parameters:
+        root_board - python-chess BoardState, the position at the root
+        capacity - Int, the number of nodes to allocate room for up front
+
+    Returns:
+        A new object of class TreeArena
+    '''
+    def __init__(self, root_board, capacity=INITIAL_CAPACITY):
+        self.root_board = root_board.copy(stack=False)
+        self.size = 0
+        self.parent = np.full(capacity, NO_NODE, dtype=np.int32)
+        self.move = np.zeros(capacity, dtype=np.int32)
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.value = np.zeros(capacity, dtype=np.float64)
+        self.first_child = np.full(capacity, NO_NODE, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int16)
+        self.allocate(1)
+
+    def __len__(self):
+        return self.size
+
+    '''
+    TreeArena.arrays:
+
+    Returns:
+        list of the names of the per node arrays, so that subclasses adding statistics get them
+        grown and compacted as well
+    '''
+    def arrays(self):
+        return ["parent", "move", "visits", "value", "first_child", "num_children"]
+
+    '''
+    TreeArena.allocate:
+
+    Reserves count consecutive nodes, growing the arrays (doubling their capacity) if needed
+
+    Parameters:
+        count - Int, the number of nodes to reserve
+
+    Returns:
+        Int, the index of the first reserved node
+    '''
+    def allocate(self, count):
+        start = self.size
+        if start + count > len(self.parent):
+            capacity = max(2 * len(self.parent), start + count)
+            for name in self.arrays():
+                old = getattr(self, name)
+                fill = NO_NODE if name in ("parent", "first_child") else 0
+                new = np.full(capacity, fill, dtype=old.dtype)
+                new[:start] = old[:start]
+                setattr(self, name, new)
+        self.size = start + count
+        return start
+
+    '''
+    TreeArena.expand:
+
+    Adds one child per move below a node, stored next to each other
+
+    Parameters:
+        idx - Int, the node to expand
+        moves - list of python-chess Move, the moves from the node's position
+
+    Returns:
+        Int, the index of the first child
+    '''
+    def expand(self, idx, moves):
+        start = self.allocate(len(moves))
+        end = start + len(moves)
+        self.parent[start:end] = idx
+        self.move[start:end] = [encode_move(move) for move in moves]
+        self.first_child[idx] = start
+        self.num_children[idx] = len(moves)
+        return start
+
+    '''
+    TreeArena.is_expanded:
+
+    Parameters:
+        idx - Int, the node in question
+
+    Returns:
+        Boolean, whether children have been added below the node
+    '''
+    def is_expanded(self, idx):
+        return self.first_child[idx] != NO_NODE
+
+    '''
+    TreeArena.children:
+
+    Parameters:
+        idx - Int, the node in question
+
+    Returns:
+        range of the indices of the node's children (empty if it is not expanded)
+    '''
+    def children(self, idx):
+        first = int(self.first_child[idx])
+        if first == NO_NODE:
+            return range(0)
+        return range(first, first + int(self.num_children[idx]))
+
+    '''
+    TreeArena.get_move:
+
+    Parameters:
+        idx - Int, the node in question, not the root
+
+    Returns:
+        the python-chess Move leading to the node
+    '''
+    def get_move(self, idx):
+        return decode_move(self.move[idx])
+
+    '''
+    TreeArena.path:
+
+    Parameters:
+        idx - Int, the node in question
+
+    Returns:
+        list of node indices from the first move below the root down to idx
+    '''
+    def path(self, idx):
+        path = []
+        while idx != 0:
+            path.append(idx)
+            idx = int(self.parent[idx])
+        path.reverse()
+        return path
+
+    '''
+    TreeArena.board_at:
+
+    Rebuilds the position of a node by replaying the moves from the root
+
+    Parameters:
+        idx - Int, the node in question
+
+    Returns:
+        python-chess BoardState of the node
+    '''
+    def board_at(self, idx):
+        board = self.root_board.copy()
+        for node in self.path(idx):
+            board.push(self.get_move(node))
+        return board
+
+    '''
+    TreeArena.find_child:
+
+    Parameters:
+        idx - Int, the parent node
+        move - python-chess Move, the move to look for
+
+    Returns:
+        Int, the index of the child reached by the move, NO_NODE if there is none
+    '''
+    def find_child(self, idx, move):
+        code = encode_move(move)
+        for child in self.children(idx):
+            if self.move[child] == code:
+                return child
+        return NO_NODE
+
+    '''
+    TreeArena.memory_bytes:
+
+    Returns:
+        Int, the number of bytes allocated for the per node arrays
+    '''
+    def memory_bytes(self):
+        return sum(getattr(self, name).nbytes for name in self.arrays())
+
+    '''
+    TreeArena.subtree:
+
+    Copies the subtree below a node into a new, compact arena with that node as its root. Children stay
+    next to each other and keep all their statistics; the nodes outside the subtree are left behind, so
+    they are freed together with the old arena.
+
+    Parameters:
+        idx - Int, the node that becomes the new root
+
+    Returns:
+        TreeArena holding the subtree, its root is index 0
+    '''
+    def subtree(self, idx):
+        arena = type(self)(self.board_at(idx))
+        for name in self.arrays():
+            getattr(arena, name)[0] = getattr(self, name)[idx]
+        arena.parent[0] = NO_NODE
+        arena.move[0] = 0
+        arena.first_child[0] = NO_NODE
+        queue = [(idx, 0)]
+        while queue:
+            old, new = queue.pop()
+            children = self.children(old)
+            if len(children) == 0:
+                arena.first_child[new] = NO_NODE
+                continue
+            start = arena.allocate(len(children))
+            end = start + len(children)
+            for name in self.arrays():
+                getattr(arena, name)[start:end] = getattr(self, name)[children.start:children.stop]
+            arena.parent[start:end] = new
+            arena.first_child[new] = start
+            queue.extend(zip(children, range(start, end)))
+        return arena
+
+
+'''
+Classes:
+    RaveArena
+        TreeArena that also keeps all-moves-as-first (AMAF) statistics for RAVE: a child is credited with
+        the result of every simulation through its parent in which its move was played by the same side
+        later on, in the tree or in the playout, so siblings share what the playouts find about a move.
+
+        Properties:
+            - same as TreeArena, plus
+            - amaf_visits: the number of simulations through the parent in which the node's move was played
+            - amaf_value: the total reward of those simulations, from the point of view of the player
+            who made the move leading to the node
+'''
+
+class RaveArena(TreeArena):
+
+    '''
+    Establishes the arena with a root node for a board
+
+    Parameters:
+        root_board - python-chess BoardState, the position at the root
+        capacity - Int, the number of nodes to allocate room for up front
+
+    Returns:
+        A new object of class RaveArena
+    '''
+    def __init__(self, root_board, capacity=INITIAL_CAPACITY):
+        self.amaf_visits = np.zeros(capacity, dtype=np.int32)
+        self.amaf_value = np.zeros(capacity, dtype=np.float64)
+        super().__init__(root_board, capacity)
+
+    '''
+    RaveArena.arrays:
+
+    Returns:
+        list of the names of the per node arrays, the AMAF statistics included
+    '''
+    def arrays(self):
+        return super().arrays() + ["amaf_visits", "amaf_value"]